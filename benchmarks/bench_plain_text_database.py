@@ -0,0 +1,88 @@
+"""Benchmarks for the plain text database ledger.
+
+Usage: python benchmarks/bench_plain_text_database.py [--records N]
+"""
+
+import os
+import random
+import argparse
+import tempfile
+import timeit
+import tracemalloc
+from datetime import date, timedelta
+import pandas as pd
+from onm.common import Amount, Transaction, TransactionType
+from onm.database import plain_text_database
+from onm.database.plain_text_database import PlainTextDatabase
+from onm.database.plain_text_snapshot import LedgerSnapshot
+from onm.database.transaction_table import TransactionTable
+
+ACCOUNTS = ["onm_bank_checking", "onm_bank_savings", "amex", "apple"]
+CATEGORIES = ["FOOD_AND_DRINK:GROCERIES", "TRANSPORTATION", "INCOME:WAGES"]
+
+
+def generate_transactions(n: int, seed: int = 0):
+    rng = random.Random(seed)
+    start = date(2014, 1, 1)
+    for i in range(n):
+        yield Transaction(
+            date=start + timedelta(days=rng.randrange(3650)),
+            description=f"MERCHANT {rng.randrange(5000)}",
+            amount=Amount(rng.randrange(50, 50000)),
+            category=rng.choice(CATEGORIES),
+            account_name=rng.choice(ACCOUNTS),
+            type=rng.choice(list(TransactionType)),
+        )
+
+
+def read_transactions_loop(path: str) -> pd.DataFrame:
+    # Record-at-a-time parse into Transaction objects, then into a DataFrame
+    transactions = list(plain_text_database._iter_transactions_file(path))
+    return plain_text_database._transactions_df(transactions)
+
+
+def allocated(load) -> int:
+    # Bytes still allocated by whatever load() returns
+    tracemalloc.start()
+    result = load()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def best_of(stmt, repeat: int) -> float:
+    return min(timeit.repeat(stmt, number=1, repeat=repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as database_path:
+        database = PlainTextDatabase(database_path)
+        database.add_transactions(list(generate_transactions(args.records)))
+        path = os.path.join(database_path, "transactions")
+
+        loop = best_of(lambda: read_transactions_loop(path), args.repeat)
+        bulk = best_of(
+            lambda: plain_text_database._read_transactions_file(path), args.repeat
+        )
+        print(f"records: {args.records}")
+        print(f"record loop parser: {loop:.3f}s")
+        print(f"bulk regex parser:  {bulk:.3f}s ({loop / bulk:.1f}x)")
+
+        snapshot = LedgerSnapshot(path)
+        cached = best_of(lambda: snapshot.read(parse=None), args.repeat)
+        print(f"columnar snapshot:  {cached:.3f}s ({bulk / cached:.1f}x vs bulk)")
+
+        objects = allocated(database.get_transactions)
+        table = allocated(lambda: TransactionTable.from_df(snapshot.read(parse=None)))
+        print(f"Transaction list:   {objects / 2**20:.1f} MiB")
+        print(f"TransactionTable:   {table / 2**20:.1f} MiB ({objects / table:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,8 @@ import pandas as pd
 
 from onm import main
 from onm.common import Account, SourceType
+from onm.database.database import TransactionQuery
+from onm.database.export import ExportFormat, ExportTable
 from .config import Config
 
 
@@ -97,7 +99,112 @@ def update_source(name: str, config: Optional[str] = None):
 @click.option("-n", "--name", required=True, type=str, help="Name of source")
 @click.option("-c", "--config", type=click.Path(exists=True), help="Configuration file")
 def sync_source(name: str, config: Optional[str] = None):
-    main.sync_source(name, Config(config))
+    summary = main.sync_source(name, Config(config))
+    click.echo(
+        f"{name}: {summary.added_transactions} new transactions, "
+        f"{summary.skipped_transactions} duplicates skipped"
+    )
+
+
+@cli.command()
+@click.option("-c", "--config", type=click.Path(exists=True), help="Configuration file")
+@click.option(
+    "-j",
+    "--jobs",
+    type=int,
+    default=main.MAX_SYNC_WORKERS,
+    help="Number of sources to fetch from at once",
+)
+def sync_all(config: Optional[str] = None, jobs: int = main.MAX_SYNC_WORKERS):
+    summary = main.sync_all(Config(config), max_workers=jobs)
+    for name in summary.synced_sources:
+        click.echo(f"{name}: synced")
+    for name, error in summary.failed_sources.items():
+        click.echo(f"{name}: failed: {error}", err=True)
+    click.echo(
+        f"{summary.added_transactions} new transactions, "
+        f"{summary.skipped_transactions} duplicates skipped"
+    )
+    if summary.failed_sources:
+        raise SystemExit(1)
+
+
+@cli.command()
+@click.option("-c", "--config", type=click.Path(exists=True), help="Configuration file")
+def compact(config: Optional[str] = None):
+    main.compact(Config(config))
+
+
+@cli.command()
+@click.option(
+    "--from",
+    "from_config",
+    required=True,
+    type=click.Path(exists=True),
+    help="Configuration file of the database to copy",
+)
+@click.option(
+    "--to",
+    "to_config",
+    required=True,
+    type=click.Path(exists=True),
+    help="Configuration file of the (empty) database to copy to",
+)
+def migrate(from_config: str, to_config: str):
+    summary = main.migrate(Config(from_config), Config(to_config))
+    click.echo(
+        f"Migrated {summary.sources} sources, {summary.sync_cursors} sync cursors, "
+        f"{summary.accounts} accounts and {summary.transactions} transactions "
+        f"(checksum {summary.checksum:016x})"
+    )
+
+
+@cli.command()
+@click.option("-o", "--output", required=True, type=click.Path(), help="Output file")
+@click.option(
+    "-f",
+    "--format",
+    type=click.Choice([f.value for f in ExportFormat]),
+    help="Output format (default: from the output file's extension)",
+)
+@click.option(
+    "-t",
+    "--table",
+    type=click.Choice([t.value for t in ExportTable]),
+    default=ExportTable.TRANSACTIONS.value,
+    help="What to export",
+)
+@click.option("--start-date", type=click.DateTime(["%Y-%m-%d"]), help="First date")
+@click.option("--end-date", type=click.DateTime(["%Y-%m-%d"]), help="Last date")
+@click.option("-a", "--account", multiple=True, help="Account name (repeatable)")
+@click.option("--category", multiple=True, help="Category (repeatable)")
+@click.option("-c", "--config", type=click.Path(exists=True), help="Configuration file")
+def export(
+    output: str,
+    format: Optional[str],
+    table: str,
+    start_date=None,
+    end_date=None,
+    account=(),
+    category=(),
+    config: Optional[str] = None,
+):
+    if format is None:
+        format = os.path.splitext(output)[1].lstrip(".").lower()
+        if format not in [f.value for f in ExportFormat]:
+            raise click.BadParameter(
+                f"cannot infer a format from '{output}'", param_hint="--format"
+            )
+    query = TransactionQuery(
+        start_date=start_date.date() if start_date else None,
+        end_date=end_date.date() if end_date else None,
+        account_names=list(account) or None,
+        categories=list(category) or None,
+    )
+    count = main.export(
+        output, ExportFormat(format), ExportTable(table), Config(config), query
+    )
+    click.echo(f"{output}: {count} {table} exported")
 
 
 if __name__ == "__main__":
@@ -1,6 +1,7 @@
-from datetime import date
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
 from enum import Enum
-from typing import NamedTuple
+from typing import NamedTuple, Optional, Union
 
 
 class AccountType(Enum):
@@ -14,12 +15,86 @@ class SourceType(Enum):
     APPLE_CSV = "apple_csv"
 
 
+class Amount(int):
+    """Exact amount of money, as an integer number of cents.
+
+    Arithmetic between amounts gives an Amount, and str() gives the decimal
+    form, e.g. str(Amount(-10280)) == "-102.80".
+    """
+
+    def __new__(cls, cents: Union[int, float, Decimal, str] = 0) -> "Amount":
+        # A fraction of a cent is refused rather than truncated, since it is
+        # most likely a number of dollars given where cents were expected
+        if isinstance(cents, (float, Decimal)) and cents != int(cents):
+            raise ValueError(
+                f"{cents!r} is not a whole number of cents; use Amount.from_float"
+                " or Amount.parse for dollar amounts"
+            )
+        return super().__new__(cls, cents)
+
+    @staticmethod
+    def parse(text: Union[str, bytes]) -> "Amount":
+        # Decimal strings such as "1200", "-102.8" or "1,200.00"
+        if isinstance(text, bytes):
+            text = text.decode()
+        try:
+            cents = Decimal(text.strip().replace(",", "")) * 100
+        except InvalidOperation:
+            raise ValueError(f"'{text}' is not an amount")
+        if cents != cents.to_integral_value():
+            raise ValueError(f"'{text}' is not a whole number of cents")
+        return Amount(cents)
+
+    @staticmethod
+    def from_float(value: float) -> "Amount":
+        # Goes through the shortest decimal form of the float, e.g. for amounts
+        # that were decoded from JSON, so 102.8 is exactly 10280 cents
+        return Amount(round(Decimal(repr(value)) * 100))
+
+    def __str__(self) -> str:
+        sign = "-" if self < 0 else ""
+        dollars, cents = divmod(abs(int(self)), 100)
+        return f"{sign}{dollars}.{cents:02d}"
+
+    def __repr__(self) -> str:
+        return f"Amount('{self}')"
+
+    def __format__(self, format_spec: str) -> str:
+        return format(str(self), format_spec)
+
+    def __add__(self, other):
+        result = int.__add__(self, other)
+        return Amount(result) if isinstance(other, int) else result
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        result = int.__sub__(self, other)
+        return Amount(result) if isinstance(other, int) else result
+
+    def __rsub__(self, other):
+        result = int.__rsub__(self, other)
+        return Amount(result) if isinstance(other, int) else result
+
+    def __neg__(self) -> "Amount":
+        return Amount(-int(self))
+
+    def __abs__(self) -> "Amount":
+        return Amount(abs(int(self)))
+
+
 class Account(NamedTuple):
     name: str
-    balance: float
+    balance: Amount
     type: AccountType
 
 
+class BalanceSnapshot(NamedTuple):
+    account_name: str
+    timestamp: datetime
+    balance: Amount
+
+
 class TransactionType(Enum):
     CREDIT = "credit"
     DEBIT = "debit"
@@ -28,7 +103,10 @@ class TransactionType(Enum):
 class Transaction(NamedTuple):
     date: date
     description: str
-    amount: float
+    amount: Amount
     category: str
     account_name: str
     type: TransactionType
+    # Identifies the transaction at its source, e.g. so that later changes to
+    # it can be applied. Not every source provides one.
+    id: Optional[str] = None
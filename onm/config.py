@@ -1,8 +1,15 @@
 import os
 import tomlkit
 from .database.database import DatabaseType, DatabaseConfiguration
-from .connection.plaid_connection import PlaidConfiguration
+from .connection.plaid_connection import (
+    DEFAULT_CONNECT_TIMEOUT,
+    DEFAULT_POOL_SIZE,
+    DEFAULT_READ_TIMEOUT,
+    PlaidConfiguration,
+)
+from .secret import SecretCacheConfiguration
 import pkg_resources
+from typing import Optional
 
 # TODO: Check more than one place for config file
 ONM_CONFIG_PATH = "~/.config/onm/config.toml"
@@ -16,6 +23,14 @@ PLAID_SECTION = "plaid"
 PLAID_CLIENT_ID = "client_id"
 PLAID_SECRET = "secret"
 PLAID_ENV = "environment"
+PLAID_POOL_SIZE = "pool_size"
+PLAID_CONNECT_TIMEOUT = "connect_timeout"
+PLAID_READ_TIMEOUT = "read_timeout"
+
+SECRETS_SECTION = "secrets"
+SECRETS_CACHE_PATH = "cache_path"
+SECRETS_CACHE_TTL = "cache_ttl"
+DEFAULT_SECRETS_CACHE_TTL = 15 * 60
 
 
 DEFAULT_CONFIG_PATH = pkg_resources.resource_filename(__name__, "data/config.toml")
@@ -32,10 +47,26 @@ class Config:
 
     def get_plaid_config(self) -> PlaidConfiguration:
         # TODO: error handling
+        plaid = self._config[PLAID_SECTION]
         return PlaidConfiguration(
-            client_id=self._config[PLAID_SECTION][PLAID_CLIENT_ID],
-            secret=self._config[PLAID_SECTION][PLAID_SECRET],
-            environment=self._config[PLAID_SECTION][PLAID_ENV],
+            client_id=plaid[PLAID_CLIENT_ID],
+            secret=plaid[PLAID_SECRET],
+            environment=plaid[PLAID_ENV],
+            pool_size=int(plaid.get(PLAID_POOL_SIZE, DEFAULT_POOL_SIZE)),
+            connect_timeout=float(
+                plaid.get(PLAID_CONNECT_TIMEOUT, DEFAULT_CONNECT_TIMEOUT)
+            ),
+            read_timeout=float(plaid.get(PLAID_READ_TIMEOUT, DEFAULT_READ_TIMEOUT)),
+        )
+
+    def get_secret_cache_config(self) -> Optional[SecretCacheConfiguration]:
+        # Resolved secrets are only cached on disk if configured
+        secrets = self._config.get(SECRETS_SECTION, {})
+        if SECRETS_CACHE_PATH not in secrets:
+            return None
+        return SecretCacheConfiguration(
+            path=secrets[SECRETS_CACHE_PATH],
+            ttl=float(secrets.get(SECRETS_CACHE_TTL, DEFAULT_SECRETS_CACHE_TTL)),
         )
 
     def get_database_config(self) -> DatabaseConfiguration:
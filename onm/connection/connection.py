@@ -1,8 +1,9 @@
 from datetime import date
 from enum import Enum
 from abc import ABC, abstractmethod
-from typing import List, NamedTuple, Optional
+from typing import Iterator, List, NamedTuple, Optional
 from ..sync import SyncCursor
+from ..common import Amount
 
 
 class AccountType(Enum):
@@ -13,7 +14,7 @@ class AccountType(Enum):
 class AccountBalance(NamedTuple):
     account_name: str
     account_id: str
-    balance: float
+    balance: Amount
     type: AccountType
 
 
@@ -25,16 +26,20 @@ class TransactionType(Enum):
 class Transaction(NamedTuple):
     date: date
     description: str
-    amount: float
+    amount: Amount
     primary_category: str
     detailed_category: str
     account_id: str
     type: TransactionType
+    transaction_id: Optional[str] = None
 
 
 class SyncTransactionsResponse(NamedTuple):
     transactions: List[Transaction]
     sync_cursor: SyncCursor
+    # Changes to and removals of transactions synced before, by transaction id
+    modified: List[Transaction] = []
+    removed: List[str] = []
 
 
 class Connection(ABC):
@@ -47,3 +52,9 @@ class Connection(ABC):
         self, sync_cursor: Optional[SyncCursor], access_token: Optional[str]
     ) -> SyncTransactionsResponse:
         pass
+
+    def iter_sync_transactions(
+        self, sync_cursor: Optional[SyncCursor], access_token: Optional[str]
+    ) -> Iterator[SyncTransactionsResponse]:
+        # Pages of new transactions, each with the cursor to resume after it
+        yield self.sync_transactions(sync_cursor=sync_cursor, access_token=access_token)
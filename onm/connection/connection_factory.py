@@ -3,7 +3,7 @@ from onm.config import Config
 from .connection import AccountType, Connection
 from .plaid_connection import PlaidConnection
 from onm.connection.csv_connection import AppleCsvConnection, AmexCsvConnection
-from onm.connection.plaid_connection import get_plaid_api
+from onm.connection.plaid_connection import get_plaid_api, get_plaid_scheduler
 from typing import Optional
 
 
@@ -18,7 +18,7 @@ class ConnectionFactory:
         if type == SourceType.PLAID:
             plaid_config = config.get_plaid_config()
             plaid_api = get_plaid_api(plaid_config)
-            return PlaidConnection(plaid_api)
+            return PlaidConnection(plaid_api, get_plaid_scheduler(plaid_config))
         elif type == SourceType.AMEX_CSV:
             if csv_path is None:
                 raise ValueError("Must provide 'csv_path' for Amex CSV link")
@@ -1,5 +1,6 @@
 from abc import ABC
 from onm.connection.csv_reader import CsvReader, AmexCsvReader, AppleCsvReader
+from onm.common import Amount
 from onm.sync import CsvSyncCursor
 from .connection import (
     AccountType,
@@ -30,7 +31,7 @@ class CsvConnection(Connection, ABC):
             AccountBalance(
                 account_name=self._account_name,
                 account_id=self._account_name,
-                balance=0,
+                balance=Amount(0),
                 type=self._account_type,
             )
         ]
@@ -40,8 +41,11 @@ class CsvConnection(Connection, ABC):
     ) -> SyncTransactionsResponse:
         df = self._csv_reader.read_csv(self._csv_path)
 
+        # Records from the latest synced day are fetched again, in case the
+        # previous export was taken partway through it. Those already synced
+        # are dropped as duplicates when committed.
         if sync_cursor is not None:
-            df = df[df["date"] > sync_cursor.latest_transaction_date]
+            df = df[df["date"] >= sync_cursor.latest_transaction_date]
         if len(df) == 0:
             return SyncTransactionsResponse(transactions=[], sync_cursor=sync_cursor)
         latest_transaction_date = max(df["date"])
@@ -1,6 +1,7 @@
 from abc import ABC, abstractmethod
 
 import pandas as pd
+from onm.common import Amount
 
 
 COLUMNS = [
@@ -23,15 +24,17 @@ class AmexCsvReader(CsvReader):
     @staticmethod
     def read_csv(path: str) -> pd.DataFrame:
         # f"https://global.americanexpress.com/spending-report/custom?from={start_date}&to={end_date}"
-        df = pd.read_csv(path)
+        # Amounts are read as text and parsed exactly into cents
+        df = pd.read_csv(path, dtype={"Amount": str})
+        amounts = df["Amount"].apply(Amount.parse)
         category = df["Category"]
         df["primary_category"] = category.str.split("-").apply(lambda x: x[0])
         df["detailed_category"] = category.str.split("-").apply(
             lambda x: x[1] if len(x) > 1 else None
         )
         df["date"] = pd.to_datetime(df["Date"]).dt.date
-        df["type"] = df["Amount"].apply(lambda x: "debit" if x < 0 else "credit")
-        df["amount"] = df["Amount"].abs()
+        df["type"] = amounts.apply(lambda x: "debit" if x < 0 else "credit")
+        df["amount"] = amounts.apply(abs)
         df["description"] = df["Description"]
         df = df[COLUMNS]
         return df
@@ -40,12 +43,12 @@ class AmexCsvReader(CsvReader):
 class AppleCsvReader(CsvReader):
     @staticmethod
     def read_csv(path: str) -> pd.DataFrame:
-        df = pd.read_csv(path)
+        df = pd.read_csv(path, dtype={"Amount (USD)": str})
         df["primary_category"] = df["Category"]
         df["detailed_category"] = None
         df["date"] = pd.to_datetime(df["Transaction Date"]).dt.date
         df["description"] = df["Description"]
-        df["amount"] = df["Amount (USD)"].abs()
+        df["amount"] = df["Amount (USD)"].apply(Amount.parse).apply(abs)
         df["type"] = (
             df["Type"].replace("Purchase", "debit").replace("Payment", "credit")
         )
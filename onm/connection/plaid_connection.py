@@ -1,8 +1,12 @@
-from plaid import ApiClient, Configuration, Environment
+import socket
+import threading
+from urllib3.connection import HTTPConnection
+from plaid import ApiClient, ApiException, Configuration, Environment
 from plaid.model import transaction, account_type
 from plaid.api.plaid_api import PlaidApi
 from plaid.model.transactions_sync_request import TransactionsSyncRequest
 from plaid.model.accounts_balance_get_request import AccountsBalanceGetRequest
+from .plaid_scheduler import PlaidScheduler, plaid_error
 from .connection import (
     Connection,
     AccountType,
@@ -12,13 +16,31 @@ from .connection import (
     SyncTransactionsResponse,
 )
 from ..sync import PlaidSyncCursor
-from typing import List, NamedTuple, Optional
+from ..common import Amount
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+
+# Transactions requested per /transactions/sync page (Plaid allows 1 to 500)
+SYNC_PAGE_SIZE = 500
+# Returned when transactions change while they are paged through, after
+# which pagination is restarted from the cursor it started from
+MUTATION_DURING_PAGINATION = "TRANSACTIONS_SYNC_MUTATION_DURING_PAGINATION"
+MAX_PAGINATION_RESTARTS = 3
+
+# Connections kept open to Plaid, enough for the sources synced at once
+DEFAULT_POOL_SIZE = 10
+# Seconds to wait to connect, and then for each response
+DEFAULT_CONNECT_TIMEOUT = 10.0
+DEFAULT_READ_TIMEOUT = 60.0
 
 
 class PlaidConfiguration(NamedTuple):
     client_id: str
     secret: str
     environment: str
+    pool_size: int = DEFAULT_POOL_SIZE
+    connect_timeout: float = DEFAULT_CONNECT_TIMEOUT
+    read_timeout: float = DEFAULT_READ_TIMEOUT
 
 
 def _get_host(env: str) -> str:
@@ -32,22 +54,79 @@ def _get_host(env: str) -> str:
         raise ValueError("{env} is not a valid environment")
 
 
+class _PlaidApiClient(ApiClient):
+    # Applies the configured timeouts to calls that do not set their own
+
+    def __init__(self, configuration: Configuration, timeout: tuple):
+        super().__init__(configuration)
+        self._timeout = timeout
+
+    def call_api(self, *args, _request_timeout=None, **kwargs):
+        return super().call_api(
+            *args, _request_timeout=_request_timeout or self._timeout, **kwargs
+        )
+
+
+# Clients are shared by everything in the process that uses the same
+# configuration, so that their pooled connections are reused
+_plaid_apis: Dict[PlaidConfiguration, PlaidApi] = {}
+_plaid_apis_lock = threading.Lock()
+# As are schedulers, so that their rate limits cover every request made
+_plaid_schedulers: Dict[PlaidConfiguration, PlaidScheduler] = {}
+
+
 def get_plaid_api(plaid_config: PlaidConfiguration) -> PlaidApi:
+    with _plaid_apis_lock:
+        plaid_api = _plaid_apis.get(plaid_config)
+        if plaid_api is None:
+            plaid_api = _plaid_apis[plaid_config] = _create_plaid_api(plaid_config)
+    return plaid_api
+
+
+def get_plaid_scheduler(plaid_config: PlaidConfiguration) -> PlaidScheduler:
+    with _plaid_apis_lock:
+        scheduler = _plaid_schedulers.get(plaid_config)
+        if scheduler is None:
+            scheduler = _plaid_schedulers[plaid_config] = PlaidScheduler()
+    return scheduler
+
+
+def close_plaid_apis():
+    with _plaid_apis_lock:
+        for plaid_api in _plaid_apis.values():
+            plaid_api.api_client.close()
+        _plaid_apis.clear()
+        _plaid_schedulers.clear()
+
+
+def _create_plaid_api(plaid_config: PlaidConfiguration) -> PlaidApi:
     config = Configuration(
         host=_get_host(plaid_config.environment),
         api_key={"clientId": plaid_config.client_id, "secret": plaid_config.secret},
     )
-    api_client = ApiClient(config)
+    config.connection_pool_maxsize = plaid_config.pool_size
+    # Idle pooled connections are kept alive rather than silently dropped
+    config.socket_options = HTTPConnection.default_socket_options + [
+        (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    ]
+    api_client = _PlaidApiClient(
+        config, timeout=(plaid_config.connect_timeout, plaid_config.read_timeout)
+    )
     return PlaidApi(api_client)
 
 
 class PlaidConnection(Connection):
-    def __init__(self, plaid_api: PlaidApi):
+    def __init__(self, plaid_api: PlaidApi, scheduler: PlaidScheduler = None):
         self._plaid_api = plaid_api
+        self._scheduler = scheduler or PlaidScheduler()
 
     def get_account_balances(self, access_token: Optional[str]) -> List[AccountBalance]:
         req = AccountsBalanceGetRequest(access_token=access_token)
-        res = self._plaid_api.accounts_balance_get(req)
+        res = self._scheduler.call(
+            "accounts_balance_get",
+            access_token,
+            lambda: self._plaid_api.accounts_balance_get(req),
+        )
         plaid_accounts = res.accounts
         accounts = []
         for plaid_account in plaid_accounts:
@@ -56,7 +135,7 @@ class PlaidConnection(Connection):
                     account_name=plaid_account.official_name or plaid_account.name,
                     account_id=plaid_account.account_id,
                     # TODO: Use current for now but should do based on account type
-                    balance=plaid_account.balances.current,
+                    balance=_parse_plaid_amount(plaid_account.balances.current),
                     type=_parse_plaid_account_type(plaid_account.type),
                 )
             )
@@ -67,20 +146,66 @@ class PlaidConnection(Connection):
         sync_cursor: Optional[PlaidSyncCursor] = None,
         access_token: Optional[str] = None,
     ) -> SyncTransactionsResponse:
-        transactions = []
+        transactions, modified, removed = [], [], []
+        for page in self.iter_sync_transactions(sync_cursor, access_token):
+            transactions += page.transactions
+            modified += page.modified
+            removed += page.removed
+        return SyncTransactionsResponse(
+            transactions=transactions,
+            sync_cursor=page.sync_cursor,
+            modified=modified,
+            removed=removed,
+        )
+
+    def iter_sync_transactions(
+        self,
+        sync_cursor: Optional[PlaidSyncCursor] = None,
+        access_token: Optional[str] = None,
+    ) -> Iterator[SyncTransactionsResponse]:
+        # Each page's cursor is valid to resume from, so a caller that stores
+        # it along with the page's transactions loses no progress on failure.
+        # Until the last page, it also carries the cursor pagination started
+        # from, which a resumed sync restarts from if Plaid asks it to.
         has_more = True
         next_cursor = ""
         if sync_cursor is not None and sync_cursor.cursor is not None:
             next_cursor = sync_cursor.cursor
+        start_cursor = next_cursor
+        if sync_cursor is not None and sync_cursor.start_cursor is not None:
+            start_cursor = sync_cursor.start_cursor
+        restarts = 0
         while has_more:
-            req = TransactionsSyncRequest(access_token=access_token, cursor=next_cursor)
-            res = self._plaid_api.transactions_sync(req)
+            req = TransactionsSyncRequest(
+                access_token=access_token, cursor=next_cursor, count=SYNC_PAGE_SIZE
+            )
+            try:
+                res = self._scheduler.call(
+                    "transactions_sync",
+                    access_token,
+                    lambda: self._plaid_api.transactions_sync(req),
+                )
+            except ApiException as e:
+                # Pages already yielded are sent again, and are then skipped
+                # or applied again by transaction id
+                _, error_code = plaid_error(e)
+                if error_code != MUTATION_DURING_PAGINATION:
+                    raise
+                if restarts >= MAX_PAGINATION_RESTARTS:
+                    raise
+                restarts += 1
+                next_cursor = start_cursor
+                continue
             has_more = res.has_more
             next_cursor = res.next_cursor
-            transactions += [_parse_plaid_transaction(t) for t in res.added]
-        return SyncTransactionsResponse(
-            transactions=transactions, sync_cursor=PlaidSyncCursor(cursor=next_cursor)
-        )
+            yield SyncTransactionsResponse(
+                transactions=[_parse_plaid_transaction(t) for t in res.added],
+                sync_cursor=PlaidSyncCursor(
+                    cursor=next_cursor, start_cursor=start_cursor if has_more else None
+                ),
+                modified=[_parse_plaid_transaction(t) for t in res.modified],
+                removed=[t.transaction_id for t in res.removed],
+            )
 
 
 def _parse_plaid_account_type(type: account_type.AccountType) -> AccountType:
@@ -99,8 +224,13 @@ def _parse_plaid_account_type(type: account_type.AccountType) -> AccountType:
     raise ValueError(f"{type} is not a valid account type")
 
 
+def _parse_plaid_amount(amount: Optional[float]) -> Optional[Amount]:
+    # Plaid amounts are decoded from JSON as floats
+    return None if amount is None else Amount.from_float(amount)
+
+
 def _parse_plaid_transaction(transaction: transaction.Transaction) -> Transaction:
-    amount = transaction.amount
+    amount = _parse_plaid_amount(transaction.amount)
     type = TransactionType.DEBIT if amount < 0 else TransactionType.CREDIT
     amount = abs(amount)
     return Transaction(
@@ -111,4 +241,5 @@ def _parse_plaid_transaction(transaction: transaction.Transaction) -> Transactio
         primary_category=transaction.personal_finance_category.primary,
         detailed_category=transaction.personal_finance_category.detailed,
         account_id=transaction.account_id,
+        transaction_id=transaction.transaction_id,
     )
@@ -0,0 +1,225 @@
+import json
+import random
+import threading
+import time
+from contextlib import contextmanager
+from plaid import ApiException
+from urllib3.exceptions import HTTPError
+from typing import Callable, Dict, Iterator, NamedTuple, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class RateLimit(NamedTuple):
+    # Requests per second, and how many may be sent at once after a pause
+    rate: float
+    burst: int
+
+
+# Kept under Plaid's per-client limits, which apply across all items
+DEFAULT_RATE_LIMITS = {
+    "transactions_sync": RateLimit(rate=10.0, burst=20),
+    "accounts_balance_get": RateLimit(rate=5.0, burst=10),
+    "link_token_create": RateLimit(rate=5.0, burst=10),
+    "item_public_token_exchange": RateLimit(rate=5.0, burst=10),
+}
+DEFAULT_RATE_LIMIT = RateLimit(rate=5.0, burst=10)
+# Requests in flight for any one item (access token) at a time
+DEFAULT_MAX_CONCURRENT_PER_ITEM = 2
+
+# Plaid errors worth retrying: rate limits, and errors on Plaid's or the
+# institution's side. Others, such as ITEM_LOGIN_REQUIRED, need the user.
+RETRYABLE_ERROR_TYPES = {"RATE_LIMIT_EXCEEDED", "API_ERROR"}
+RETRYABLE_ERROR_CODES = {"INSTITUTION_DOWN", "INSTITUTION_NOT_RESPONDING"}
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class RetryPolicy(NamedTuple):
+    max_attempts: int = 5
+    # Seconds before the first retry, doubling with each one after
+    base_delay: float = 0.5
+    max_delay: float = 30.0
+
+
+class TokenBucket:
+    def __init__(
+        self,
+        rate_limit: RateLimit,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self._rate = rate_limit.rate
+        self._burst = rate_limit.burst
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = float(rate_limit.burst)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        # Blocks until a token is available, then takes it
+        while True:
+            wait = self._take()
+            if wait == 0:
+                return
+            self._sleep(wait)
+
+    def try_acquire(self) -> bool:
+        return self._take() == 0
+
+    def _take(self) -> float:
+        # Takes a token, or returns the seconds until one is available
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self._rate
+
+    def drain(self):
+        # Called when Plaid reports a rate limit, so that every caller backs
+        # off rather than only the one that was refused
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens, 0.0)
+
+    def _refill(self):
+        now = self._clock()
+        elapsed = now - self._updated
+        self._tokens = min(self._burst, self._tokens + elapsed * self._rate)
+        self._updated = now
+
+
+class PlaidScheduler:
+    """Runs Plaid API requests within rate limits, retrying transient errors.
+
+    Each endpoint has a token bucket shared by every item, each item has a cap
+    on its requests in flight, and rate limit and server errors are retried
+    with jittered exponential backoff.
+    """
+
+    def __init__(
+        self,
+        rate_limits: Optional[Dict[str, RateLimit]] = None,
+        max_concurrent_per_item: int = DEFAULT_MAX_CONCURRENT_PER_ITEM,
+        retry_policy: RetryPolicy = RetryPolicy(),
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self._rate_limits = DEFAULT_RATE_LIMITS if rate_limits is None else rate_limits
+        self._max_concurrent_per_item = max_concurrent_per_item
+        self._retry_policy = retry_policy
+        self._clock = clock
+        self._sleep = sleep
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._item_slots: Dict[str, threading.Semaphore] = {}
+        self._lock = threading.Lock()
+
+    def call(
+        self,
+        endpoint: str,
+        item: Optional[str],
+        request: Callable[[], T],
+        idempotent: bool = True,
+    ) -> T:
+        # Requests that are not idempotent are only retried when refused for
+        # the rate limit. After a timeout, a dropped connection or a server
+        # error, they may have been carried out.
+        bucket = self._bucket(endpoint)
+        with self._item_slot(item):
+            attempt = 0
+            while True:
+                bucket.acquire()
+                try:
+                    return request()
+                except (ApiException, HTTPError) as e:
+                    attempt += 1
+                    if attempt >= self._retry_policy.max_attempts:
+                        raise
+                    if not idempotent and not _is_rate_limited(e):
+                        raise
+                    delay = self._retry_delay(e, attempt)
+                    if delay is None:
+                        raise
+                    if _is_rate_limited(e):
+                        bucket.drain()
+                self._sleep(delay)
+
+    def _bucket(self, endpoint: str) -> TokenBucket:
+        with self._lock:
+            bucket = self._buckets.get(endpoint)
+            if bucket is None:
+                rate_limit = self._rate_limits.get(endpoint, DEFAULT_RATE_LIMIT)
+                bucket = self._buckets[endpoint] = TokenBucket(
+                    rate_limit, clock=self._clock, sleep=self._sleep
+                )
+        return bucket
+
+    @contextmanager
+    def _item_slot(self, item: Optional[str]) -> Iterator[None]:
+        # Requests not made for an item, such as creating a link token, are
+        # only rate limited
+        if item is None:
+            yield
+            return
+        with self._lock:
+            slot = self._item_slots.get(item)
+            if slot is None:
+                slot = self._item_slots[item] = threading.Semaphore(
+                    self._max_concurrent_per_item
+                )
+        with slot:
+            yield
+
+    def _retry_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        # None if the error is not worth retrying
+        if not _is_retryable(error):
+            return None
+        policy = self._retry_policy
+        # Full jitter, so that items refused together do not retry together
+        backoff = min(policy.max_delay, policy.base_delay * 2 ** (attempt - 1))
+        delay = random.uniform(0, backoff)
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            delay = max(delay, min(policy.max_delay, retry_after))
+        return delay
+
+
+def _is_retryable(error: Exception) -> bool:
+    if not isinstance(error, ApiException):
+        # Timeouts and dropped connections
+        return True
+    error_type, error_code = plaid_error(error)
+    return (
+        error.status in RETRYABLE_STATUSES
+        or error_type in RETRYABLE_ERROR_TYPES
+        or error_code in RETRYABLE_ERROR_CODES
+    )
+
+
+def _is_rate_limited(error: Exception) -> bool:
+    if not isinstance(error, ApiException):
+        return False
+    error_type, _ = plaid_error(error)
+    return error.status == 429 or error_type == "RATE_LIMIT_EXCEEDED"
+
+
+def plaid_error(error: ApiException) -> tuple:
+    # The error_type and error_code from the body of a Plaid error response
+    try:
+        body = json.loads(error.body)
+    except (TypeError, ValueError):
+        return None, None
+    if not isinstance(body, dict):
+        return None, None
+    return body.get("error_type"), body.get("error_code")
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    headers = getattr(error, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,66 @@
+import bisect
+from datetime import datetime, timezone
+from onm.common import Amount, BalanceSnapshot
+from typing import Dict, List, Optional
+
+
+def utc_timestamp(timestamp: datetime) -> datetime:
+    # Naive timestamps are taken to be in UTC
+    if timestamp.tzinfo is None:
+        return timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.astimezone(timezone.utc)
+
+
+class BalanceHistory:
+    """Series of balances per account, sorted by time.
+
+    A balance is only recorded when it differs from the account's previous
+    one, so each snapshot holds until the next. Ranges are found by binary
+    search over the timestamps.
+    """
+
+    def __init__(self):
+        self._timestamps: Dict[str, List[datetime]] = {}
+        self._balances: Dict[str, List[Amount]] = {}
+
+    def add(self, snapshot: BalanceSnapshot) -> bool:
+        # Returns whether the balance changed and the snapshot was kept
+        timestamp = utc_timestamp(snapshot.timestamp)
+        timestamps = self._timestamps.setdefault(snapshot.account_name, [])
+        balances = self._balances.setdefault(snapshot.account_name, [])
+        i = bisect.bisect_right(timestamps, timestamp)
+        if i > 0 and balances[i - 1] == snapshot.balance:
+            return False
+        timestamps.insert(i, timestamp)
+        balances.insert(i, snapshot.balance)
+        return True
+
+    def latest(self, account_name: str) -> Optional[BalanceSnapshot]:
+        timestamps = self._timestamps.get(account_name)
+        if not timestamps:
+            return None
+        balance = self._balances[account_name][-1]
+        return BalanceSnapshot(account_name, timestamps[-1], balance)
+
+    def between(
+        self,
+        account_name: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ) -> List[BalanceSnapshot]:
+        # Starts with the balance in effect at `start`, which may have been
+        # recorded before it
+        timestamps = self._timestamps.get(account_name, [])
+        balances = self._balances.get(account_name, [])
+        lo = 0
+        if start is not None:
+            lo = max(bisect.bisect_right(timestamps, utc_timestamp(start)) - 1, 0)
+        hi = (
+            len(timestamps)
+            if end is None
+            else bisect.bisect_right(timestamps, utc_timestamp(end))
+        )
+        return [
+            BalanceSnapshot(account_name, timestamp, balance)
+            for timestamp, balance in zip(timestamps[lo:hi], balances[lo:hi])
+        ]
@@ -1,13 +1,34 @@
+import itertools
 from enum import Enum
 from abc import ABC, abstractmethod
-from ..common import Account, Transaction
+from collections import Counter
+from contextlib import nullcontext
+from datetime import date, datetime, time
+from ..common import Account, Amount, BalanceSnapshot, Transaction
 from ..sync import SyncCursor
 from ..source.source import Source
-from typing import NamedTuple, List, Optional, Dict, Any
+from .export import DEFAULT_CHUNK_SIZE, ExportFormat, ExportTable, ExportWriterFactory
+from .fingerprint import select_new_transactions, transaction_fingerprint
+from .rollup import Rollups
+from .transaction_table import TransactionTable
+from typing import (
+    Any,
+    ContextManager,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+)
 
 
 class DatabaseType(Enum):
     PLAIN_TEXT = "plain_text"
+    SQLITE = "sqlite"
+    IN_MEMORY = "in_memory"
 
 
 class DatabaseConfiguration(NamedTuple):
@@ -15,6 +36,134 @@ class DatabaseConfiguration(NamedTuple):
     parameters: Dict[str, Any]
 
 
+class TransactionQuery(NamedTuple):
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    account_names: Optional[List[str]] = None
+    categories: Optional[List[str]] = None
+    min_amount: Optional[Amount] = None
+    max_amount: Optional[Amount] = None
+    text: Optional[str] = None
+
+    def matches(self, transaction: Transaction) -> bool:
+        if self.start_date is not None and transaction.date < self.start_date:
+            return False
+        if self.end_date is not None and transaction.date > self.end_date:
+            return False
+        if (
+            self.account_names is not None
+            and transaction.account_name not in self.account_names
+        ):
+            return False
+        if self.categories is not None and transaction.category not in self.categories:
+            return False
+        if self.min_amount is not None and transaction.amount < self.min_amount:
+            return False
+        if self.max_amount is not None and transaction.amount > self.max_amount:
+            return False
+        if (
+            self.text is not None
+            and self.text.lower() not in transaction.description.lower()
+        ):
+            return False
+        return True
+
+
+class DatabaseSession:
+    """Unit of work that buffers changes and commits them to the database
+    together, e.g. everything written by one sync.
+
+    Used as a context manager, the session commits on exit unless an
+    exception was raised, in which case the changes are discarded. Transactions
+    already in the database are skipped on commit: by provider id if they have
+    one, otherwise by fingerprint. The numbers of transactions
+    added and skipped are kept across commits.
+
+    Changes to and removals of transactions are given by transaction id, and
+    also apply to transactions added earlier in the session. Balance snapshots
+    taken earlier are recorded with their own timestamps, ahead of the
+    balances of the session's accounts.
+    """
+
+    def __init__(self, database: "Database"):
+        self._database = database
+        self.accounts: Dict[str, Account] = {}
+        self.balances: List[BalanceSnapshot] = []
+        self.transactions: List[Transaction] = []
+        self.modified: Dict[str, Transaction] = {}
+        self.removed: Set[str] = set()
+        self.sync_cursors: Dict[str, Tuple[Source, SyncCursor]] = {}
+        self.added_transactions = 0
+        self.skipped_transactions = 0
+
+    def add_account(self, account: Account):
+        self.accounts[account.name] = account
+
+    def add_balance_snapshots(self, snapshots: List[BalanceSnapshot]):
+        self.balances += snapshots
+
+    def add_transactions(self, transactions: List[Transaction]):
+        self.transactions += transactions
+
+    def update_transactions(self, transactions: List[Transaction]):
+        for transaction in transactions:
+            if transaction.id is None:
+                raise ValueError(f"Transaction has no id: {transaction}")
+            self.modified[transaction.id] = transaction
+            self.removed.discard(transaction.id)
+
+    def remove_transactions(self, ids: List[str]):
+        for id in ids:
+            self.modified.pop(id, None)
+            self.removed.add(id)
+
+    def set_sync_cursor(self, source: Source, sync_cursor: SyncCursor):
+        self.sync_cursors[source.name] = (source, sync_cursor)
+
+    def is_empty(self) -> bool:
+        return not (
+            self.accounts
+            or self.balances
+            or self.transactions
+            or self.modified
+            or self.removed
+            or self.sync_cursors
+        )
+
+    def commit(self):
+        self.transactions = [
+            self.modified.get(t.id, t)
+            for t in self.transactions
+            if t.id not in self.removed
+        ]
+        # Deduplicated under the write lock, so that a concurrent commit cannot
+        # store the same transactions in between
+        with self._database.write_lock():
+            # Stored transactions this session changes or removes are not
+            # duplicates of anything
+            transactions = self._database.deduplicate_transactions(
+                self.transactions, excluded_ids=set(self.modified) | self.removed
+            )
+            self.added_transactions += len(transactions)
+            self.skipped_transactions += len(self.transactions) - len(transactions)
+            self.transactions = transactions
+            if not self.is_empty():
+                self._database.commit_session(self)
+        self.accounts = {}
+        self.balances = []
+        self.transactions = []
+        self.modified = {}
+        self.removed = set()
+        self.sync_cursors = {}
+
+    def __enter__(self) -> "DatabaseSession":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+
+
 class Database(ABC):
     @abstractmethod
     def add_account(self, account: Account):
@@ -32,14 +181,172 @@ class Database(ABC):
     def update_account(self, account: Account):
         pass
 
+    @abstractmethod
+    def get_balance_history(
+        self,
+        account_name: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ) -> List[BalanceSnapshot]:
+        pass
+
+    @abstractmethod
+    def add_balance_snapshots(self, snapshots: List[BalanceSnapshot]):
+        # Records balances seen at the snapshots' times, e.g. when copying
+        # history. As with accounts, unchanged balances are not recorded.
+        pass
+
     @abstractmethod
     def add_transactions(self, transactions: List[Transaction]):
         pass
 
+    @abstractmethod
+    def update_transactions(self, transactions: List[Transaction]):
+        # Replaces the stored transactions that have the same ids. Transactions
+        # that are not stored are ignored.
+        pass
+
+    @abstractmethod
+    def remove_transactions(self, ids: List[str]):
+        pass
+
+    def bulk_add_transactions(self, batches: Iterable[List[Transaction]]) -> int:
+        # Adds batches of transactions, e.g. from iter_chunks() of another
+        # database, and returns how many were added
+        count = 0
+        for batch in batches:
+            self.add_transactions(batch)
+            count += len(batch)
+        return count
+
     @abstractmethod
     def get_transactions(self) -> List[Transaction]:
         pass
 
+    @abstractmethod
+    def iter_transactions(
+        self, query: Optional[TransactionQuery] = None, limit: Optional[int] = None
+    ) -> Iterator[Transaction]:
+        pass
+
+    @abstractmethod
+    def query_transactions(self, query: TransactionQuery) -> List[Transaction]:
+        pass
+
+    def compact(self):
+        pass
+
+    def get_transaction_table(
+        self, query: Optional[TransactionQuery] = None
+    ) -> TransactionTable:
+        return TransactionTable.from_transactions(list(self.iter_transactions(query)))
+
+    def get_rollups(
+        self, start_date: Optional[date] = None, end_date: Optional[date] = None
+    ) -> Rollups:
+        # Whole months from start_date to end_date. Databases that maintain
+        # rollups override this to avoid reading the transactions.
+        query = TransactionQuery(
+            start_date=None if start_date is None else start_date.replace(day=1),
+        )
+        rollups = Rollups.from_transactions(self.iter_transactions(query))
+        return rollups.between(start_date, end_date)
+
+    def deduplicate_transactions(
+        self, transactions: List[Transaction], excluded_ids: Set[str] = frozenset()
+    ) -> List[Transaction]:
+        # Duplicates share a date, so only stored transactions within the
+        # batch's date range need to be read. Those with `excluded_ids` are
+        # not counted.
+        if len(transactions) == 0:
+            return []
+        query = TransactionQuery(
+            start_date=min(t.date for t in transactions),
+            end_date=max(t.date for t in transactions),
+            account_names=sorted({t.account_name for t in transactions}),
+        )
+        ids = {t.id for t in transactions if t.id is not None}
+        stored, stored_ids = Counter(), set()
+        for transaction in self.iter_transactions(query):
+            if transaction.id in ids:
+                stored_ids.add(transaction.id)
+            if transaction.id is None or transaction.id not in excluded_ids:
+                stored[transaction_fingerprint(transaction)] += 1
+        return select_new_transactions(transactions, stored, stored_ids)
+
+    def iter_chunks(
+        self,
+        table: ExportTable,
+        query: Optional[TransactionQuery] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> Iterator[List[NamedTuple]]:
+        # Rows in chunks of at most `chunk_size`, read lazily so that only one
+        # chunk of transactions is held at a time. The query's account names
+        # and dates also filter accounts and balance history.
+        query = query or TransactionQuery()
+        if table == ExportTable.TRANSACTIONS:
+            rows = self.iter_transactions(query)
+        elif table == ExportTable.ACCOUNTS:
+            rows = (
+                a
+                for a in self.get_accounts()
+                if query.account_names is None or a.name in query.account_names
+            )
+        else:
+            rows = itertools.chain.from_iterable(
+                self.get_balance_history(
+                    a.name,
+                    start=_day_start(query.start_date),
+                    end=_day_end(query.end_date),
+                )
+                for a in self.get_accounts()
+                if query.account_names is None or a.name in query.account_names
+            )
+        while True:
+            chunk = list(itertools.islice(rows, chunk_size))
+            if len(chunk) == 0:
+                return
+            yield chunk
+
+    def export(
+        self,
+        path: str,
+        format: ExportFormat,
+        table: ExportTable = ExportTable.TRANSACTIONS,
+        query: Optional[TransactionQuery] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> int:
+        # Returns the number of rows written
+        count = 0
+        with ExportWriterFactory.create_writer(format, path, table) as writer:
+            for chunk in self.iter_chunks(table, query, chunk_size):
+                writer.write(chunk)
+                count += len(chunk)
+        return count
+
+    def session(self) -> DatabaseSession:
+        return DatabaseSession(self)
+
+    def write_lock(self) -> ContextManager:
+        # Excludes other writers, including those in other processes
+        return nullcontext()
+
+    def sync_lock(self, source_name: str) -> ContextManager:
+        # Held for the whole of a source's sync, from reading its cursor to
+        # committing, so that a source is only synced by one process at a time
+        return nullcontext()
+
+    def commit_session(self, session: DatabaseSession):
+        # Databases without atomic multi-record writes apply the changes in turn
+        self.add_balance_snapshots(session.balances)
+        for account in session.accounts.values():
+            self.add_account(account)
+        self.remove_transactions(list(session.removed))
+        self.update_transactions(list(session.modified.values()))
+        self.add_transactions(session.transactions)
+        for source, sync_cursor in session.sync_cursors.values():
+            self.set_sync_cursor(source, sync_cursor)
+
     @abstractmethod
     def set_sync_cursor(self, source: Source, sync_cursor: SyncCursor):
         pass
@@ -53,5 +360,19 @@ class Database(ABC):
         pass
 
     @abstractmethod
-    def get_source(self, name: str) -> Source:
+    def get_source(self, name: str, resolve: bool = True) -> Source:
+        # Secret commands in the source's configuration are run unless
+        # `resolve` is False, e.g. to copy the source elsewhere
         pass
+
+    @abstractmethod
+    def get_source_names(self) -> List[str]:
+        pass
+
+
+def _day_start(d: Optional[date]) -> Optional[datetime]:
+    return None if d is None else datetime.combine(d, time.min)
+
+
+def _day_end(d: Optional[date]) -> Optional[datetime]:
+    return None if d is None else datetime.combine(d, time.max)
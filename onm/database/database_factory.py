@@ -1,5 +1,7 @@
 from .database import DatabaseType, Database, DatabaseConfiguration
 from .plain_text_database import PlainTextDatabase
+from .sqlite_database import SqliteDatabase
+from .in_memory_database import InMemoryDatabase
 
 
 class DatabaseFactory:
@@ -8,5 +10,9 @@ class DatabaseFactory:
         type = database_config.type
         if type == DatabaseType.PLAIN_TEXT:
             return PlainTextDatabase(**database_config.parameters)
+        elif type == DatabaseType.SQLITE:
+            return SqliteDatabase(**database_config.parameters)
+        elif type == DatabaseType.IN_MEMORY:
+            return InMemoryDatabase(**database_config.parameters)
         else:
             raise ValueError("Unknown database type")
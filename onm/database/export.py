@@ -0,0 +1,155 @@
+import csv
+import json
+from abc import ABC, abstractmethod
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+from onm.common import Account, Amount, BalanceSnapshot, Transaction
+from typing import Any, Dict, List, NamedTuple, Type
+
+# Rows are written (and, for Parquet, buffered) this many at a time
+DEFAULT_CHUNK_SIZE = 10000
+
+
+class ExportFormat(Enum):
+    CSV = "csv"
+    JSONL = "jsonl"
+    PARQUET = "parquet"
+
+
+class ExportTable(Enum):
+    TRANSACTIONS = "transactions"
+    ACCOUNTS = "accounts"
+    BALANCES = "balances"
+
+
+EXPORT_ROW_TYPES: Dict[ExportTable, Type[NamedTuple]] = {
+    ExportTable.TRANSACTIONS: Transaction,
+    ExportTable.ACCOUNTS: Account,
+    ExportTable.BALANCES: BalanceSnapshot,
+}
+
+
+class ExportWriter(ABC):
+    """Writes rows of one type (e.g. Transaction) to a file, a chunk at a time.
+
+    Amounts are written exactly: as decimal strings in text formats and as
+    decimals in Parquet.
+    """
+
+    def __init__(self, path: str, row_type: Type[NamedTuple]):
+        self._path = path
+        self._fields: Dict[str, Any] = dict(row_type.__annotations__)
+
+    @abstractmethod
+    def write(self, rows: List[NamedTuple]):
+        pass
+
+    @abstractmethod
+    def close(self):
+        pass
+
+    def __enter__(self) -> "ExportWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class CsvExportWriter(ExportWriter):
+    def __init__(self, path: str, row_type: Type[NamedTuple]):
+        super().__init__(path, row_type)
+        self._file = open(path, "w", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(list(self._fields))
+
+    def write(self, rows: List[NamedTuple]):
+        self._writer.writerows([_text_value(v) for v in row] for row in rows)
+
+    def close(self):
+        self._file.close()
+
+
+class JsonLinesExportWriter(ExportWriter):
+    def __init__(self, path: str, row_type: Type[NamedTuple]):
+        super().__init__(path, row_type)
+        self._file = open(path, "w", encoding="utf-8")
+
+    def write(self, rows: List[NamedTuple]):
+        self._file.writelines(
+            json.dumps({k: _text_value(v) for k, v in row._asdict().items()}) + "\n"
+            for row in rows
+        )
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetExportWriter(ExportWriter):
+    # Each chunk is written as a row group
+    def __init__(self, path: str, row_type: Type[NamedTuple]):
+        super().__init__(path, row_type)
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Parquet export requires pyarrow (pip install pyarrow)")
+        self._pa = pa
+        self._schema = pa.schema(
+            [(name, _parquet_type(pa, t)) for name, t in self._fields.items()]
+        )
+        self._writer = pq.ParquetWriter(path, self._schema)
+
+    def write(self, rows: List[NamedTuple]):
+        columns = {
+            name: [_parquet_value(row[i]) for row in rows]
+            for i, name in enumerate(self._fields)
+        }
+        table = self._pa.Table.from_pydict(columns, schema=self._schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        self._writer.close()
+
+
+class ExportWriterFactory:
+    @staticmethod
+    def create_writer(
+        format: ExportFormat, path: str, table: ExportTable
+    ) -> ExportWriter:
+        row_type = EXPORT_ROW_TYPES[table]
+        if format == ExportFormat.CSV:
+            return CsvExportWriter(path, row_type)
+        elif format == ExportFormat.JSONL:
+            return JsonLinesExportWriter(path, row_type)
+        elif format == ExportFormat.PARQUET:
+            return ParquetExportWriter(path, row_type)
+        raise ValueError(f"Unsupported export format: {format}")
+
+
+def _text_value(value: Any) -> Any:
+    if isinstance(value, Enum):
+        return value.value
+    elif isinstance(value, Amount):
+        return str(value)
+    elif isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def _parquet_value(value: Any) -> Any:
+    if isinstance(value, Enum):
+        return value.value
+    elif isinstance(value, Amount):
+        return Decimal(str(value))
+    return value
+
+
+def _parquet_type(pa, t: type):
+    if t is Amount:
+        return pa.decimal128(18, 2)
+    elif t is datetime:
+        return pa.timestamp("s", tz="UTC")
+    elif t is date:
+        return pa.date32()
+    return pa.string()
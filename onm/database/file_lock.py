@@ -0,0 +1,66 @@
+import os
+import fcntl
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+from urllib.parse import quote
+
+SYNC_LOCKS = "locks"
+LOCK_SUFFIX = ".lock"
+
+
+class FileLock:
+    """Advisory reader-writer lock on a lock file, shared between processes.
+
+    Locks are reentrant: a holder may take the lock again, e.g. when one
+    locked method calls another, and the file lock is released when the
+    outermost hold ends. A shared lock cannot be upgraded to an exclusive
+    one. Threads within a process take turns holding the lock.
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        self._mutex = threading.RLock()
+        self._fd = None
+        self._mode = None
+        self._depth = 0
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def shared(self):
+        return self._hold(fcntl.LOCK_SH)
+
+    def exclusive(self):
+        return self._hold(fcntl.LOCK_EX)
+
+    @contextmanager
+    def _hold(self, mode: int) -> Iterator[None]:
+        with self._mutex:
+            if self._depth == 0:
+                os.makedirs(os.path.dirname(self._path) or ".", exist_ok=True)
+                fd = os.open(self._path, os.O_RDWR | os.O_CREAT, 0o644)
+                try:
+                    fcntl.flock(fd, mode)
+                except BaseException:
+                    os.close(fd)
+                    raise
+                self._fd, self._mode = fd, mode
+            elif mode == fcntl.LOCK_EX and self._mode == fcntl.LOCK_SH:
+                raise RuntimeError(f"Cannot upgrade shared lock on '{self._path}'")
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+                if self._depth == 0:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+                    os.close(self._fd)
+                    self._fd, self._mode = None, None
+
+
+def sync_lock(directory: str, source_name: str) -> FileLock:
+    # One lock file per source, e.g. <database>/locks/Apple%20Card.lock
+    filename = quote(source_name, safe="") + LOCK_SUFFIX
+    return FileLock(os.path.join(directory, SYNC_LOCKS, filename))
@@ -0,0 +1,66 @@
+import hashlib
+from collections import Counter
+from onm.common import Transaction, TransactionType
+from typing import Container, List, Optional
+
+
+def normalize_description(description: str) -> str:
+    return " ".join(description.lower().split())
+
+
+def fingerprint(
+    date_str: str, account_name: str, signed_cents: int, description: str
+) -> int:
+    key = "|".join(
+        [
+            date_str,
+            account_name,
+            str(int(signed_cents)),
+            normalize_description(description),
+        ]
+    )
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def transaction_fingerprint(transaction: Transaction) -> int:
+    amount = transaction.amount
+    if transaction.type == TransactionType.DEBIT:
+        amount = -amount
+    return fingerprint(
+        transaction.date.isoformat(),
+        transaction.account_name,
+        amount,
+        transaction.description,
+    )
+
+
+def select_new_transactions(
+    transactions: List[Transaction],
+    stored: Counter,
+    stored_ids: Container[str],
+    excluded: Optional[Counter] = None,
+) -> List[Transaction]:
+    # A transaction with a provider id is new unless that id is stored or
+    # earlier in the batch, however much it looks like another one.
+    #
+    # Others are matched by fingerprint. Fingerprints are counted rather than
+    # just tested for membership, since a statement can legitimately list the
+    # same purchase twice in a day. The n-th copy of a fingerprint in the
+    # batch is new only if fewer than n copies are stored, not counting the
+    # `excluded` ones about to be changed or removed.
+    excluded = excluded or Counter()
+    seen = Counter()
+    seen_ids = set()
+    new_transactions = []
+    for transaction in transactions:
+        if transaction.id is not None:
+            if transaction.id not in stored_ids and transaction.id not in seen_ids:
+                new_transactions.append(transaction)
+            seen_ids.add(transaction.id)
+            continue
+        key = transaction_fingerprint(transaction)
+        seen[key] += 1
+        if seen[key] > stored[key] - excluded[key]:
+            new_transactions.append(transaction)
+    return new_transactions
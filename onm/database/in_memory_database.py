@@ -0,0 +1,300 @@
+import bisect
+import heapq
+import itertools
+from collections import Counter
+from datetime import date, datetime, timezone
+from onm.secret import resolve_secrets
+from onm.source.source import Source
+from onm.source.source_factory import SourceFactory
+from onm.sync import SyncCursor
+from .database import Database, TransactionQuery
+from .fingerprint import select_new_transactions, transaction_fingerprint
+from .balance_history import BalanceHistory
+from .plain_text_database import PlainTextDatabase
+from .rollup import Rollups
+from onm.common import Account, BalanceSnapshot, Transaction
+from typing import Dict, Iterator, List, Optional, Set
+
+
+class _TransactionList:
+    # Transactions kept newest-first with a parallel list of sort keys, so
+    # that date ranges can be found by binary search.
+
+    def __init__(self):
+        self.transactions: List[Transaction] = []
+        self.keys: List[int] = []
+
+    def add(self, transaction: Transaction):
+        key = -transaction.date.toordinal()
+        # Same-day records are placed ahead of older ones
+        i = bisect.bisect_left(self.keys, key)
+        self.keys.insert(i, key)
+        self.transactions.insert(i, transaction)
+
+    def remove(self, transaction: Transaction):
+        key = -transaction.date.toordinal()
+        start = bisect.bisect_left(self.keys, key)
+        end = bisect.bisect_right(self.keys, key)
+        i = start + self.transactions[start:end].index(transaction)
+        del self.keys[i]
+        del self.transactions[i]
+
+    def between(self, query: TransactionQuery) -> Iterator[Transaction]:
+        start, end = 0, len(self.keys)
+        if query.end_date is not None:
+            start = bisect.bisect_left(self.keys, -query.end_date.toordinal())
+        if query.start_date is not None:
+            end = bisect.bisect_right(self.keys, -query.start_date.toordinal())
+        return itertools.islice(self.transactions, start, end)
+
+
+class InMemoryDatabase(Database):
+    """Database held entirely in process memory.
+
+    If a database path is given, the plain text database there is loaded on
+    creation and changes are written back to it by flush().
+    """
+
+    def __init__(self, database_path: Optional[str] = None, **plain_text_parameters):
+        self._accounts: Dict[str, Account] = {}
+        self._balances = BalanceHistory()
+        self._transactions = _TransactionList()
+        self._transactions_by_account: Dict[str, _TransactionList] = {}
+        self._fingerprints = Counter()
+        self._transactions_by_id: Dict[str, List[Transaction]] = {}
+        self._rollups = Rollups()
+        self._cursors: Dict[str, SyncCursor] = {}
+        self._sources: Dict[str, Dict] = {}
+
+        self._plain_text_database = None
+        if database_path is not None:
+            self._plain_text_database = PlainTextDatabase(
+                database_path, **plain_text_parameters
+            )
+            self._load()
+        self._dirty_accounts = set()
+        # Written back with their own timestamps, so that the history on disk
+        # matches the one kept here
+        self._new_balances: List[BalanceSnapshot] = []
+        self._new_transactions: List[Transaction] = []
+        self._modified_transactions: Dict[str, Transaction] = {}
+        self._removed_transactions = set()
+        self._dirty_cursors = set()
+        self._new_sources: Dict[str, Source] = {}
+
+    def _load(self):
+        for account in self._plain_text_database.get_accounts():
+            self._accounts[account.name] = account
+            for snapshot in self._plain_text_database.get_balance_history(account.name):
+                self._balances.add(snapshot)
+        # Loaded newest-first, so appending keeps the lists sorted
+        for transaction in self._plain_text_database.iter_transactions():
+            for transactions in [
+                self._transactions,
+                self._transactions_by_account.setdefault(
+                    transaction.account_name, _TransactionList()
+                ),
+            ]:
+                transactions.transactions.append(transaction)
+                transactions.keys.append(-transaction.date.toordinal())
+            self._index(transaction)
+
+    def flush(self):
+        if self._plain_text_database is None:
+            raise ValueError("In-memory database has no database_path to flush to")
+        database = self._plain_text_database
+        for source in self._new_sources.values():
+            database.add_source(source)
+        # Everything else is written in one session, so that either all of it
+        # lands or none does
+        session = database.session()
+        for name in self._dirty_accounts:
+            session.add_account(self._accounts[name])
+        session.add_balance_snapshots(self._new_balances)
+        # Changes also apply to the transactions added since the last flush
+        session.add_transactions(
+            [
+                self._modified_transactions.get(t.id, t)
+                for t in self._new_transactions
+                if t.id not in self._removed_transactions
+            ]
+        )
+        session.update_transactions(list(self._modified_transactions.values()))
+        session.remove_transactions(list(self._removed_transactions))
+        for name in self._dirty_cursors:
+            session.set_sync_cursor(_SourceName(name), self._cursors[name])
+        # Committed as is rather than deduplicated, as add_transactions() would
+        database.commit_session(session)
+        self._dirty_accounts = set()
+        self._new_balances = []
+        self._new_transactions = []
+        self._modified_transactions = {}
+        self._removed_transactions = set()
+        self._dirty_cursors = set()
+        self._new_sources = {}
+
+    def add_account(self, account: Account):
+        self._accounts[account.name] = account
+        self._dirty_accounts.add(account.name)
+        self.add_balance_snapshots(
+            [BalanceSnapshot(account.name, datetime.now(timezone.utc), account.balance)]
+        )
+
+    def get_account(self, name: str) -> Account:
+        try:
+            return self._accounts[name]
+        except KeyError:
+            raise ValueError(f"Account '{name}' is not in the database")
+
+    def get_accounts(self) -> List[Account]:
+        return list(self._accounts.values())
+
+    def get_balance_history(
+        self,
+        account_name: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ) -> List[BalanceSnapshot]:
+        return self._balances.between(account_name, start, end)
+
+    def add_balance_snapshots(self, snapshots: List[BalanceSnapshot]):
+        for snapshot in snapshots:
+            if self._balances.add(snapshot):
+                self._new_balances.append(snapshot)
+
+    def update_account(self, account: Account):
+        if account.name not in self._accounts:
+            raise ValueError(f"Account '{account.name}' is not in the database")
+        self.add_account(account)
+
+    def add_transactions(self, transactions: List[Transaction]):
+        for transaction in transactions:
+            self._add(transaction)
+        self._new_transactions += transactions
+
+    def update_transactions(self, transactions: List[Transaction]):
+        # Found by id, so only the changed transactions are touched
+        for transaction in transactions:
+            if transaction.id not in self._transactions_by_id:
+                continue
+            for stored in list(self._transactions_by_id[transaction.id]):
+                self._remove(stored)
+            self._add(transaction)
+            self._modified_transactions[transaction.id] = transaction
+
+    def remove_transactions(self, ids: List[str]):
+        for id in ids:
+            if id not in self._transactions_by_id:
+                continue
+            for stored in list(self._transactions_by_id[id]):
+                self._remove(stored)
+            self._modified_transactions.pop(id, None)
+            self._removed_transactions.add(id)
+
+    def _add(self, transaction: Transaction):
+        self._transactions.add(transaction)
+        self._transactions_by_account.setdefault(
+            transaction.account_name, _TransactionList()
+        ).add(transaction)
+        self._index(transaction)
+
+    def _index(self, transaction: Transaction):
+        self._fingerprints[transaction_fingerprint(transaction)] += 1
+        if transaction.id is not None:
+            self._transactions_by_id.setdefault(transaction.id, []).append(transaction)
+        self._rollups.add(transaction)
+
+    def _remove(self, transaction: Transaction):
+        self._transactions.remove(transaction)
+        self._transactions_by_account[transaction.account_name].remove(transaction)
+        self._fingerprints[transaction_fingerprint(transaction)] -= 1
+        stored = self._transactions_by_id[transaction.id]
+        stored.remove(transaction)
+        if len(stored) == 0:
+            del self._transactions_by_id[transaction.id]
+        self._rollups.remove(transaction)
+
+    def deduplicate_transactions(
+        self, transactions: List[Transaction], excluded_ids: Set[str] = frozenset()
+    ) -> List[Transaction]:
+        excluded = Counter(
+            transaction_fingerprint(t)
+            for id in excluded_ids
+            for t in self._transactions_by_id.get(id, [])
+        )
+        return select_new_transactions(
+            transactions, self._fingerprints, self._transactions_by_id, excluded
+        )
+
+    def get_transactions(self) -> List[Transaction]:
+        return list(self._transactions.transactions)
+
+    def get_rollups(
+        self, start_date: Optional[date] = None, end_date: Optional[date] = None
+    ) -> Rollups:
+        return self._rollups.between(start_date, end_date)
+
+    def iter_transactions(
+        self, query: Optional[TransactionQuery] = None, limit: Optional[int] = None
+    ) -> Iterator[Transaction]:
+        query = query or TransactionQuery()
+        if query.account_names is None:
+            transactions = self._transactions.between(query)
+        else:
+            transactions = heapq.merge(
+                *[
+                    self._transactions_by_account[name].between(query)
+                    for name in query.account_names
+                    if name in self._transactions_by_account
+                ],
+                key=lambda t: t.date,
+                reverse=True,
+            )
+        transactions = (t for t in transactions if query.matches(t))
+        yield from itertools.islice(transactions, limit)
+
+    def query_transactions(self, query: TransactionQuery) -> List[Transaction]:
+        return list(self.iter_transactions(query))
+
+    def set_sync_cursor(self, source: Source, sync_cursor: SyncCursor):
+        self._cursors[source.name] = sync_cursor
+        self._dirty_cursors.add(source.name)
+
+    def get_sync_cursor(self, source: Source) -> Optional[SyncCursor]:
+        if source.name not in self._cursors and self._plain_text_database is not None:
+            sync_cursor = self._plain_text_database.get_sync_cursor(source)
+            if sync_cursor is not None:
+                self._cursors[source.name] = sync_cursor
+        return self._cursors.get(source.name, None)
+
+    def get_source_names(self) -> List[str]:
+        names = list(self._sources)
+        if self._plain_text_database is not None:
+            names = self._plain_text_database.get_source_names() + names
+        return list(dict.fromkeys(names))
+
+    def add_source(self, source: Source):
+        source_dict = source.serialize()
+        source_name = source_dict.pop("name")
+        self._sources[source_name] = source_dict
+        self._new_sources[source_name] = source
+
+    def get_source(self, name: str, resolve: bool = True) -> Source:
+        if name not in self._sources and self._plain_text_database is not None:
+            return self._plain_text_database.get_source(name, resolve)
+        try:
+            source_dict = dict(self._sources[name])
+        except KeyError:
+            raise ValueError(f"Source '{name}' is not in the database")
+        if resolve:
+            source_dict = resolve_secrets(source_dict)
+        source_dict["name"] = name
+        return SourceFactory.deserialize(source_dict)
+
+
+class _SourceName:
+    # Cursors are keyed by source name only, so flushing them does not require
+    # deserializing (and resolving the secrets of) each source.
+
+    def __init__(self, name: str):
+        self.name = name
@@ -0,0 +1,102 @@
+import hashlib
+from onm.common import Transaction
+from .database import Database
+from .export import DEFAULT_CHUNK_SIZE, ExportTable
+from .in_memory_database import InMemoryDatabase
+from typing import Iterable, NamedTuple, Tuple
+
+CHECKSUM_MODULUS = 2**64
+
+
+class MigrationSummary(NamedTuple):
+    sources: int
+    sync_cursors: int
+    accounts: int
+    transactions: int
+    checksum: int
+
+
+def migrate(
+    from_database: Database,
+    to_database: Database,
+    batch_size: int = DEFAULT_CHUNK_SIZE,
+) -> MigrationSummary:
+    """Copy sources, sync cursors, accounts and transactions between databases.
+
+    Transactions are streamed in batches of `batch_size` through the target's
+    bulk insert path. Afterwards both databases are read again and their
+    transaction counts and checksums compared, and a ValueError is raised if
+    they differ. Balance history is not copied. An in-memory target is
+    flushed to its plain text database.
+    """
+    if (
+        to_database.get_source_names()
+        or to_database.get_accounts()
+        or next(to_database.iter_transactions(limit=1), None) is not None
+    ):
+        raise ValueError("Can only migrate to an empty database")
+
+    # Secrets are copied as the commands that produce them, not their values
+    source_names = from_database.get_source_names()
+    sync_cursors = 0
+    for name in source_names:
+        source = from_database.get_source(name, resolve=False)
+        to_database.add_source(source)
+        sync_cursor = from_database.get_sync_cursor(source)
+        if sync_cursor is not None:
+            to_database.set_sync_cursor(source, sync_cursor)
+            sync_cursors += 1
+
+    accounts = from_database.get_accounts()
+    for account in accounts:
+        to_database.add_account(account)
+
+    to_database.bulk_add_transactions(
+        from_database.iter_chunks(ExportTable.TRANSACTIONS, chunk_size=batch_size)
+    )
+    if isinstance(to_database, InMemoryDatabase):
+        to_database.flush()
+
+    expected = transactions_checksum(from_database.iter_transactions())
+    actual = transactions_checksum(to_database.iter_transactions())
+    if expected != actual:
+        raise ValueError(
+            f"Migrated transactions do not match: expected {expected[0]} with "
+            f"checksum {expected[1]:016x}, found {actual[0]} with checksum "
+            f"{actual[1]:016x}"
+        )
+    if sorted(to_database.get_accounts()) != sorted(accounts):
+        raise ValueError("Migrated accounts do not match")
+    return MigrationSummary(
+        sources=len(source_names),
+        sync_cursors=sync_cursors,
+        accounts=len(accounts),
+        transactions=actual[0],
+        checksum=actual[1],
+    )
+
+
+def transactions_checksum(transactions: Iterable[Transaction]) -> Tuple[int, int]:
+    # Count and order-independent checksum: the sum of a hash of every field
+    # of each transaction
+    count, checksum = 0, 0
+    for transaction in transactions:
+        count += 1
+        checksum = (checksum + _transaction_hash(transaction)) % CHECKSUM_MODULUS
+    return count, checksum
+
+
+def _transaction_hash(transaction: Transaction) -> int:
+    key = "\n".join(
+        [
+            transaction.date.isoformat(),
+            transaction.description,
+            str(int(transaction.amount)),
+            transaction.category,
+            transaction.account_name,
+            transaction.type.value,
+            transaction.id or "",
+        ]
+    )
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
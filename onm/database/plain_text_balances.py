@@ -0,0 +1,93 @@
+import os
+import re
+from datetime import datetime, timezone
+from onm.common import Account, Amount, BalanceSnapshot
+from .balance_history import BalanceHistory, utc_timestamp
+from typing import List, Optional
+
+TIMESTAMP_FMT = r"%Y-%m-%dT%H:%M:%SZ"
+
+# <timestamp> <account name> $<balance>
+BALANCE_PATTERN = re.compile(rb"^(\S+)[ \t]+([^\n]*)\$([^\s$]+)[ \t]*$")
+
+
+class BalanceStore:
+    """Append-only history of account balances, one line per change.
+
+    Only lines appended since the last read are parsed, so the history is
+    kept in memory and brought up to date cheaply. It is reloaded if the file
+    shrinks, e.g. after a hand edit. A torn final line is ignored.
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        self._history = BalanceHistory()
+        self._offset = 0
+        self._torn = False
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def history(self) -> BalanceHistory:
+        size = os.path.getsize(self._path) if os.path.exists(self._path) else 0
+        if size < self._offset:
+            self._history, self._offset = BalanceHistory(), 0
+        if size > self._offset:
+            self._read(size)
+        return self._history
+
+    def record(self, accounts: List[Account], timestamp: Optional[datetime] = None):
+        timestamp = utc_timestamp(timestamp or datetime.now(timezone.utc))
+        self.add(
+            [
+                BalanceSnapshot(account.name, timestamp, account.balance)
+                for account in accounts
+            ]
+        )
+
+    def add(self, snapshots: List[BalanceSnapshot]):
+        # Lines need not be in time order, since the history is sorted on read
+        history = self.history()
+        lines = [
+            _balance_line(snapshot) for snapshot in snapshots if history.add(snapshot)
+        ]
+        if not lines:
+            return
+        if self._torn:
+            # Start on a new line rather than extending the torn one
+            lines.insert(0, b"\n")
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        with open(self._path, "ab") as f:
+            f.write(b"".join(lines))
+        self._offset = os.path.getsize(self._path)
+        self._torn = False
+
+    def _read(self, size: int):
+        with open(self._path, "rb") as f:
+            f.seek(self._offset)
+            content = f.read(size - self._offset)
+        # Only whole lines are consumed
+        end = content.rfind(b"\n") + 1
+        self._torn = end < len(content)
+        for line in content[:end].splitlines():
+            match = BALANCE_PATTERN.match(line)
+            if match is None:
+                continue
+            timestamp, account_name, balance = match.groups()
+            try:
+                snapshot = BalanceSnapshot(
+                    account_name=account_name.decode("utf-8").strip(),
+                    timestamp=datetime.strptime(timestamp.decode(), TIMESTAMP_FMT),
+                    balance=Amount.parse(balance),
+                )
+            except ValueError:
+                continue
+            self._history.add(snapshot)
+        self._offset += end
+
+
+def _balance_line(snapshot: BalanceSnapshot) -> bytes:
+    timestamp = utc_timestamp(snapshot.timestamp).strftime(TIMESTAMP_FMT)
+    line = f"{timestamp} {snapshot.account_name} ${snapshot.balance}\n"
+    return line.encode("utf-8")
@@ -0,0 +1,117 @@
+import os
+import csv
+import json
+from onm.sync import SyncCursor, create_sync_cursor, get_sync_cursor_type_from
+from typing import Dict, Optional, Tuple
+
+# Compact once superseded lines outnumber live ones by this factor
+COMPACT_RATIO = 4
+
+
+class CursorStore:
+    """Sync cursors keyed by source name, stored as JSON lines.
+
+    Updates are appended as new lines and the last line for a source wins, so
+    setting a cursor does not rewrite the file. Lines are folded together once
+    superseded ones pile up. A torn final line (e.g. after a crash mid-write)
+    is ignored. Reads are served from memory until the file changes.
+    """
+
+    def __init__(self, path: str, legacy_csv_path: Optional[str] = None):
+        self._path = path
+        self._cursors: Dict[str, SyncCursor] = {}
+        self._line_count = 0
+        self._torn = False
+        self._stamp: Optional[Tuple[int, int]] = None
+        if (
+            legacy_csv_path is not None
+            and os.path.exists(legacy_csv_path)
+            and not os.path.exists(path)
+        ):
+            self._migrate(legacy_csv_path)
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def get(self, source_name: str) -> Optional[SyncCursor]:
+        return self.cursors().get(source_name, None)
+
+    def cursors(self) -> Dict[str, SyncCursor]:
+        if self._stat() != self._stamp:
+            self._load()
+        return self._cursors
+
+    def set(self, source_name: str, sync_cursor: SyncCursor):
+        cursors = self.cursors()
+        if self._torn or self._line_count >= COMPACT_RATIO * max(len(cursors), 1):
+            self.write({**cursors, source_name: sync_cursor})
+            return
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        with open(self._path, "ab") as f:
+            f.write(_cursor_line(source_name, sync_cursor))
+        cursors[source_name] = sync_cursor
+        self._line_count += 1
+        self._stamp = self._stat()
+
+    def content(self, cursors: Dict[str, SyncCursor]) -> bytes:
+        return b"".join(_cursor_line(name, c) for name, c in cursors.items())
+
+    def write(self, cursors: Dict[str, SyncCursor]):
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        tmp_path = self._path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(self.content(cursors))
+        os.replace(tmp_path, self._path)
+        self._cursors = dict(cursors)
+        self._line_count = len(cursors)
+        self._torn = False
+        self._stamp = self._stat()
+
+    def _load(self):
+        self._cursors = {}
+        self._line_count = 0
+        self._torn = False
+        self._stamp = self._stat()
+        if self._stamp is None:
+            return
+        with open(self._path, "rb") as f:
+            for line in f:
+                # Appending after a torn line would corrupt the next entry
+                self._torn = not line.endswith(b"\n")
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                self._cursors[entry["source"]] = create_sync_cursor(
+                    entry["type"], entry["data"]
+                )
+                self._line_count += 1
+
+    def _migrate(self, legacy_csv_path: str):
+        # cursors.csv was written by pandas: an unnamed index column holding
+        # the source name, then the cursor type and its JSON-encoded data
+        cursors = {}
+        with open(legacy_csv_path, newline="") as f:
+            for row in csv.DictReader(f):
+                cursors[row[""]] = create_sync_cursor(
+                    row["type"], json.loads(row["data"])
+                )
+        self.write(cursors)
+        os.remove(legacy_csv_path)
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self._path)
+        except FileNotFoundError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+
+def _cursor_line(source_name: str, sync_cursor: SyncCursor) -> bytes:
+    entry = {
+        "source": source_name,
+        "type": get_sync_cursor_type_from(sync_cursor).value,
+        "data": sync_cursor.as_dict(),
+    }
+    return (json.dumps(entry) + "\n").encode("utf-8")
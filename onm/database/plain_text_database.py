@@ -1,22 +1,54 @@
 import os
+import re
+import shutil
 import json
+import heapq
+import itertools
+from collections import Counter
+from contextlib import ExitStack, contextmanager
 import tomlkit
-import shlex
-import subprocess
 from tomlkit.items import InlineTable, Table, Array
+import numpy as np
 import pandas as pd
-from datetime import datetime
+from enum import Enum
+from datetime import date, datetime
+from onm.secret import resolve_secrets
 from onm.source.source import Source
 from onm.source.source_factory import SourceFactory
-from onm.sync import SyncCursor, create_sync_cursor, get_sync_cursor_type_from
-from .database import Database
-from onm.common import Account, AccountType, TransactionType, Transaction
-from typing import Any, List, Dict, Optional
+from onm.sync import SyncCursor
+from .database import Database, DatabaseSession, TransactionQuery
+from .file_lock import LOCK_SUFFIX, FileLock, sync_lock
+from .fingerprint import select_new_transactions
+from .plain_text_index import LedgerIndex, date_key, index_records, read_records
+from .plain_text_snapshot import LedgerSnapshot
+from .plain_text_rollup import LedgerRollup, rollups_from_df
+from .rollup import Rollups
+from .plain_text_cursors import CursorStore
+from .plain_text_balances import BalanceStore
+from .transaction_table import TransactionTable, concat_tables
+from onm.common import (
+    Account,
+    AccountType,
+    Amount,
+    BalanceSnapshot,
+    TransactionType,
+    Transaction,
+)
+from typing import Any, Iterable, Iterator, List, Dict, Optional, Set, Tuple
 
 ACCOUNTS = "accounts"
+BALANCES = "balances"
 TRANSACTIONS = "transactions"
-CURSORS = "cursors.csv"
+TRANSACTIONS_LOG_SUFFIX = ".log"
+CURSORS = "cursors.jsonl"
+LEGACY_CURSORS = "cursors.csv"
 SOURCES = "sources.toml"
+JOURNAL = "journal"
+PENDING_SUFFIX = ".pending"
+# A ledger being split into partitions is built beside the old one, which is
+# then moved aside until the partitions are in place
+PARTITIONED_SUFFIX = ".partitioned"
+UNPARTITIONED_SUFFIX = ".unpartitioned"
 
 ACCOUNT_DF_COLUMNS = ["name", "account_type", "balance"]
 TRANSACTIONS_DF_COLUMNS = [
@@ -26,16 +58,44 @@ TRANSACTIONS_DF_COLUMNS = [
     "category",
     "account_name",
     "type",
+    "id",
 ]
-CURSOR_TYPE = "type"
-CURSOR_DATA = "data"
-CURSORS_DF_COLUMNS = [CURSOR_TYPE, CURSOR_DATA]
 
 SOURCE_TYPE = "type"
 ACCESS_TOKEN = "access_token"
 ACCOUNT_ID_MAP = "account_id_map"
 
 DATE_FMT = r"%Y-%m-%d"
+ID_TAG = "id:"
+REMOVED_TAG = "removed"
+
+# <ACCOUNT TYPE> <name> $<balance>
+ACCOUNT_PATTERN = re.compile(r"^[ \t]*(\S+)[ \t]+([^\n]*)\$([^\s$]+)[ \t]*$", re.M)
+# <date> <account name> $<amount>[ ; id:<transaction id>[ removed]]
+#     <description>
+#     <category>
+# Records marked removed are tombstones, which only appear in log segments
+TRANSACTION_PATTERN = re.compile(
+    r"^(\d{4}-\d{2}-\d{2})[ \t]+([^\n]*)\$([^\s$]+)"
+    r"(?:[ \t]+;[ \t]*id:(\S+)(?:[ \t]+(removed))?)?"
+    r"[ \t]*\n([^\n]*)\n([^\n]*)$",
+    re.M,
+)
+
+# [+-]<dollars>[.<cents>], once thousands separators are dropped
+AMOUNT_PATTERN = r"^([+-]?)(\d*)(?:\.(\d*))?$"
+
+
+class LedgerPartition(Enum):
+    MONTH = "month"
+    YEAR = "year"
+
+
+PARTITION_FMT = {LedgerPartition.MONTH: r"%Y-%m", LedgerPartition.YEAR: r"%Y"}
+PARTITION_PATTERN = {
+    LedgerPartition.MONTH: re.compile(r"^\d{4}-\d{2}$"),
+    LedgerPartition.YEAR: re.compile(r"^\d{4}$"),
+}
 
 
 class PlainTextDatabase(Database):
@@ -46,34 +106,82 @@ class PlainTextDatabase(Database):
         transactions_path: str = None,
         cursors_path: str = None,
         sources_path: str = None,
+        balances_path: str = None,
+        append_only: bool = False,
+        partition: Optional[str] = None,
     ):
+        self._append_only = append_only
+        self._partition = LedgerPartition(partition) if partition else None
+        self._database_path = os.path.expanduser(database_path)
+        self._journal_path = os.path.join(self._database_path, JOURNAL)
+
         self._accounts_path = PlainTextDatabase._setup_path(
             database_path, ACCOUNTS, accounts_path
         )
-        if not os.path.exists(self._accounts_path):
-            os.makedirs(os.path.dirname(self._accounts_path), exist_ok=True)
-            with open(self._accounts_path, "w") as _:
-                pass
-
         self._transactions_path = PlainTextDatabase._setup_path(
             database_path, TRANSACTIONS, transactions_path
         )
-        if not os.path.exists(self._transactions_path):
-            os.makedirs(os.path.dirname(self._transactions_path), exist_ok=True)
-            with open(self._transactions_path, "w") as _:
-                pass
-
+        # Cursors used to be kept in a CSV file, which is migrated on open
         self._cursors_path = PlainTextDatabase._setup_path(
             database_path, CURSORS, cursors_path
         )
-        if not os.path.exists(self._cursors_path):
-            os.makedirs(os.path.dirname(self._cursors_path), exist_ok=True)
-            cursors_df = pd.DataFrame(columns=CURSORS_DF_COLUMNS)
-            cursors_df.to_csv(self._cursors_path)
-
+        legacy_cursors_path = os.path.join(
+            os.path.dirname(self._cursors_path), LEGACY_CURSORS
+        )
+        if self._cursors_path.endswith(".csv"):
+            legacy_cursors_path = self._cursors_path
+            self._cursors_path = os.path.splitext(self._cursors_path)[0] + ".jsonl"
         self._sources_path = PlainTextDatabase._setup_path(
             database_path, SOURCES, sources_path
         )
+        # Written along with the accounts, under the same lock
+        self._balances = BalanceStore(
+            PlainTextDatabase._setup_path(database_path, BALANCES, balances_path)
+        )
+
+        # Advisory locks, shared by readers and exclusive to writers. They are
+        # always taken in this order, so processes cannot deadlock.
+        self._locks = {
+            name: FileLock(path + LOCK_SUFFIX)
+            for name, path in [
+                (ACCOUNTS, self._accounts_path),
+                (TRANSACTIONS, self._transactions_path),
+                (CURSORS, self._cursors_path),
+                (SOURCES, self._sources_path),
+            ]
+        }
+
+        with self._exclusive(*self._locks):
+            # Finish any session commit that was interrupted
+            if os.path.exists(self._journal_path):
+                _replay_journal(self._journal_path)
+            self._setup_files()
+            self._cursors = CursorStore(self._cursors_path, legacy_cursors_path)
+
+    def _setup_files(self):
+        if not os.path.exists(self._accounts_path):
+            os.makedirs(os.path.dirname(self._accounts_path), exist_ok=True)
+            with open(self._accounts_path, "w") as _:
+                pass
+
+        unpartitioned_path = self._transactions_path + UNPARTITIONED_SUFFIX
+        if self._partition is not None:
+            if os.path.isfile(self._transactions_path) or os.path.exists(
+                unpartitioned_path
+            ):
+                self._partition_ledger()
+            os.makedirs(self._transactions_path, exist_ok=True)
+        elif os.path.isdir(self._transactions_path) or os.path.exists(
+            unpartitioned_path
+        ):
+            raise ValueError(
+                f"'{self._transactions_path}' is partitioned; set 'partition'"
+            )
+        elif not os.path.exists(self._transactions_path):
+            os.makedirs(os.path.dirname(self._transactions_path), exist_ok=True)
+            with open(self._transactions_path, "w") as _:
+                pass
+
         if not os.path.exists(self._sources_path):
             os.makedirs(os.path.dirname(self._sources_path), exist_ok=True)
             with open(self._sources_path, "w") as _:
@@ -87,13 +195,42 @@ class PlainTextDatabase(Database):
             return os.path.expanduser(override_path)
         return os.path.join(os.path.expanduser(database_path), default_filename)
 
+    @contextmanager
+    def _shared(self, *names: str) -> Iterator[None]:
+        with ExitStack() as stack:
+            for name, lock in self._locks.items():
+                if name in names:
+                    stack.enter_context(lock.shared())
+            yield
+
+    @contextmanager
+    def _exclusive(self, *names: str) -> Iterator[None]:
+        with ExitStack() as stack:
+            for name, lock in self._locks.items():
+                if name in names:
+                    stack.enter_context(lock.exclusive())
+            yield
+
+    def write_lock(self):
+        return self._exclusive(ACCOUNTS, TRANSACTIONS, CURSORS)
+
+    def sync_lock(self, source_name: str):
+        return sync_lock(self._database_path, source_name).exclusive()
+
     def add_account(self, account: Account):
-        accounts_df = self._read_accounts()
-        accounts_df.loc[account.name] = _account_dict(account)
-        self._write_accounts_update(accounts_df)
+        with self._exclusive(ACCOUNTS):
+            accounts_df = self._read_accounts()
+            accounts_df.loc[account.name] = _account_dict(account)
+            self._write_accounts_update(accounts_df)
+            self._balances.record([account])
+
+    def add_balance_snapshots(self, snapshots: List[BalanceSnapshot]):
+        with self._exclusive(ACCOUNTS):
+            self._balances.add(snapshots)
 
     def get_account(self, name: str) -> Account:
-        accounts_df = self._read_accounts()
+        with self._shared(ACCOUNTS):
+            accounts_df = self._read_accounts()
         try:
             account = accounts_df.loc[name]
         except KeyError:
@@ -101,160 +238,425 @@ class PlainTextDatabase(Database):
         return _account_from(account)
 
     def get_accounts(self) -> List[Account]:
-        accounts_df = self._read_accounts()
+        with self._shared(ACCOUNTS):
+            accounts_df = self._read_accounts()
         return [_account_from(row) for _, row in accounts_df.iterrows()]
 
     def update_account(self, account: Account):
-        accounts_df = self._read_accounts()
-        try:
-            accounts_df.loc[account.name] = _account_dict(account)
-        except KeyError:
-            raise ValueError(f"Account '{account.name}' is not in the database")
-        self._write_accounts_update(accounts_df)
+        with self._exclusive(ACCOUNTS):
+            accounts_df = self._read_accounts()
+            try:
+                accounts_df.loc[account.name] = _account_dict(account)
+            except KeyError:
+                raise ValueError(f"Account '{account.name}' is not in the database")
+            self._write_accounts_update(accounts_df)
+            self._balances.record([account])
+
+    def get_balance_history(
+        self,
+        account_name: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ) -> List[BalanceSnapshot]:
+        with self._shared(ACCOUNTS):
+            return self._balances.history().between(account_name, start, end)
 
     def _read_accounts(self) -> pd.DataFrame:
         with open(self._accounts_path) as f:
-            accounts = []
-            end_of_file = False
-            while not end_of_file:
-                line = f.readline()
-                if line == "":
-                    end_of_file = True
-                if line.strip() != "":
-                    account_type = AccountType(line.split()[0].lower())
-                    line = " ".join(line.split()[1:])
-                    balance = float(line.split("$")[-1])
-                    account_name = "$".join(line.split("$")[:-1]).strip()
-                    accounts.append(
-                        Account(name=account_name, balance=balance, type=account_type)
-                    )
-        df = pd.DataFrame([_account_dict(t) for t in accounts])
-        if len(df) > 0:
-            df["index"] = df["name"]
-            df = df.set_index("index")
-            return df
-        else:
+            records = _parse_records(ACCOUNT_PATTERN, f.read(), self._accounts_path)
+        if len(records) == 0:
             return pd.DataFrame(columns=ACCOUNT_DF_COLUMNS)
+        account_types, names, balances = zip(*records)
+        df = pd.DataFrame(
+            {
+                "name": [name.strip() for name in names],
+                "account_type": [t.lower() for t in account_types],
+                "balance": np.array(
+                    [Amount.parse(b) for b in balances], dtype=np.int64
+                ),
+            }
+        )
+        for account_type in df["account_type"].unique():
+            AccountType(account_type)
+        df["index"] = df["name"]
+        return df.set_index("index")
 
     def _write_accounts_update(self, accounts_df: pd.DataFrame):
-        def onm_account_entry(account: Account):
-            return f"{account.type.value.upper()} {account.name} ${account.balance}"
-
         with open(self._accounts_path, "w") as f:
-            for _, account in accounts_df.iterrows():
-                f.write(onm_account_entry(_account_from(account)))
-                f.write("\n")
+            f.write(_accounts_content(accounts_df))
 
     def add_transactions(self, transactions: List[Transaction]):
-        transactions_df = self._read_transactions()
-        new_transactions_df = pd.DataFrame([_transaction_dict(t) for t in transactions])
-        transactions_df = pd.concat([transactions_df, new_transactions_df])
-        self._write_transactions_update(transactions_df)
+        if len(transactions) == 0:
+            return
+        transactions_df = _transactions_df(transactions)
+        with self._exclusive(TRANSACTIONS):
+            for path, batch_df in self._group_by_ledger(transactions_df):
+                self._add_to_ledger(path, batch_df)
+
+    def update_transactions(self, transactions: List[Transaction]):
+        # Committed as a session, since a changed transaction may move between
+        # partitions
+        session = self.session()
+        session.update_transactions(transactions)
+        self.commit_session(session)
+
+    def remove_transactions(self, ids: List[str]):
+        session = self.session()
+        session.remove_transactions(ids)
+        self.commit_session(session)
+
+    def bulk_add_transactions(self, batches: Iterable[List[Transaction]]) -> int:
+        # Batches read newest-first, as from iter_transactions(), are no newer
+        # than the records before them. Each is appended as is to the sorted
+        # ledgers as long as that keeps them sorted (and no tombstone in the
+        # log segment would strike them out), so a bulk load neither
+        # rewrites the ledgers nor holds more than one batch in memory.
+        count = 0
+        with self._exclusive(TRANSACTIONS):
+            for batch in batches:
+                transactions_df = _transactions_df(batch)
+                is_sorted = transactions_df["date"].is_monotonic_decreasing
+                for path, batch_df in self._group_by_ledger(transactions_df):
+                    if (
+                        is_sorted
+                        and _is_older(batch_df, path)
+                        and len(_removed_ids(path + TRANSACTIONS_LOG_SUFFIX)) == 0
+                    ):
+                        _write_ledger(path, batch_df, append=True)
+                    else:
+                        self._add_to_ledger(path, batch_df)
+                count += len(batch)
+        return count
+
+    def _add_to_ledger(self, path: str, transactions_df: pd.DataFrame):
+        if self._append_only:
+            _write_ledger(path + TRANSACTIONS_LOG_SUFFIX, transactions_df, append=True)
+        else:
+            _rewrite_ledger(path, transactions_df)
 
     def get_transactions(self) -> List[Transaction]:
-        transactions_df = self._read_transactions()
-        return [_transaction_from(row) for _, row in transactions_df.iterrows()]
+        transactions = []
+        with self._shared(TRANSACTIONS):
+            for path in self._ledger_paths():
+                transactions += _transactions_from_df(_read_ledger(path))
+        return transactions
 
-    def set_sync_cursor(self, source: Source, sync_cursor: SyncCursor):
-        cursors = self._read_cursors()
-        cursors[source.name] = sync_cursor
-        self._write_cursors_update(cursors)
+    def get_transaction_table(
+        self, query: Optional[TransactionQuery] = None
+    ) -> TransactionTable:
+        # Built from the ledgers' columnar snapshots. Only the date range of a
+        # query is applied here; other filters go through iter_transactions.
+        if query is not None and query != TransactionQuery(
+            start_date=query.start_date, end_date=query.end_date
+        ):
+            return super().get_transaction_table(query)
+        start_date = None if query is None else query.start_date
+        end_date = None if query is None else query.end_date
+        tables = []
+        with self._shared(TRANSACTIONS):
+            for path in self._ledger_paths(start_date, end_date):
+                table = TransactionTable.from_df(_read_ledger(path))
+                mask = np.ones(len(table), dtype=bool)
+                if start_date is not None:
+                    mask &= table.dates >= date_key(start_date)
+                if end_date is not None:
+                    mask &= table.dates <= date_key(end_date)
+                tables.append(table if mask.all() else table[mask])
+        return concat_tables(tables)
 
-    def get_sync_cursor(self, source: Source) -> SyncCursor:
-        cursors = self._read_cursors()
-        return cursors.get(source.name, None)
-
-    def _read_transactions(self) -> pd.DataFrame:
-        # TODO: more robust and efficient
-        with open(self._transactions_path) as f:
-            transactions = []
-            end_of_file = False
-            while not end_of_file:
-                line = f.readline()
-                if line == "":
-                    end_of_file = True
-                if line.strip() != "":
-                    date_str = line.split()[0]
-                    date = datetime.strptime(date_str, DATE_FMT)
-                    line = " ".join(line.split()[1:])
-                    amount = float(line.split("$")[-1])
-                    transaction_type = (
-                        TransactionType.DEBIT if amount < 0 else TransactionType.CREDIT
-                    )
-                    account_name = "$".join(line.split("$")[:-1]).strip()
-                    description = f.readline().strip()
-                    category = f.readline().strip()
-                    transactions.append(
-                        Transaction(
-                            date=date,
-                            description=description,
-                            amount=abs(amount),
-                            category=category,
-                            account_name=account_name,
-                            type=transaction_type,
-                        )
-                    )
-        df = pd.DataFrame([_transaction_dict(t) for t in transactions])
-        if len(df) > 0:
-            return df
+    def iter_transactions(
+        self, query: Optional[TransactionQuery] = None, limit: Optional[int] = None
+    ) -> Iterator[Transaction]:
+        # Ledgers are visited newest-first and each is read lazily, so reading
+        # stops after `limit` records. The shared lock is held until the
+        # iterator is exhausted or closed.
+        with self._shared(TRANSACTIONS):
+            yield from self._iter_transactions(query, limit)
+
+    def _iter_transactions(
+        self, query: Optional[TransactionQuery], limit: Optional[int]
+    ) -> Iterator[Transaction]:
+        if query is None:
+            transactions = itertools.chain.from_iterable(
+                _iter_ledger(path) for path in self._ledger_paths()
+            )
         else:
-            return pd.DataFrame(columns=TRANSACTIONS_DF_COLUMNS)
-
-    def _write_transactions_update(self, transactions_df: pd.DataFrame):
-        def onm_transaction_entry(transaction):
-            date_str = transaction.date.strftime(DATE_FMT)
-            amount_str = (
-                -transaction.amount
-                if transaction.type == TransactionType.DEBIT
-                else transaction.amount
+            transactions = itertools.chain.from_iterable(
+                _query_ledger(path, query)
+                for path in self._ledger_paths(query.start_date, query.end_date)
             )
-            return "\n".join(
-                [
-                    f"{date_str} {transaction.account_name} ${amount_str}",
-                    f"    {transaction.description}",
-                    f"    {transaction.category}",
-                ]
+        yield from itertools.islice(transactions, limit)
+
+    def query_transactions(self, query: TransactionQuery) -> List[Transaction]:
+        return list(self.iter_transactions(query))
+
+    def get_transactions_between(
+        self,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        account_name: Optional[str] = None,
+    ) -> List[Transaction]:
+        return self.query_transactions(
+            TransactionQuery(
+                start_date=start_date,
+                end_date=end_date,
+                account_names=None if account_name is None else [account_name],
             )
+        )
 
-        df = transactions_df.sort_values("date", ascending=False)
-        with open(self._transactions_path, "w") as f:
-            for _, transaction in df.iterrows():
-                f.write(onm_transaction_entry(_transaction_from(transaction)))
-                f.write("\n\n")
-
-    def _read_cursors(self) -> Dict[str, SyncCursor]:
-        cursors_df = pd.read_csv(self._cursors_path, index_col=0)
-        cursors = {}
-        for index, row in cursors_df.iterrows():
-            data = json.loads(row[CURSOR_DATA])
-            cursors[index] = create_sync_cursor(row[CURSOR_TYPE], data)
-        return cursors
-
-    def _write_cursors_update(self, cursors: Dict[str, SyncCursor]):
-        cursors_dict = {}
-        for source_name, cursor in cursors.items():
-            cursors_dict[source_name] = {
-                CURSOR_TYPE: get_sync_cursor_type_from(cursor).value,
-                CURSOR_DATA: json.dumps(cursor.as_dict()),
-            }
-        cursors_df = pd.DataFrame.from_dict(cursors_dict, orient="index")
-        cursors_df.to_csv(self._cursors_path)
+    def compact(self):
+        # Folds each log segment, tombstones included, into its sorted ledger
+        with self._exclusive(TRANSACTIONS):
+            for path in self._ledger_paths():
+                if os.path.exists(path + TRANSACTIONS_LOG_SUFFIX):
+                    _rewrite_ledger(path)
+                    # A partition whose records were all removed is dropped
+                    if self._partition is not None and os.path.getsize(path) == 0:
+                        _remove_ledger(path)
+
+    def deduplicate_transactions(
+        self, transactions: List[Transaction], excluded_ids: Set[str] = frozenset()
+    ) -> List[Transaction]:
+        # Stored fingerprints are read from the ledger indexes, so no records
+        # are parsed, and only records whose id hashes match are read for ids
+        if len(transactions) == 0:
+            return []
+        start_date = min(t.date for t in transactions)
+        end_date = max(t.date for t in transactions)
+        stored = Counter()
+        with self._shared(TRANSACTIONS):
+            for path in self._ledger_paths(start_date, end_date):
+                log_path = path + TRANSACTIONS_LOG_SUFFIX
+                # Tombstones in the log also remove records in the sorted ledger
+                for ledger_path, removed_ids in [
+                    (path, _removed_ids(log_path)),
+                    (log_path, None),
+                ]:
+                    if os.path.exists(ledger_path):
+                        fingerprints = LedgerIndex(ledger_path).fingerprints(
+                            start_date, end_date, excluded_ids, removed_ids
+                        )
+                        stored.update(fingerprints.tolist())
+            ids = {t.id for t in transactions if t.id is not None}
+            stored_ids = set()
+            if len(ids) > 0:
+                for found in self._find_transaction_ids(ids).values():
+                    stored_ids |= {t.id for t in found}
+        return select_new_transactions(transactions, stored, stored_ids)
+
+    def commit_session(self, session: DatabaseSession):
+        # Each changed file is written in full to a pending copy next to it,
+        # except that records appended to a log segment are written on their
+        # own. Writing the journal of renames and appends is the commit point:
+        # a journal left behind by a crash is replayed on the next open, so
+        # either all of the session's changes land or none do.
+        with self.write_lock():
+            self._commit_session(session)
+
+    def _commit_session(self, session: DatabaseSession):
+        # A journal can be left behind by a writer in another process that
+        # crashed after this database was opened
+        if os.path.exists(self._journal_path):
+            _replay_journal(self._journal_path)
+        replace: Dict[str, bytes] = {}
+        append: Dict[str, Tuple[int, bytes]] = {}
+        remove: List[str] = []
+        ledgers = []
+        if session.accounts:
+            accounts_df = self._read_accounts()
+            for account in session.accounts.values():
+                accounts_df.loc[account.name] = _account_dict(account)
+            replace[self._accounts_path] = _accounts_content(accounts_df).encode()
+        # Ledgers holding changed or removed transactions are found through
+        # their indexes. Append-only databases strike them out with tombstones
+        # in the log segments, others rewrite the ledgers without them. The
+        # changed transactions are then added along with the new ones.
+        ids = set(session.modified) | session.removed
+        found = self._find_transaction_ids(ids) if ids else {}
+        found_ids = {t.id for records in found.values() for t in records}
+        transactions = session.transactions + [
+            t for id, t in session.modified.items() if id in found_ids
+        ]
+        additions = {}
+        if transactions:
+            additions = dict(self._group_by_ledger(_transactions_df(transactions)))
+        for path in dict.fromkeys(itertools.chain(additions, found)):
+            batch_df = additions.get(path, _transactions_df([]))
+            if self._append_only:
+                if path in found:
+                    tombstones_df = _transactions_df(found[path]).assign(removed=True)
+                    batch_df = _concat_transactions([tombstones_df, batch_df])
+                path += TRANSACTIONS_LOG_SUFFIX
+                size = os.path.getsize(path) if os.path.exists(path) else 0
+                incremental = size == 0 or LedgerIndex(path).is_valid()
+                rollups = _rollups_after([path], batch_df)
+                entries, records = _ledger_content(batch_df, size)
+                append[path] = (size, entries)
+                ledgers.append((path, None, records, rollups, size, incremental))
+            else:
+                stored_df = _read_ledger(path)
+                if path in found:
+                    removed = stored_df["id"].isin([t.id for t in found[path]])
+                    stored_df = stored_df[~removed]
+                    rollups = None
+                else:
+                    rollups = _rollups_after(
+                        [path, path + TRANSACTIONS_LOG_SUFFIX], batch_df
+                    )
+                ledger_df = _concat_transactions([batch_df, stored_df])
+                ledger_df = ledger_df.sort_values(
+                    "date", ascending=False, kind="stable"
+                )
+                if rollups is None:
+                    rollups = rollups_from_df(ledger_df)
+                replace[path], records = _ledger_content(ledger_df)
+                ledgers.append((path, ledger_df, records, rollups, 0, True))
+                if os.path.exists(path + TRANSACTIONS_LOG_SUFFIX):
+                    remove.append(path + TRANSACTIONS_LOG_SUFFIX)
+        if session.sync_cursors:
+            cursors = dict(self._cursors.cursors())
+            for source, sync_cursor in session.sync_cursors.values():
+                cursors[source.name] = sync_cursor
+            replace[self._cursors_path] = self._cursors.content(cursors)
+        _commit_files(self._journal_path, replace, remove, append)
+        # The history is an append-only record of balances seen, so it is
+        # extended after the commit rather than rewritten as part of it
+        self._balances.add(session.balances)
+        self._balances.record(list(session.accounts.values()))
+
+        # Sidecars are caches that are rebuilt when stale, so they are brought
+        # up to date after the commit rather than as part of it.
+        for path, ledger_df, records, rollups, start, incremental in ledgers:
+            if ledger_df is not None:
+                LedgerSnapshot(path).write(ledger_df, replace[path])
+            if incremental:
+                _update_index(LedgerIndex(path), records, start)
+            if rollups is not None:
+                LedgerRollup(path).write(rollups)
+        for path in remove:
+            _remove_ledger(path)
+
+    def _find_transaction_ids(self, ids: Set[str]) -> Dict[str, List[Transaction]]:
+        # The stored transactions with the given ids in each ledger, not
+        # counting removed ones. Only the records whose id hashes match in the
+        # ledger indexes are read.
+        found: Dict[str, List[Transaction]] = {}
+        for path in self._ledger_paths():
+            log_path = path + TRANSACTIONS_LOG_SUFFIX
+            for ledger_path, removed_ids in [
+                (path, _removed_ids(log_path)),
+                (log_path, None),
+            ]:
+                if not os.path.exists(ledger_path):
+                    continue
+                offsets = LedgerIndex(ledger_path).find_ids(ids, removed_ids)
+                for record in read_records(ledger_path, offsets):
+                    transaction = _transaction_from_record(record)
+                    if transaction.id in ids:
+                        found.setdefault(path, []).append(transaction)
+        return found
+
+    def get_rollups(
+        self, start_date: Optional[date] = None, end_date: Optional[date] = None
+    ) -> Rollups:
+        # Read from each ledger's rollups, which are kept up to date as records
+        # are written, so no records are parsed
+        rollups = Rollups()
+        with self._shared(TRANSACTIONS):
+            for path in self._ledger_paths(start_date, end_date):
+                for ledger_path in [path, path + TRANSACTIONS_LOG_SUFFIX]:
+                    if os.path.exists(ledger_path):
+                        rollup = LedgerRollup(ledger_path)
+                        rollups.update(
+                            rollup.read(lambda: _read_transactions_file(ledger_path))
+                        )
+        return rollups.between(start_date, end_date)
+
+    def _ledger_paths(
+        self, start_date: Optional[date] = None, end_date: Optional[date] = None
+    ) -> List[str]:
+        # Ledger files newest-first, skipping partitions outside the date range
+        if self._partition is None:
+            return [self._transactions_path]
+        fmt = PARTITION_FMT[self._partition]
+        pattern = PARTITION_PATTERN[self._partition]
+        # A partition may only have a log segment so far
+        names = [
+            name[: -len(TRANSACTIONS_LOG_SUFFIX)]
+            if name.endswith(TRANSACTIONS_LOG_SUFFIX)
+            else name
+            for name in os.listdir(self._transactions_path)
+        ]
+        keys = list({k for k in names if pattern.match(k)})
+        if start_date is not None:
+            keys = [k for k in keys if k >= start_date.strftime(fmt)]
+        if end_date is not None:
+            keys = [k for k in keys if k <= end_date.strftime(fmt)]
+        keys.sort(reverse=True)
+        return [os.path.join(self._transactions_path, k) for k in keys]
+
+    def _group_by_ledger(
+        self, transactions_df: pd.DataFrame, transactions_path: Optional[str] = None
+    ) -> Iterator[Tuple[str, pd.DataFrame]]:
+        transactions_path = transactions_path or self._transactions_path
+        if self._partition is None:
+            yield transactions_path, transactions_df
+            return
+        keys = transactions_df["date"].dt.strftime(PARTITION_FMT[self._partition])
+        for key, batch_df in transactions_df.groupby(keys, sort=False):
+            yield os.path.join(transactions_path, key), batch_df
+
+    def _partition_ledger(self):
+        # Split a monolithic ledger into partitions, e.g. when turning on
+        # partitioning for an existing database. Moving the old ledger aside
+        # marks the partitions complete, so a split interrupted before then is
+        # started over, and one interrupted after is finished.
+        partitioned_path = self._transactions_path + PARTITIONED_SUFFIX
+        unpartitioned_path = self._transactions_path + UNPARTITIONED_SUFFIX
+        if os.path.isfile(self._transactions_path):
+            shutil.rmtree(partitioned_path, ignore_errors=True)
+            os.makedirs(partitioned_path)
+            transactions_df = _read_ledger(self._transactions_path)
+            for path, batch_df in self._group_by_ledger(
+                transactions_df, partitioned_path
+            ):
+                _write_ledger(path, batch_df)
+            os.rename(self._transactions_path, unpartitioned_path)
+        if os.path.isdir(partitioned_path):
+            # The log segment and sidecars were folded into the partitions
+            _remove_ledger(self._transactions_path + TRANSACTIONS_LOG_SUFFIX)
+            _remove_ledger(self._transactions_path)
+            os.rename(partitioned_path, self._transactions_path)
+        os.remove(unpartitioned_path)
+
+    def set_sync_cursor(self, source: Source, sync_cursor: SyncCursor):
+        with self._exclusive(CURSORS):
+            self._cursors.set(source.name, sync_cursor)
+
+    def get_sync_cursor(self, source: Source) -> SyncCursor:
+        with self._shared(CURSORS):
+            return self._cursors.get(source.name)
 
     def add_source(self, source: Source):
-        sources_config = self._read_sources()
         source_dict = source.serialize()
         source_name = source_dict.pop("name")
-        sources_config.add(source_name, _to_toml(source_dict))
-        self._write_sources_update(sources_config)
+        with self._exclusive(SOURCES):
+            sources_config = self._read_sources()
+            sources_config.add(source_name, _to_toml(source_dict))
+            self._write_sources_update(sources_config)
 
-    def get_source(self, name: str) -> Source:
+    def get_source(self, name: str, resolve: bool = True) -> Source:
         # TODO: error handling
-        sources_config = self._read_sources()
-        source_config = sources_config.get(name)
-        source_dict = _from_toml(source_config)
+        with self._shared(SOURCES):
+            source_config = _from_toml(self._read_sources().get(name))
+        source_dict = resolve_secrets(source_config) if resolve else source_config
         source_dict["name"] = name
         return SourceFactory.deserialize(source_dict)
 
+    def get_source_names(self) -> List[str]:
+        with self._shared(SOURCES):
+            return list(self._read_sources())
+
     def _read_sources(self) -> tomlkit.TOMLDocument:
         with open(self._sources_path, mode="rt", encoding="utf-8") as fp:
             return tomlkit.load(fp)
@@ -264,6 +666,71 @@ class PlainTextDatabase(Database):
             tomlkit.dump(sources_config, fp)
 
 
+def _accounts_content(accounts_df: pd.DataFrame) -> str:
+    def onm_account_entry(account: Account):
+        return f"{account.type.value.upper()} {account.name} ${account.balance}"
+
+    return "".join(
+        onm_account_entry(_account_from(account)) + "\n"
+        for _, account in accounts_df.iterrows()
+    )
+
+
+def _commit_files(
+    journal_path: str,
+    replace: Dict[str, bytes],
+    remove: List[str],
+    append: Optional[Dict[str, Tuple[int, bytes]]] = None,
+):
+    # Files in `append` are extended with the given bytes. The journal records
+    # their sizes beforehand, so that a replay can undo a partial append.
+    append = append or {}
+    for path, content in replace.items():
+        _write_synced(path + PENDING_SUFFIX, content)
+    for path, (_, content) in append.items():
+        _write_synced(path + PENDING_SUFFIX, content)
+    journal = {
+        "replace": list(replace),
+        "remove": remove,
+        "append": {path: size for path, (size, _) in append.items()},
+    }
+    os.makedirs(os.path.dirname(journal_path), exist_ok=True)
+    _write_synced(journal_path + PENDING_SUFFIX, json.dumps(journal).encode())
+    os.replace(journal_path + PENDING_SUFFIX, journal_path)
+    _replay_journal(journal_path)
+
+
+def _replay_journal(journal_path: str):
+    # Idempotent, so a replay that is itself interrupted can be repeated
+    with open(journal_path) as f:
+        journal = json.load(f)
+    for path in journal["replace"]:
+        if os.path.exists(path + PENDING_SUFFIX):
+            os.replace(path + PENDING_SUFFIX, path)
+    for path, size in journal.get("append", {}).items():
+        if not os.path.exists(path + PENDING_SUFFIX):
+            continue
+        with open(path + PENDING_SUFFIX, "rb") as f:
+            content = f.read()
+        with open(path, "ab") as f:
+            f.truncate(size)
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.remove(path + PENDING_SUFFIX)
+    for path in journal["remove"]:
+        if os.path.exists(path):
+            os.remove(path)
+    os.remove(journal_path)
+
+
+def _write_synced(path: str, content: bytes):
+    with open(path, "wb") as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+
+
 def _to_toml(value: Any, inline=False) -> Any:
     if isinstance(value, dict):
         table = tomlkit.inline_table() if inline else tomlkit.table()
@@ -287,21 +754,434 @@ def _from_toml(value: Any) -> Any:
     elif isinstance(value, Array):
         return [_from_toml(e) for e in value]
     elif isinstance(value, str):
-        if value[0:2] == "$ ":
-            command = shlex.split(value[2:])
-            result = subprocess.run(
-                command,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                check=True,
-            )
-            return result.stdout.replace("\n", "")
-        return value
+        return str(value)
     else:
         raise ValueError(f"Unsupported type: {type(value)}")
 
 
+def _read_transactions_file(path: str) -> pd.DataFrame:
+    with open(path) as f:
+        return _parse_transactions(f.read(), path)
+
+
+def _parse_records(pattern: re.Pattern, content: str, path: str) -> List[Tuple]:
+    # Like pattern.findall, but raises on anything between the records rather
+    # than skipping it, so that a malformed record is never dropped when the
+    # file is next written
+    records = []
+    position = 0
+    for match in pattern.finditer(content):
+        _check_blank(content, position, match.start(), path)
+        records.append(match.groups(""))
+        position = match.end()
+    _check_blank(content, position, len(content), path)
+    return records
+
+
+def _check_blank(content: str, start: int, end: int, path: str):
+    if content[start:end].strip() != "":
+        offset = start + len(content[start:end]) - len(content[start:end].lstrip())
+        line = content.count("\n", 0, offset) + 1
+        raise ValueError(f"Malformed record at {path}:{line}")
+
+
+def _parse_transactions(content: str, path: str) -> pd.DataFrame:
+    # Tombstones, if there are any, are flagged by a "removed" column
+    records = _parse_records(TRANSACTION_PATTERN, content, path)
+    if len(records) == 0:
+        df = pd.DataFrame(columns=TRANSACTIONS_DF_COLUMNS)
+        df["date"] = pd.to_datetime(df["date"])
+        return df
+    dates, account_names, amounts, ids, removed, descriptions, categories = zip(
+        *records
+    )
+    amounts = _parse_amounts(amounts)
+    df = pd.DataFrame(
+        {
+            "date": pd.to_datetime(dates, format=DATE_FMT),
+            "description": [d.strip() for d in descriptions],
+            "amount": np.abs(amounts),
+            "category": [c.strip() for c in categories],
+            "account_name": [a.strip() for a in account_names],
+            "type": np.where(
+                amounts < 0, TransactionType.DEBIT.value, TransactionType.CREDIT.value
+            ),
+            "id": list(ids),
+        }
+    )
+    if any(removed):
+        df["removed"] = np.array(removed) == REMOVED_TAG
+    return df
+
+
+def _parse_sorted_ledger(content: str, path: str) -> pd.DataFrame:
+    df = _parse_transactions(content, path)
+    if _removed_mask(df).any():
+        raise ValueError(f"Removed record outside of a log segment in {path}")
+    return df
+
+
+def _read_ledger(path: str) -> pd.DataFrame:
+    # Records appended to the log segment are not yet sorted, so they are
+    # merged into the sorted ledger on read, less those its tombstones remove.
+    # The log holds the most recent batches, so it goes first to keep same-day
+    # records newest-first.
+    dfs = []
+    removed_ids = set()
+    if os.path.exists(path + TRANSACTIONS_LOG_SUFFIX):
+        log_df, removed_ids = _apply_tombstones(
+            _read_transactions_file(path + TRANSACTIONS_LOG_SUFFIX)
+        )
+        dfs.append(log_df)
+    if os.path.exists(path):
+        # The sorted ledger is loaded from its snapshot unless it was edited
+        snapshot = LedgerSnapshot(path)
+        ledger_df = snapshot.read(
+            lambda b: _parse_sorted_ledger(b.decode("utf-8"), path)
+        )
+        if removed_ids:
+            ledger_df = ledger_df[~ledger_df["id"].isin(removed_ids)]
+        dfs.append(ledger_df)
+    df = _concat_transactions(dfs or [_transactions_df([])])
+    return df.sort_values("date", ascending=False, kind="stable")
+
+
+def _apply_tombstones(log_df: pd.DataFrame) -> Tuple[pd.DataFrame, Set[str]]:
+    # Drops the tombstones of a log segment and the records before them with
+    # the same ids, and returns the remaining records along with the removed
+    # ids, whose records in the sorted ledger are removed as well
+    removed = _removed_mask(log_df).to_numpy()
+    if not removed.any():
+        return log_df.drop(columns="removed", errors="ignore"), set()
+    positions = pd.Series(np.arange(len(log_df)))[removed]
+    last = positions.groupby(log_df["id"].to_numpy()[removed]).max()
+    last_removed = log_df["id"].map(last).fillna(-1).to_numpy()
+    keep = ~removed & (np.arange(len(log_df)) > last_removed)
+    return log_df[keep].drop(columns="removed"), set(last.index)
+
+
+def _removed_ids(log_path: str) -> np.ndarray:
+    # Id keys of the tombstones in a log segment
+    if not os.path.exists(log_path):
+        return np.empty(0, dtype="<u8")
+    return LedgerIndex(log_path).removed_ids()
+
+
+def _removed_mask(transactions_df: pd.DataFrame) -> pd.Series:
+    if "removed" not in transactions_df:
+        return pd.Series(False, index=transactions_df.index)
+    return transactions_df["removed"].fillna(False).astype(bool)
+
+
+def _rewrite_ledger(path: str, new_transactions_df: Optional[pd.DataFrame] = None):
+    # Folds the log segment and any new records into the sorted ledger file.
+    # New records are added to the existing rollups, which are otherwise
+    # rebuilt, e.g. when compacting.
+    rollups = None
+    dfs = [_read_ledger(path)]
+    if new_transactions_df is not None:
+        rollups = _rollups_after(
+            [path, path + TRANSACTIONS_LOG_SUFFIX], new_transactions_df
+        )
+        dfs.insert(0, new_transactions_df)
+    transactions_df = _concat_transactions(dfs)
+    transactions_df = transactions_df.sort_values(
+        "date", ascending=False, kind="stable"
+    )
+    _write_ledger(path, transactions_df, rollups=rollups)
+    _remove_ledger(path + TRANSACTIONS_LOG_SUFFIX)
+
+
+def _remove_ledger(path: str):
+    if os.path.exists(path):
+        os.remove(path)
+    LedgerIndex(path).remove()
+    LedgerSnapshot(path).remove()
+    LedgerRollup(path).remove()
+
+
+def _iter_ledger(path: str) -> Iterator[Transaction]:
+    # The ledger is stored newest-first, so it can be merged lazily with the
+    # (small, unsorted) log segment once the log's tombstones are applied.
+    log, removed_ids = [], set()
+    if os.path.exists(path + TRANSACTIONS_LOG_SUFFIX):
+        records = list(_iter_records_file(path + TRANSACTIONS_LOG_SUFFIX))
+        last = {t.id: i for i, (t, removed) in enumerate(records) if removed}
+        log = [
+            t
+            for i, (t, removed) in enumerate(records)
+            if not removed and i > last.get(t.id, -1)
+        ]
+        log.sort(key=lambda t: t.date, reverse=True)
+        removed_ids = set(last)
+    if not os.path.exists(path):
+        yield from log
+        return
+    ledger = _iter_transactions_file(path)
+    if removed_ids:
+        ledger = (t for t in ledger if t.id not in removed_ids)
+    yield from heapq.merge(log, ledger, key=lambda t: t.date, reverse=True)
+
+
+def _query_ledger(path: str, query: TransactionQuery) -> Iterator[Transaction]:
+    # Date, account and amount filters are applied to the index so that only
+    # candidate records are read. Category and text filters are checked on the
+    # raw record lines before a Transaction is built.
+    log_path = path + TRANSACTIONS_LOG_SUFFIX
+    log = list(_query_ledger_file(log_path, query))
+    log.sort(key=lambda t: t.date, reverse=True)
+    ledger = _query_ledger_file(path, query, _removed_ids(log_path))
+    yield from heapq.merge(log, ledger, key=lambda t: t.date, reverse=True)
+
+
+def _query_ledger_file(
+    path: str, query: TransactionQuery, removed_ids: Optional[np.ndarray] = None
+) -> Iterator[Transaction]:
+    if not os.path.exists(path):
+        return
+    offsets = LedgerIndex(path).find(
+        start_date=query.start_date,
+        end_date=query.end_date,
+        account_names=query.account_names,
+        min_amount=query.min_amount,
+        max_amount=query.max_amount,
+        removed_ids=removed_ids,
+    )
+    text = None if query.text is None else query.text.lower()
+    for record in read_records(path, offsets):
+        _, description, category = record
+        if query.categories is not None and category.strip() not in query.categories:
+            continue
+        if text is not None and text not in description.lower():
+            continue
+        transaction = _transaction_from_record(record)
+        # Account names are indexed by hash, so confirm the match
+        if query.matches(transaction):
+            yield transaction
+
+
+def _concat_transactions(dfs: List[pd.DataFrame]) -> pd.DataFrame:
+    non_empty = [df for df in dfs if len(df) > 0]
+    if len(non_empty) == 0:
+        return dfs[0]
+    return pd.concat(non_empty, ignore_index=True)
+
+
+def _iter_transactions_file(path: str) -> Iterator[Transaction]:
+    for transaction, removed in _iter_records_file(path):
+        if removed:
+            raise ValueError(f"Removed record outside of a log segment in {path}")
+        yield transaction
+
+
+def _iter_records_file(path: str) -> Iterator[Tuple[Transaction, bool]]:
+    # Each record's transaction and whether the record is a tombstone
+    with open(path) as f:
+        record = []
+        for line in f:
+            if len(record) == 0 and line.strip() == "":
+                continue
+            record.append(line)
+            if len(record) == 3:
+                yield _record_from(record)
+                record = []
+
+
+def _transaction_from_record(record: List[str]) -> Transaction:
+    # Tombstones are skipped by the index lookups that find records
+    transaction, _ = _record_from(record)
+    return transaction
+
+
+def _record_from(record: List[str]) -> Tuple[Transaction, bool]:
+    header, description, category = record
+    date_str, line = header.split(maxsplit=1)
+    account_name, amount_str = line.rsplit("$", 1)
+    amount_str, _, comment = amount_str.partition(";")
+    amount = Amount.parse(amount_str)
+    id, removed = None, False
+    comment = comment.strip()
+    if comment.startswith(ID_TAG):
+        id, *tags = comment[len(ID_TAG) :].split()
+        removed = tags == [REMOVED_TAG]
+    transaction = Transaction(
+        date=datetime.strptime(date_str, DATE_FMT).date(),
+        description=description.strip(),
+        amount=abs(amount),
+        category=category.strip(),
+        account_name=account_name.strip(),
+        type=TransactionType.DEBIT if amount < 0 else TransactionType.CREDIT,
+        id=id,
+    )
+    return transaction, removed
+
+
+def _write_ledger(
+    path: str,
+    transactions_df: pd.DataFrame,
+    append: bool = False,
+    rollups: Optional[Rollups] = None,
+):
+    # Writes the records and keeps the ledger's sidecars in step. Appends
+    # extend the index and rollups in place unless they were already stale, in
+    # which case they are rebuilt on next use.
+    index = LedgerIndex(path)
+    start = os.path.getsize(path) if append and os.path.exists(path) else 0
+    incremental = start == 0 or index.is_valid()
+    if append:
+        rollups = _rollups_after([path], transactions_df)
+    elif rollups is None:
+        rollups = rollups_from_df(transactions_df)
+    content, records = _ledger_content(transactions_df, start)
+    with open(path, "ab" if append else "wb") as f:
+        f.write(content)
+    if not append:
+        LedgerSnapshot(path).write(transactions_df, content)
+    if incremental:
+        _update_index(index, records, start)
+    if rollups is not None:
+        LedgerRollup(path).write(rollups)
+
+
+def _is_older(transactions_df: pd.DataFrame, path: str) -> bool:
+    # Whether the records are no newer than any in the sorted ledger file
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return True
+    dates = LedgerIndex(path).records()["date"]
+    newest = transactions_df["date"].max().date()
+    return len(dates) == 0 or date_key(newest) <= dates.min()
+
+
+def _rollups_after(
+    paths: List[str], transactions_df: pd.DataFrame
+) -> Optional[Rollups]:
+    # Rollups of the given ledger files with the new records added, or None if
+    # the files' current rollups are out of date
+    rollups = Rollups()
+    for path in paths:
+        if os.path.exists(path):
+            current = LedgerRollup(path).load()
+            if current is None:
+                return None
+            rollups.update(current)
+    rollups.update(rollups_from_df(transactions_df))
+    return rollups
+
+
+def _ledger_content(
+    transactions_df: pd.DataFrame, start: int = 0
+) -> Tuple[bytes, np.ndarray]:
+    # Encoded records along with their index entries, for records written at
+    # byte offset `start` of a ledger
+    entries = [e.encode("utf-8") for e in _onm_transaction_entries(transactions_df)]
+    lengths = np.fromiter((len(e) for e in entries), dtype="<u8", count=len(entries))
+    records = index_records(
+        offsets=start + np.cumsum(lengths) - lengths,
+        dates=transactions_df["date"].to_numpy(),
+        account_names=transactions_df["account_name"],
+        amounts=_signed_amounts(transactions_df),
+        descriptions=transactions_df["description"].astype(str),
+        ids=transactions_df["id"].astype(str),
+        removed=_removed_mask(transactions_df),
+    )
+    return b"".join(entries), records
+
+
+def _update_index(index: LedgerIndex, records: np.ndarray, start: int):
+    if start == 0:
+        index.write(records)
+    else:
+        index.append(records)
+
+
+def _signed_amounts(transactions_df: pd.DataFrame) -> np.ndarray:
+    debit = (transactions_df["type"] == TransactionType.DEBIT.value).to_numpy()
+    amounts = transactions_df["amount"].to_numpy(dtype=np.int64)
+    return np.where(debit, -amounts, amounts)
+
+
+def _parse_amounts(amounts: Tuple[str, ...]) -> np.ndarray:
+    # Signed cents, by the same rules as Amount.parse but for a whole column.
+    # The dollars and cents are read as integers, never through a float.
+    parts = (
+        pd.Series(amounts, dtype=str)
+        .str.strip()
+        .str.replace(",", "", regex=False)
+        .str.extract(AMOUNT_PATTERN)
+    )
+    signs, dollars, fractions = parts[0], parts[1], parts[2].fillna("")
+    malformed = dollars.isna() | ((dollars == "") & (fractions == ""))
+    if malformed.any():
+        bad = amounts[np.flatnonzero(malformed)[0]]
+        raise ValueError(f"'{bad}' is not an amount")
+    # Digits past the cents are allowed only if they are zeros
+    fractional = fractions.str[2:].str.strip("0") != ""
+    if fractional.any():
+        bad = amounts[np.flatnonzero(fractional)[0]]
+        raise ValueError(f"'{bad}' is not a whole number of cents")
+    whole = dollars.replace("", "0").astype(np.int64).to_numpy()
+    cents = fractions.str[:2].str.ljust(2, "0").astype(np.int64).to_numpy()
+    values = whole * 100 + cents
+    return np.where(signs.to_numpy() == "-", -values, values)
+
+
+def _format_amounts(cents: np.ndarray, index: pd.Index) -> pd.Series:
+    # Same format as str(Amount), e.g. "-102.80"
+    dollars, remainder = np.divmod(np.abs(cents), 100)
+    return (
+        pd.Series(np.where(cents < 0, "-", ""), index=index)
+        + pd.Series(dollars, index=index).astype(str)
+        + "."
+        + pd.Series(remainder, index=index).astype(str).str.zfill(2)
+    )
+
+
+def _onm_transaction_entries(transactions_df: pd.DataFrame) -> pd.Series:
+    if len(transactions_df) == 0:
+        return pd.Series([], dtype=str)
+    df = transactions_df
+    ids = df["id"].astype(str)
+    tags = pd.Series(" " + REMOVED_TAG, index=df.index).where(_removed_mask(df), "")
+    return (
+        df["date"].dt.strftime(DATE_FMT)
+        + " "
+        + df["account_name"].astype(str)
+        + " $"
+        + _format_amounts(_signed_amounts(df), df.index)
+        + (" ; " + ID_TAG + ids + tags).where(ids != "", "")
+        + "\n    "
+        + df["description"].astype(str)
+        + "\n    "
+        + df["category"].astype(str)
+        + "\n\n"
+    )
+
+
+def _transactions_from_df(transactions_df: pd.DataFrame) -> List[Transaction]:
+    df = transactions_df
+    types = {t.value: t for t in TransactionType}
+    return [
+        Transaction(
+            date=d,
+            description=description,
+            amount=Amount(amount),
+            category=category,
+            account_name=account_name,
+            type=types[type],
+            id=id or None,
+        )
+        for d, description, amount, category, account_name, type, id in zip(
+            df["date"].dt.date,
+            df["description"],
+            df["amount"].tolist(),
+            df["category"],
+            df["account_name"],
+            df["type"],
+            df["id"],
+        )
+    ]
+
+
 def _account_dict(account: Account) -> Dict:
     return {
         "name": account.name,
@@ -313,28 +1193,21 @@ def _account_dict(account: Account) -> Dict:
 def _account_from(dict: Dict) -> Account:
     return Account(
         name=dict["name"],
-        balance=dict["balance"],
+        balance=Amount(dict["balance"]),
         type=AccountType(dict["account_type"]),
     )
 
 
-def _transaction_dict(transaction: Transaction) -> Dict:
-    return {
-        "date": transaction.date.strftime(DATE_FMT),
-        "description": transaction.description,
-        "amount": transaction.amount,
-        "category": transaction.category,
-        "account_name": transaction.account_name,
-        "type": transaction.type.value,
-    }
-
-
-def _transaction_from(dict: Dict) -> Transaction:
-    return Transaction(
-        date=datetime.strptime(dict["date"], DATE_FMT).date(),
-        description=dict["description"],
-        amount=dict["amount"],
-        category=dict["category"],
-        account_name=dict["account_name"],
-        type=TransactionType(dict["type"]),
+def _transactions_df(transactions: List[Transaction]) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "date": pd.to_datetime([t.date for t in transactions]),
+            "description": [t.description for t in transactions],
+            "amount": np.array([t.amount for t in transactions], dtype=np.int64),
+            "category": [t.category for t in transactions],
+            "account_name": [t.account_name for t in transactions],
+            "type": [t.type.value for t in transactions],
+            "id": [t.id or "" for t in transactions],
+        },
+        columns=TRANSACTIONS_DF_COLUMNS,
     )
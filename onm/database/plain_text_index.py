@@ -0,0 +1,280 @@
+import os
+import re
+import mmap
+import struct
+import hashlib
+import numpy as np
+from datetime import date
+from onm.common import Amount
+from .fingerprint import fingerprint
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+INDEX_SUFFIX = ".idx"
+
+INDEX_MAGIC = b"ONMIDX05"
+# magic, ledger size, ledger mtime (ns), record count
+INDEX_HEADER = struct.Struct("<8sQqQ")
+INDEX_DTYPE = np.dtype(
+    [
+        ("offset", "<u8"),
+        ("date", "<i4"),
+        ("account", "<u8"),
+        ("amount", "<i8"),
+        ("fingerprint", "<u8"),
+        ("id", "<u8"),
+        ("removed", "?"),
+    ]
+)
+
+# Same record layout as the text parser in plain_text_database, but over bytes
+# so that match positions are byte offsets into the ledger.
+RECORD_PATTERN = re.compile(
+    rb"^(\d{4}-\d{2}-\d{2})[ \t]+([^\n]*)\$([^\s$]+)"
+    rb"(?:[ \t]+;[ \t]*id:(\S+)(?:[ \t]+(removed))?)?"
+    rb"[ \t]*\n([^\n]*)\n([^\n]*)$",
+    re.M,
+)
+
+
+def account_key(account_name: str) -> int:
+    digest = hashlib.blake2b(account_name.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def id_key(id: str) -> int:
+    # 0 for records without an id
+    if id == "":
+        return 0
+    digest = hashlib.blake2b(id.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") or 1
+
+
+def date_key(d: date) -> int:
+    return d.toordinal() - date(1970, 1, 1).toordinal()
+
+
+def index_records(
+    offsets: Iterable[int],
+    dates: np.ndarray,
+    account_names: Iterable[str],
+    amounts: Iterable[int],
+    descriptions: Iterable[str],
+    ids: Iterable[str],
+    removed: Optional[Iterable[bool]] = None,
+) -> np.ndarray:
+    account_names = list(account_names)
+    keys = {name: account_key(name) for name in set(account_names)}
+    dates = np.asarray(dates, dtype="datetime64[D]")
+    records = np.empty(len(account_names), dtype=INDEX_DTYPE)
+    records["offset"] = np.fromiter(offsets, dtype="<u8", count=len(account_names))
+    records["date"] = dates.astype("<i4")
+    records["account"] = np.array([keys[n] for n in account_names], dtype="<u8")
+    records["amount"] = np.fromiter(amounts, dtype="<i8", count=len(account_names))
+    records["fingerprint"] = np.array(
+        [
+            fingerprint(*fields)
+            for fields in zip(
+                np.datetime_as_string(dates),
+                account_names,
+                records["amount"],
+                descriptions,
+            )
+        ],
+        dtype="<u8",
+    )
+    records["id"] = np.array([id_key(id) for id in ids], dtype="<u8")
+    records["removed"] = False if removed is None else np.fromiter(removed, bool)
+    return records
+
+
+def live_records(
+    records: np.ndarray, removed_ids: Optional[np.ndarray] = None
+) -> np.ndarray:
+    # Mask of the records that are not tombstones, nor removed by a tombstone
+    # later in the file or by one of `removed_ids` (id keys of tombstones in a
+    # later file, i.e. the log segment of a sorted ledger)
+    tombstones = records["removed"]
+    mask = ~tombstones
+    if removed_ids is not None and len(removed_ids) > 0:
+        mask &= ~np.isin(records["id"], removed_ids)
+    if tombstones.any():
+        keys, inverse = np.unique(records["id"][tombstones], return_inverse=True)
+        last = np.zeros(len(keys), dtype="<u8")
+        np.maximum.at(last, inverse, records["offset"][tombstones])
+        i = np.minimum(np.searchsorted(keys, records["id"]), len(keys) - 1)
+        mask &= ~((keys[i] == records["id"]) & (records["offset"] < last[i]))
+    return mask
+
+
+class LedgerIndex:
+    """Sidecar index of the records in a plain text ledger file.
+
+    Each entry holds the byte offset of a record along with its date, a hash
+    of its account name, its signed amount in cents, its fingerprint, a hash
+    of its transaction id and whether it is a tombstone. Lookups skip
+    tombstones and the records they remove. The index is stamped with the
+    ledger's size and modification time and rebuilt when they no longer
+    match, so hand edits to the ledger are picked up on the next read.
+    """
+
+    def __init__(self, ledger_path: str):
+        self._ledger_path = ledger_path
+        self._index_path = ledger_path + INDEX_SUFFIX
+
+    @property
+    def path(self) -> str:
+        return self._index_path
+
+    def is_valid(self) -> bool:
+        header = self._read_header()
+        if header is None or not os.path.exists(self._ledger_path):
+            return False
+        _, size, mtime_ns, _ = header
+        stat = os.stat(self._ledger_path)
+        return size == stat.st_size and mtime_ns == stat.st_mtime_ns
+
+    def records(self) -> np.ndarray:
+        if not self.is_valid():
+            self.rebuild()
+        _, _, _, count = self._read_header()
+        if count == 0:
+            return np.empty(0, dtype=INDEX_DTYPE)
+        return np.memmap(
+            self._index_path,
+            dtype=INDEX_DTYPE,
+            mode="r",
+            offset=INDEX_HEADER.size,
+            shape=(count,),
+        )
+
+    def find(
+        self,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        account_names: Optional[List[str]] = None,
+        min_amount: Optional[int] = None,
+        max_amount: Optional[int] = None,
+        removed_ids: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        records = self.records()
+        mask = live_records(records, removed_ids)
+        if start_date is not None:
+            mask &= records["date"] >= date_key(start_date)
+        if end_date is not None:
+            mask &= records["date"] <= date_key(end_date)
+        if account_names is not None:
+            keys = np.array([account_key(n) for n in account_names], dtype="<u8")
+            mask &= np.isin(records["account"], keys)
+        if min_amount is not None:
+            mask &= np.abs(records["amount"]) >= min_amount
+        if max_amount is not None:
+            mask &= np.abs(records["amount"]) <= max_amount
+        return np.sort(records["offset"][mask])
+
+    def find_ids(
+        self, ids: Iterable[str], removed_ids: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        # Offsets of the records whose ids may be among `ids`. Ids are indexed
+        # by hash, so the records should be checked.
+        records = self.records()
+        keys = np.array([id_key(id) for id in ids if id != ""], dtype="<u8")
+        mask = live_records(records, removed_ids) & np.isin(records["id"], keys)
+        return np.sort(records["offset"][mask])
+
+    def fingerprints(
+        self,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        excluded_ids: Iterable[str] = (),
+        removed_ids: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        records = self.records()
+        mask = live_records(records, removed_ids)
+        keys = np.array([id_key(id) for id in excluded_ids if id != ""], dtype="<u8")
+        if len(keys) > 0:
+            mask &= ~np.isin(records["id"], keys)
+        if start_date is not None:
+            mask &= records["date"] >= date_key(start_date)
+        if end_date is not None:
+            mask &= records["date"] <= date_key(end_date)
+        return records["fingerprint"][mask]
+
+    def removed_ids(self) -> np.ndarray:
+        # Id keys of the tombstones, which also remove records in the sorted
+        # ledger when this indexes its log segment
+        records = self.records()
+        return np.unique(records["id"][records["removed"]])
+
+    def rebuild(self):
+        offsets, dates, account_names, amounts = [], [], [], []
+        descriptions, ids, removed = [], [], []
+        if os.path.exists(self._ledger_path):
+            with open(self._ledger_path, "rb") as f:
+                buffer = f.read()
+            for match in RECORD_PATTERN.finditer(buffer):
+                offsets.append(match.start())
+                dates.append(match.group(1).decode())
+                account_names.append(match.group(2).decode("utf-8").strip())
+                amounts.append(Amount.parse(match.group(3)))
+                ids.append((match.group(4) or b"").decode("utf-8"))
+                removed.append(match.group(5) is not None)
+                descriptions.append(match.group(6).decode("utf-8"))
+        self.write(
+            index_records(
+                offsets, dates, account_names, amounts, descriptions, ids, removed
+            )
+        )
+
+    def write(self, records: np.ndarray):
+        stat = os.stat(self._ledger_path)
+        header = INDEX_HEADER.pack(
+            INDEX_MAGIC, stat.st_size, stat.st_mtime_ns, len(records)
+        )
+        # Readers holding a shared lock may rebuild the same index at once
+        tmp_path = f"{self._index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(header)
+            f.write(records.astype(INDEX_DTYPE).tobytes())
+        os.replace(tmp_path, self._index_path)
+
+    def append(self, records: np.ndarray):
+        # Only valid if the index matched the ledger before it was appended to
+        _, _, _, count = self._read_header()
+        stat = os.stat(self._ledger_path)
+        header = INDEX_HEADER.pack(
+            INDEX_MAGIC, stat.st_size, stat.st_mtime_ns, count + len(records)
+        )
+        with open(self._index_path, "r+b") as f:
+            f.seek(INDEX_HEADER.size + count * INDEX_DTYPE.itemsize)
+            f.write(records.astype(INDEX_DTYPE).tobytes())
+            f.truncate()
+            f.seek(0)
+            f.write(header)
+
+    def remove(self):
+        if os.path.exists(self._index_path):
+            os.remove(self._index_path)
+
+    def _read_header(self) -> Optional[Tuple[bytes, int, int, int]]:
+        if not os.path.exists(self._index_path):
+            return None
+        with open(self._index_path, "rb") as f:
+            data = f.read(INDEX_HEADER.size)
+        if len(data) != INDEX_HEADER.size:
+            return None
+        header = INDEX_HEADER.unpack(data)
+        if header[0] != INDEX_MAGIC:
+            return None
+        return header
+
+
+def read_records(ledger_path: str, offsets: Iterable[int]) -> Iterator[List[str]]:
+    if os.path.getsize(ledger_path) == 0:
+        return
+    with open(ledger_path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            for offset in offsets:
+                match = RECORD_PATTERN.match(buffer, int(offset))
+                if match is None:
+                    raise ValueError(f"No record at offset {offset} in {ledger_path}")
+                yield match.group(0).decode("utf-8").split("\n")
@@ -0,0 +1,99 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+from onm.common import Amount, TransactionType
+from .rollup import MONTH_FMT, Rollup, Rollups
+from typing import Callable, Optional
+
+ROLLUP_SUFFIX = ".rollup"
+
+
+def rollups_from_df(transactions_df: pd.DataFrame) -> Rollups:
+    # Tombstones in a log segment, flagged by a "removed" column, count against
+    # the records they remove
+    df = transactions_df
+    if len(df) == 0:
+        return Rollups()
+    debit = (df["type"] == TransactionType.DEBIT.value).to_numpy()
+    sign = 1
+    if "removed" in df:
+        sign = np.where(df["removed"].fillna(False).to_numpy(dtype=bool), -1, 1)
+    amounts = sign * df["amount"].to_numpy(dtype=np.int64)
+    grouped = (
+        pd.DataFrame(
+            {
+                "month": df["date"].dt.strftime(MONTH_FMT),
+                "account_name": df["account_name"].astype(str),
+                "category": df["category"].astype(str),
+                "credits": np.where(debit, 0, amounts),
+                "debits": np.where(debit, amounts, 0),
+                "count": sign,
+            }
+        )
+        .groupby(["month", "account_name", "category"], sort=False)
+        .sum()
+    )
+    return Rollups(
+        Rollup(month, account_name, category, Amount(credits), Amount(debits), count)
+        for (month, account_name, category), credits, debits, count in zip(
+            grouped.index,
+            grouped["credits"].tolist(),
+            grouped["debits"].tolist(),
+            grouped["count"].tolist(),
+        )
+    )
+
+
+class LedgerRollup:
+    """Sidecar rollups of the records in a plain text ledger file.
+
+    Like the ledger index, the rollups are stamped with the ledger's size and
+    modification time. Appends to the ledger update them in place; if the
+    ledger was edited by hand they are rebuilt on the next read.
+    """
+
+    def __init__(self, ledger_path: str):
+        self._ledger_path = ledger_path
+        self._rollup_path = ledger_path + ROLLUP_SUFFIX
+
+    @property
+    def path(self) -> str:
+        return self._rollup_path
+
+    def load(self) -> Optional[Rollups]:
+        # None unless the rollups match the ledger as it is now
+        try:
+            with open(self._rollup_path) as f:
+                data = json.load(f)
+            stat = os.stat(self._ledger_path)
+        except (OSError, ValueError):
+            return None
+        if data["key"] != [stat.st_size, stat.st_mtime_ns]:
+            return None
+        return Rollups(
+            Rollup(month, account_name, category, Amount(credits), Amount(debits), n)
+            for month, account_name, category, credits, debits, n in data["rollups"]
+        )
+
+    def read(self, parse: Callable[[], pd.DataFrame]) -> Rollups:
+        rollups = self.load()
+        if rollups is None:
+            rollups = rollups_from_df(parse())
+            self.write(rollups)
+        return rollups
+
+    def write(self, rollups: Rollups):
+        stat = os.stat(self._ledger_path)
+        data = {
+            "key": [stat.st_size, stat.st_mtime_ns],
+            "rollups": [list(rollup) for rollup in rollups],
+        }
+        tmp_path = f"{self._rollup_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self._rollup_path)
+
+    def remove(self):
+        if os.path.exists(self._rollup_path):
+            os.remove(self._rollup_path)
@@ -0,0 +1,131 @@
+import os
+import hashlib
+import numpy as np
+import pandas as pd
+from typing import Callable
+
+SNAPSHOT_SUFFIX = ".snapshot"
+
+# Text columns are stored newline-joined, which is safe since no ledger field
+# can span lines. Low-cardinality columns are dictionary-encoded.
+TEXT_COLUMNS = ["description", "id"]
+CATEGORICAL_COLUMNS = ["category", "account_name", "type"]
+
+
+def content_hash(content: bytes) -> np.ndarray:
+    digest = hashlib.blake2b(content, digest_size=16).digest()
+    return np.frombuffer(digest, dtype=np.uint8)
+
+
+class LedgerSnapshot:
+    """Columnar snapshot of a parsed plain text ledger file.
+
+    The snapshot is keyed by the ledger's size, modification time and content
+    hash. Size and modification time are checked first. If they changed but
+    the content did not (e.g. the ledger was touched), the snapshot is
+    restamped rather than rebuilt.
+    """
+
+    def __init__(self, ledger_path: str):
+        self._ledger_path = ledger_path
+        self._snapshot_path = ledger_path + SNAPSHOT_SUFFIX
+
+    @property
+    def path(self) -> str:
+        return self._snapshot_path
+
+    def read(self, parse: Callable[[bytes], pd.DataFrame]) -> pd.DataFrame:
+        stat = os.stat(self._ledger_path)
+        content = None
+        if os.path.exists(self._snapshot_path):
+            try:
+                with np.load(self._snapshot_path, allow_pickle=False) as snapshot:
+                    size, mtime_ns = snapshot["key"]
+                    if size == stat.st_size and mtime_ns == stat.st_mtime_ns:
+                        return _decode(snapshot)
+                    with open(self._ledger_path, "rb") as f:
+                        content = f.read()
+                    if np.array_equal(snapshot["hash"], content_hash(content)):
+                        df = _decode(snapshot)
+                        self.write(df, content)
+                        return df
+            except (OSError, ValueError, KeyError):
+                pass
+        if content is None:
+            with open(self._ledger_path, "rb") as f:
+                content = f.read()
+        df = parse(content)
+        self.write(df, content)
+        return df
+
+    def write(self, transactions_df: pd.DataFrame, content: bytes):
+        stat = os.stat(self._ledger_path)
+        arrays = _encode(transactions_df)
+        arrays["key"] = np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+        arrays["hash"] = content_hash(content)
+        tmp_path = f"{self._snapshot_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, self._snapshot_path)
+
+    def remove(self):
+        if os.path.exists(self._snapshot_path):
+            os.remove(self._snapshot_path)
+
+
+def _encode(transactions_df: pd.DataFrame) -> dict:
+    df = transactions_df
+    arrays = {
+        "date": df["date"].to_numpy(dtype="datetime64[D]").astype(np.int32),
+        # Stored under a new key, so float amounts from older snapshots are
+        # not decoded as cents
+        "cents": df["amount"].to_numpy(dtype=np.int64),
+    }
+    for column in TEXT_COLUMNS:
+        arrays[column] = _encode_text(df[column].astype(str).tolist())
+    for column in CATEGORICAL_COLUMNS:
+        codes, categories = pd.factorize(df[column].astype(str))
+        arrays[f"{column}_codes"] = codes.astype(np.int32)
+        arrays[f"{column}_categories"] = _encode_text(list(categories))
+    return arrays
+
+
+def _decode(snapshot: np.lib.npyio.NpzFile) -> pd.DataFrame:
+    columns = {
+        "date": snapshot["date"].astype("datetime64[D]").astype("datetime64[ns]"),
+        "amount": snapshot["cents"],
+    }
+    for column in TEXT_COLUMNS:
+        columns[column] = _decode_text(snapshot[column])
+    for column in CATEGORICAL_COLUMNS:
+        categories = snapshot[f"{column}_categories"]
+        columns[column] = pd.Categorical.from_codes(
+            snapshot[f"{column}_codes"],
+            categories=_decode_text(categories),
+        )
+    return pd.DataFrame(
+        columns,
+        columns=[
+            "date",
+            "description",
+            "amount",
+            "category",
+            "account_name",
+            "type",
+            "id",
+        ],
+    )
+
+
+def _encode_text(values: list) -> np.ndarray:
+    # A leading count disambiguates an empty list from a single empty string
+    content = "\n".join(values).encode("utf-8")
+    header = np.array([len(values)], dtype=np.int64).view(np.uint8)
+    return np.concatenate([header, np.frombuffer(content, dtype=np.uint8)])
+
+
+def _decode_text(array: np.ndarray) -> list:
+    count = int(array[:8].view(np.int64)[0])
+    if count == 0:
+        return []
+    return array[8:].tobytes().decode("utf-8").split("\n")
@@ -0,0 +1,106 @@
+from datetime import date
+from onm.common import Amount, Transaction, TransactionType
+from typing import Dict, Iterable, Iterator, NamedTuple, Optional, Tuple
+
+MONTH_FMT = r"%Y-%m"
+
+
+class Rollup(NamedTuple):
+    month: str
+    account_name: str
+    category: str
+    credits: Amount
+    debits: Amount
+    count: int
+
+    @property
+    def key(self) -> Tuple[str, str, str]:
+        return self.month, self.account_name, self.category
+
+    @property
+    def net(self) -> Amount:
+        return self.credits - self.debits
+
+
+class Rollups:
+    """Credit and debit totals and transaction counts per month, account and
+    category, e.g. to break down spending without reading any transactions.
+    """
+
+    def __init__(self, rollups: Iterable[Rollup] = ()):
+        self._rollups: Dict[Tuple[str, str, str], Rollup] = {}
+        self.update(rollups)
+
+    @staticmethod
+    def from_transactions(transactions: Iterable[Transaction]) -> "Rollups":
+        rollups = Rollups()
+        for transaction in transactions:
+            rollups.add(transaction)
+        return rollups
+
+    def add(self, transaction: Transaction):
+        self.merge(_rollup_of(transaction, 1))
+
+    def remove(self, transaction: Transaction):
+        self.merge(_rollup_of(transaction, -1))
+
+    def merge(self, rollup: Rollup):
+        # Rollups may be negative, e.g. those of removed transactions, and
+        # ones that cancel out are dropped
+        existing = self._rollups.get(rollup.key)
+        if existing is not None:
+            rollup = existing._replace(
+                credits=existing.credits + rollup.credits,
+                debits=existing.debits + rollup.debits,
+                count=existing.count + rollup.count,
+            )
+        if rollup.count == 0 and rollup.credits == 0 and rollup.debits == 0:
+            self._rollups.pop(rollup.key, None)
+        else:
+            self._rollups[rollup.key] = rollup
+
+    def update(self, rollups: Iterable[Rollup]):
+        for rollup in rollups:
+            self.merge(rollup)
+
+    def __iter__(self) -> Iterator[Rollup]:
+        return iter(sorted(self._rollups.values()))
+
+    def __len__(self) -> int:
+        return len(self._rollups)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Rollups) and self._rollups == other._rollups
+
+    def between(
+        self, start_date: Optional[date] = None, end_date: Optional[date] = None
+    ) -> "Rollups":
+        # Whole months, including those the range only partly covers
+        start = None if start_date is None else start_date.strftime(MONTH_FMT)
+        end = None if end_date is None else end_date.strftime(MONTH_FMT)
+        return Rollups(
+            r
+            for r in self._rollups.values()
+            if (start is None or r.month >= start) and (end is None or r.month <= end)
+        )
+
+    def totals(self, by: str) -> Dict[str, Amount]:
+        # Net amount per month, account name or category
+        totals: Dict[str, Amount] = {}
+        for rollup in self:
+            value = getattr(rollup, by)
+            totals[value] = totals.get(value, Amount(0)) + rollup.net
+        return totals
+
+
+def _rollup_of(transaction: Transaction, sign: int) -> Rollup:
+    debit = transaction.type == TransactionType.DEBIT
+    amount = transaction.amount if sign > 0 else -transaction.amount
+    return Rollup(
+        month=transaction.date.strftime(MONTH_FMT),
+        account_name=transaction.account_name,
+        category=transaction.category,
+        credits=Amount(0) if debit else amount,
+        debits=amount if debit else Amount(0),
+        count=sign,
+    )
@@ -0,0 +1,563 @@
+import os
+import json
+import sqlite3
+from datetime import date, datetime
+from onm.secret import resolve_secrets
+from onm.source.source import Source
+from onm.source.source_factory import SourceFactory
+from onm.sync import SyncCursor, create_sync_cursor, get_sync_cursor_type_from
+from .database import Database, DatabaseSession, TransactionQuery
+from .balance_history import utc_timestamp
+from .file_lock import sync_lock
+from .fingerprint import select_new_transactions, transaction_fingerprint
+from .rollup import MONTH_FMT, Rollup, Rollups
+from onm.common import (
+    Account,
+    AccountType,
+    Amount,
+    BalanceSnapshot,
+    TransactionType,
+    Transaction,
+)
+from collections import Counter
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+SQLITE = "onm.sqlite3"
+
+# Stored as the database's user_version, for migrating later schemas
+SCHEMA_VERSION = 1
+
+# Values bound in one statement, under SQLite's limit on query parameters
+LOOKUP_BATCH_SIZE = 500
+
+TIMESTAMP_FMT = r"%Y-%m-%dT%H:%M:%SZ"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS accounts (
+    name TEXT PRIMARY KEY,
+    account_type TEXT NOT NULL,
+    balance INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY,
+    date TEXT NOT NULL,
+    description TEXT NOT NULL,
+    amount INTEGER NOT NULL,
+    category TEXT NOT NULL,
+    account_name TEXT NOT NULL,
+    type TEXT NOT NULL,
+    transaction_id TEXT,
+    fingerprint INTEGER
+);
+CREATE INDEX IF NOT EXISTS transactions_date ON transactions (date);
+CREATE INDEX IF NOT EXISTS transactions_fingerprint ON transactions (fingerprint);
+CREATE INDEX IF NOT EXISTS transactions_transaction_id
+    ON transactions (transaction_id) WHERE transaction_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS transactions_account_date
+    ON transactions (account_name, date);
+CREATE INDEX IF NOT EXISTS transactions_category_date
+    ON transactions (category, date);
+CREATE TABLE IF NOT EXISTS cursors (
+    source_name TEXT PRIMARY KEY,
+    type TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sources (
+    name TEXT PRIMARY KEY,
+    config TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rollups (
+    month TEXT NOT NULL,
+    account_name TEXT NOT NULL,
+    category TEXT NOT NULL,
+    credits INTEGER NOT NULL,
+    debits INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (month, account_name, category)
+);
+CREATE TRIGGER IF NOT EXISTS rollups_insert AFTER INSERT ON transactions
+BEGIN
+    INSERT INTO rollups (month, account_name, category, credits, debits, count)
+    VALUES (
+        substr(NEW.date, 1, 7),
+        NEW.account_name,
+        NEW.category,
+        CASE WHEN NEW.type = 'debit' THEN 0 ELSE NEW.amount END,
+        CASE WHEN NEW.type = 'debit' THEN NEW.amount ELSE 0 END,
+        1
+    )
+    ON CONFLICT (month, account_name, category) DO UPDATE SET
+        credits = credits + excluded.credits,
+        debits = debits + excluded.debits,
+        count = count + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS rollups_delete AFTER DELETE ON transactions
+BEGIN
+    UPDATE rollups SET
+        credits = credits - CASE WHEN OLD.type = 'debit' THEN 0 ELSE OLD.amount END,
+        debits = debits - CASE WHEN OLD.type = 'debit' THEN OLD.amount ELSE 0 END,
+        count = count - 1
+    WHERE month = substr(OLD.date, 1, 7)
+        AND account_name = OLD.account_name
+        AND category = OLD.category;
+    DELETE FROM rollups WHERE count = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS rollups_update AFTER UPDATE ON transactions
+BEGIN
+    UPDATE rollups SET
+        credits = credits - CASE WHEN OLD.type = 'debit' THEN 0 ELSE OLD.amount END,
+        debits = debits - CASE WHEN OLD.type = 'debit' THEN OLD.amount ELSE 0 END,
+        count = count - 1
+    WHERE month = substr(OLD.date, 1, 7)
+        AND account_name = OLD.account_name
+        AND category = OLD.category;
+    DELETE FROM rollups WHERE count = 0;
+    INSERT INTO rollups (month, account_name, category, credits, debits, count)
+    VALUES (
+        substr(NEW.date, 1, 7),
+        NEW.account_name,
+        NEW.category,
+        CASE WHEN NEW.type = 'debit' THEN 0 ELSE NEW.amount END,
+        CASE WHEN NEW.type = 'debit' THEN NEW.amount ELSE 0 END,
+        1
+    )
+    ON CONFLICT (month, account_name, category) DO UPDATE SET
+        credits = credits + excluded.credits,
+        debits = debits + excluded.debits,
+        count = count + 1;
+END;
+CREATE TABLE IF NOT EXISTS balances (
+    id INTEGER PRIMARY KEY,
+    account_name TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    balance INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS balances_account_timestamp
+    ON balances (account_name, timestamp);
+CREATE TRIGGER IF NOT EXISTS balances_insert AFTER INSERT ON accounts
+WHEN NEW.balance IS NOT (
+    SELECT balance FROM balances WHERE account_name = NEW.name
+    ORDER BY timestamp DESC, id DESC LIMIT 1
+)
+BEGIN
+    INSERT INTO balances (account_name, timestamp, balance)
+    VALUES (NEW.name, strftime('%Y-%m-%dT%H:%M:%SZ', 'now'), NEW.balance);
+END;
+CREATE TRIGGER IF NOT EXISTS balances_update AFTER UPDATE OF balance ON accounts
+WHEN NEW.balance IS NOT (
+    SELECT balance FROM balances WHERE account_name = NEW.name
+    ORDER BY timestamp DESC, id DESC LIMIT 1
+)
+BEGIN
+    INSERT INTO balances (account_name, timestamp, balance)
+    VALUES (NEW.name, strftime('%Y-%m-%dT%H:%M:%SZ', 'now'), NEW.balance);
+END;
+"""
+
+REBUILD_ROLLUPS = """
+DELETE FROM rollups;
+INSERT INTO rollups (month, account_name, category, credits, debits, count)
+SELECT
+    substr(date, 1, 7),
+    account_name,
+    category,
+    SUM(CASE WHEN type = 'debit' THEN 0 ELSE amount END),
+    SUM(CASE WHEN type = 'debit' THEN amount ELSE 0 END),
+    COUNT(*)
+FROM transactions
+GROUP BY substr(date, 1, 7), account_name, category;
+"""
+
+TRANSACTION_COLUMNS = (
+    "date, description, amount, category, account_name, type, transaction_id"
+)
+
+UPSERT_ACCOUNT = (
+    "INSERT INTO accounts (name, account_type, balance) VALUES (?, ?, ?) "
+    "ON CONFLICT (name) DO UPDATE SET "
+    "account_type = excluded.account_type, balance = excluded.balance"
+)
+INSERT_TRANSACTION = (
+    "INSERT INTO transactions (date, description, amount, category, account_name, "
+    "type, fingerprint, transaction_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+)
+UPDATE_TRANSACTION = (
+    "UPDATE transactions SET date = ?, description = ?, amount = ?, category = ?, "
+    "account_name = ?, type = ?, fingerprint = ? WHERE transaction_id = ?"
+)
+# Skipped if the balance in effect at the snapshot's time is the same
+INSERT_BALANCE = (
+    "INSERT INTO balances (account_name, timestamp, balance) "
+    "SELECT :account_name, :timestamp, :balance WHERE :balance IS NOT ("
+    "SELECT balance FROM balances WHERE account_name = :account_name "
+    "AND timestamp <= :timestamp ORDER BY timestamp DESC, id DESC LIMIT 1)"
+)
+DELETE_TRANSACTION = "DELETE FROM transactions WHERE transaction_id = ?"
+REPLACE_CURSOR = (
+    "INSERT OR REPLACE INTO cursors (source_name, type, data) VALUES (?, ?, ?)"
+)
+
+
+class SqliteDatabase(Database):
+    def __init__(self, database_path: str, sqlite_path: str = None):
+        if sqlite_path is not None:
+            self._sqlite_path = os.path.expanduser(sqlite_path)
+        else:
+            self._sqlite_path = os.path.join(os.path.expanduser(database_path), SQLITE)
+        os.makedirs(os.path.dirname(self._sqlite_path), exist_ok=True)
+        self._connection = sqlite3.connect(self._sqlite_path)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        (version,) = self._connection.execute("PRAGMA user_version").fetchone()
+        if version > SCHEMA_VERSION:
+            raise ValueError(
+                f"'{self._sqlite_path}' has schema version {version}, newer than "
+                f"{SCHEMA_VERSION}"
+            )
+        with self._connection:
+            self._connection.executescript(SCHEMA)
+        self._connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def _rebuild_rollups(self):
+        # executescript() commits first, and runs the script on its own
+        self._connection.executescript(f"BEGIN; {REBUILD_ROLLUPS} COMMIT;")
+
+    def sync_lock(self, source_name: str):
+        # SQLite locks the database itself for writes
+        directory = os.path.dirname(self._sqlite_path)
+        return sync_lock(directory, source_name).exclusive()
+
+    def add_account(self, account: Account):
+        with self._connection:
+            self._connection.execute(UPSERT_ACCOUNT, _account_row(account))
+
+    def get_account(self, name: str) -> Account:
+        row = self._connection.execute(
+            "SELECT name, account_type, balance FROM accounts WHERE name = ?", (name,)
+        ).fetchone()
+        if row is None:
+            raise ValueError(f"Account '{name}' is not in the database")
+        return _account_from(row)
+
+    def get_accounts(self) -> List[Account]:
+        rows = self._connection.execute(
+            "SELECT name, account_type, balance FROM accounts ORDER BY rowid"
+        )
+        return [_account_from(row) for row in rows]
+
+    def get_balance_history(
+        self,
+        account_name: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ) -> List[BalanceSnapshot]:
+        # Starts with the balance in effect at `start`, as found by the index
+        sql = "SELECT timestamp, balance FROM balances WHERE account_name = ?"
+        parameters: List[Any] = [account_name]
+        if start is not None:
+            sql += (
+                " AND (timestamp > ? OR (timestamp, id) >= (SELECT timestamp, id "
+                "FROM balances WHERE account_name = ? AND timestamp <= ? "
+                "ORDER BY timestamp DESC, id DESC LIMIT 1))"
+            )
+            start_str = _timestamp_str(start)
+            parameters += [start_str, account_name, start_str]
+        if end is not None:
+            sql += " AND timestamp <= ?"
+            parameters.append(_timestamp_str(end))
+        rows = self._connection.execute(sql + " ORDER BY timestamp, id", parameters)
+        return [
+            BalanceSnapshot(
+                account_name=account_name,
+                timestamp=utc_timestamp(datetime.strptime(timestamp, TIMESTAMP_FMT)),
+                balance=Amount(balance),
+            )
+            for timestamp, balance in rows
+        ]
+
+    def add_balance_snapshots(self, snapshots: List[BalanceSnapshot]):
+        with self._connection:
+            self._connection.executemany(
+                INSERT_BALANCE, [_balance_row(s) for s in snapshots]
+            )
+
+    def update_account(self, account: Account):
+        with self._connection:
+            cursor = self._connection.execute(
+                "UPDATE accounts SET account_type = ?, balance = ? WHERE name = ?",
+                (account.type.value, account.balance, account.name),
+            )
+        if cursor.rowcount == 0:
+            raise ValueError(f"Account '{account.name}' is not in the database")
+
+    def add_transactions(self, transactions: List[Transaction]):
+        with self._connection:
+            self._connection.executemany(
+                INSERT_TRANSACTION, [_transaction_row(t) for t in transactions]
+            )
+
+    def update_transactions(self, transactions: List[Transaction]):
+        # Found through the transaction id index, and rolled up by trigger
+        with self._connection:
+            self._connection.executemany(
+                UPDATE_TRANSACTION, [_transaction_row(t) for t in transactions]
+            )
+
+    def remove_transactions(self, ids: List[str]):
+        with self._connection:
+            self._connection.executemany(DELETE_TRANSACTION, [(id,) for id in ids])
+
+    def bulk_add_transactions(self, batches: Iterable[List[Transaction]]) -> int:
+        # All batches are inserted in one SQLite transaction
+        count = 0
+        with self._connection:
+            for batch in batches:
+                self._connection.executemany(
+                    INSERT_TRANSACTION, [_transaction_row(t) for t in batch]
+                )
+                count += len(batch)
+        return count
+
+    def deduplicate_transactions(
+        self, transactions: List[Transaction], excluded_ids: Set[str] = frozenset()
+    ) -> List[Transaction]:
+        # Only the batch's fingerprints and ids are looked up, through their
+        # indexes, rather than reading the stored transactions
+        keys = list({_fingerprint_key(t) for t in transactions if t.id is None})
+        ids = list({t.id for t in transactions if t.id is not None})
+        stored, excluded = Counter(), Counter()
+        for batch in _batches(keys):
+            rows = self._connection.execute(
+                "SELECT fingerprint, transaction_id FROM transactions "
+                f"WHERE fingerprint IN ({_placeholders(batch)})",
+                batch,
+            )
+            for key, id in rows:
+                fingerprint = key % 2**64
+                stored[fingerprint] += 1
+                if id is not None and id in excluded_ids:
+                    excluded[fingerprint] += 1
+        stored_ids = set()
+        for batch in _batches(ids):
+            rows = self._connection.execute(
+                "SELECT transaction_id FROM transactions "
+                f"WHERE transaction_id IN ({_placeholders(batch)})",
+                batch,
+            )
+            stored_ids.update(id for (id,) in rows)
+        return select_new_transactions(transactions, stored, stored_ids, excluded)
+
+    def get_transactions(self) -> List[Transaction]:
+        return list(self.iter_transactions())
+
+    def iter_transactions(
+        self, query: Optional[TransactionQuery] = None, limit: Optional[int] = None
+    ) -> Iterator[Transaction]:
+        where, parameters = _where(query or TransactionQuery())
+        sql = f"SELECT {TRANSACTION_COLUMNS} FROM transactions {where} "
+        # Same-day records come back newest insert first, as in the plain text
+        # ledger where new records are placed ahead of older ones.
+        sql += "ORDER BY date DESC, id DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            parameters.append(limit)
+        for row in self._connection.execute(sql, parameters):
+            yield _transaction_from(row)
+
+    def query_transactions(self, query: TransactionQuery) -> List[Transaction]:
+        return list(self.iter_transactions(query))
+
+    def compact(self):
+        self._rebuild_rollups()
+        self._connection.execute("VACUUM")
+
+    def get_rollups(
+        self, start_date: Optional[date] = None, end_date: Optional[date] = None
+    ) -> Rollups:
+        clauses, parameters = [], []
+        if start_date is not None:
+            clauses.append("month >= ?")
+            parameters.append(start_date.strftime(MONTH_FMT))
+        if end_date is not None:
+            clauses.append("month <= ?")
+            parameters.append(end_date.strftime(MONTH_FMT))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._connection.execute(
+            "SELECT month, account_name, category, credits, debits, count "
+            f"FROM rollups {where}",
+            parameters,
+        )
+        return Rollups(
+            Rollup(month, account_name, category, Amount(credits), Amount(debits), n)
+            for month, account_name, category, credits, debits, n in rows
+        )
+
+    def commit_session(self, session: DatabaseSession):
+        with self._connection:
+            # Ahead of the accounts, whose balances are then only recorded if
+            # they changed since
+            self._connection.executemany(
+                INSERT_BALANCE, [_balance_row(s) for s in session.balances]
+            )
+            self._connection.executemany(
+                UPSERT_ACCOUNT, [_account_row(a) for a in session.accounts.values()]
+            )
+            self._connection.executemany(
+                DELETE_TRANSACTION, [(id,) for id in session.removed]
+            )
+            self._connection.executemany(
+                UPDATE_TRANSACTION,
+                [_transaction_row(t) for t in session.modified.values()],
+            )
+            self._connection.executemany(
+                INSERT_TRANSACTION, [_transaction_row(t) for t in session.transactions]
+            )
+            self._connection.executemany(
+                REPLACE_CURSOR,
+                [
+                    _cursor_row(source.name, sync_cursor)
+                    for source, sync_cursor in session.sync_cursors.values()
+                ],
+            )
+
+    def set_sync_cursor(self, source: Source, sync_cursor: SyncCursor):
+        with self._connection:
+            self._connection.execute(
+                REPLACE_CURSOR, _cursor_row(source.name, sync_cursor)
+            )
+
+    def get_sync_cursor(self, source: Source) -> Optional[SyncCursor]:
+        row = self._connection.execute(
+            "SELECT type, data FROM cursors WHERE source_name = ?", (source.name,)
+        ).fetchone()
+        if row is None:
+            return None
+        return create_sync_cursor(row[0], json.loads(row[1]))
+
+    def get_source_names(self) -> List[str]:
+        rows = self._connection.execute("SELECT name FROM sources ORDER BY rowid")
+        return [name for (name,) in rows]
+
+    def add_source(self, source: Source):
+        source_dict = source.serialize()
+        source_name = source_dict.pop("name")
+        with self._connection:
+            self._connection.execute(
+                "INSERT INTO sources (name, config) VALUES (?, ?)",
+                (source_name, json.dumps(source_dict)),
+            )
+
+    def get_source(self, name: str, resolve: bool = True) -> Source:
+        row = self._connection.execute(
+            "SELECT config FROM sources WHERE name = ?", (name,)
+        ).fetchone()
+        if row is None:
+            raise ValueError(f"Source '{name}' is not in the database")
+        source_dict = json.loads(row[0])
+        if resolve:
+            source_dict = resolve_secrets(source_dict)
+        source_dict["name"] = name
+        return SourceFactory.deserialize(source_dict)
+
+
+def _where(query: TransactionQuery) -> Tuple[str, List[Any]]:
+    clauses = []
+    parameters = []
+    if query.start_date is not None:
+        clauses.append("date >= ?")
+        parameters.append(query.start_date.isoformat())
+    if query.end_date is not None:
+        clauses.append("date <= ?")
+        parameters.append(query.end_date.isoformat())
+    if query.account_names is not None:
+        clauses.append(f"account_name IN ({_placeholders(query.account_names)})")
+        parameters += query.account_names
+    if query.categories is not None:
+        clauses.append(f"category IN ({_placeholders(query.categories)})")
+        parameters += query.categories
+    if query.min_amount is not None:
+        clauses.append("amount >= ?")
+        parameters.append(query.min_amount)
+    if query.max_amount is not None:
+        clauses.append("amount <= ?")
+        parameters.append(query.max_amount)
+    if query.text is not None:
+        clauses.append("instr(lower(description), ?) > 0")
+        parameters.append(query.text.lower())
+    if len(clauses) == 0:
+        return "", parameters
+    return "WHERE " + " AND ".join(clauses), parameters
+
+
+def _placeholders(values: List[Any]) -> str:
+    return ", ".join("?" for _ in values)
+
+
+def _timestamp_str(timestamp: datetime) -> str:
+    return utc_timestamp(timestamp).strftime(TIMESTAMP_FMT)
+
+
+def _account_from(row: Tuple) -> Account:
+    name, account_type, balance = row
+    # Databases migrated from dollar amounts keep REAL columns, so cents may
+    # come back as floats
+    return Account(
+        name=name, balance=Amount(round(balance)), type=AccountType(account_type)
+    )
+
+
+def _account_row(account: Account) -> Tuple:
+    return (account.name, account.type.value, account.balance)
+
+
+def _balance_row(snapshot: BalanceSnapshot) -> Dict[str, Any]:
+    return {
+        "account_name": snapshot.account_name,
+        "timestamp": _timestamp_str(snapshot.timestamp),
+        "balance": snapshot.balance,
+    }
+
+
+def _cursor_row(source_name: str, sync_cursor: SyncCursor) -> Tuple:
+    return (
+        source_name,
+        get_sync_cursor_type_from(sync_cursor).value,
+        json.dumps(sync_cursor.as_dict()),
+    )
+
+
+def _transaction_row(transaction: Transaction) -> Tuple:
+    return (
+        transaction.date.isoformat(),
+        transaction.description,
+        transaction.amount,
+        transaction.category,
+        transaction.account_name,
+        transaction.type.value,
+        _fingerprint_key(transaction),
+        transaction.id,
+    )
+
+
+def _fingerprint_key(transaction: Transaction) -> int:
+    # Fingerprints are unsigned 64-bit, and SQLite integers are signed
+    fingerprint = transaction_fingerprint(transaction)
+    return fingerprint - 2**64 if fingerprint >= 2**63 else fingerprint
+
+
+def _batches(values: List[Any]) -> Iterator[List[Any]]:
+    for start in range(0, len(values), LOOKUP_BATCH_SIZE):
+        yield values[start : start + LOOKUP_BATCH_SIZE]
+
+
+def _transaction_from(row: Tuple) -> Transaction:
+    date_str, description, amount, category, account_name, type, id = row
+    return Transaction(
+        date=date.fromisoformat(date_str),
+        description=description,
+        amount=Amount(round(amount)),
+        category=category,
+        account_name=account_name,
+        type=TransactionType(type),
+        id=id,
+    )
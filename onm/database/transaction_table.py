@@ -0,0 +1,177 @@
+import numpy as np
+import pandas as pd
+from datetime import date
+from onm.common import Amount, Transaction, TransactionType
+from typing import Dict, List, Optional
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+# Dictionary-encoded columns: codes into a table of distinct values. As in
+# the database's DataFrames, an empty id means the transaction has none.
+ENCODED_COLUMNS = ["description", "category", "account_name", "id"]
+
+
+class TransactionTable:
+    """Transactions as a structure of arrays.
+
+    Dates are int32 days since the epoch and amounts are signed int64 cents
+    (negative for debits). Descriptions, categories, account names and ids
+    are stored once each and referenced by int32 codes, so a long history holds
+    a handful of arrays rather than an object per field per transaction.
+    Columns are exposed directly as NumPy arrays, and to_df() builds a
+    DataFrame with categorical columns from the codes.
+    """
+
+    def __init__(
+        self,
+        dates: np.ndarray,
+        amounts: np.ndarray,
+        codes: Dict[str, np.ndarray],
+        values: Dict[str, List[str]],
+    ):
+        self.dates = np.asarray(dates, dtype=np.int32)
+        self.amounts = np.asarray(amounts, dtype=np.int64)
+        self.codes = {c: np.asarray(codes[c], dtype=np.int32) for c in ENCODED_COLUMNS}
+        self.values = {c: list(values[c]) for c in ENCODED_COLUMNS}
+
+    @staticmethod
+    def from_df(transactions_df: pd.DataFrame) -> "TransactionTable":
+        # Takes the database's DataFrame layout: datetime dates, absolute
+        # amounts in cents and a credit/debit type column
+        df = transactions_df
+        debit = (df["type"] == TransactionType.DEBIT.value).to_numpy()
+        cents = df["amount"].to_numpy(dtype=np.int64)
+        codes, values = {}, {}
+        for column in ENCODED_COLUMNS:
+            codes[column], values[column] = _encode(df[column])
+        return TransactionTable(
+            dates=df["date"].to_numpy(dtype="datetime64[D]").astype(np.int32),
+            amounts=np.where(debit, -cents, cents),
+            codes=codes,
+            values=values,
+        )
+
+    @staticmethod
+    def from_transactions(transactions: List[Transaction]) -> "TransactionTable":
+        codes, values = {}, {}
+        for column in ENCODED_COLUMNS:
+            codes[column], values[column] = _encode(
+                pd.Series(
+                    [getattr(t, column) or "" for t in transactions], dtype=object
+                )
+            )
+        cents = np.array([t.amount for t in transactions], dtype=np.int64)
+        debit = np.array(
+            [t.type == TransactionType.DEBIT for t in transactions], dtype=bool
+        )
+        return TransactionTable(
+            dates=[t.date.toordinal() - EPOCH_ORDINAL for t in transactions],
+            amounts=np.where(debit, -cents, cents),
+            codes=codes,
+            values=values,
+        )
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def __getitem__(self, key) -> "TransactionTable":
+        # Selects rows (by mask, indices or slice); value tables are shared
+        return TransactionTable(
+            dates=self.dates[key],
+            amounts=self.amounts[key],
+            codes={c: self.codes[c][key] for c in ENCODED_COLUMNS},
+            values=self.values,
+        )
+
+    def column(self, name: str) -> pd.Categorical:
+        return pd.Categorical.from_codes(
+            self.codes[name], categories=pd.Index(self.values[name], dtype=object)
+        )
+
+    def to_df(self) -> pd.DataFrame:
+        amounts = self.amounts
+        columns = {
+            "date": self.dates.astype("datetime64[D]").astype("datetime64[ns]"),
+            "description": self.column("description"),
+            "amount": np.abs(amounts),
+            "category": self.column("category"),
+            "account_name": self.column("account_name"),
+            "type": pd.Categorical.from_codes(
+                (amounts < 0).astype(np.int8),
+                categories=[TransactionType.CREDIT.value, TransactionType.DEBIT.value],
+            ),
+            "id": self.column("id"),
+        }
+        return pd.DataFrame(columns, columns=list(columns))
+
+    def to_transactions(self) -> List[Transaction]:
+        credit, debit = TransactionType.CREDIT, TransactionType.DEBIT
+        values = [self.values[c] for c in ENCODED_COLUMNS]
+        return [
+            Transaction(
+                date=date.fromordinal(int(d) + EPOCH_ORDINAL),
+                description=values[0][description],
+                amount=Amount(abs(amount)),
+                category=values[1][category],
+                account_name=values[2][account_name],
+                type=debit if amount < 0 else credit,
+                id=values[3][id] or None,
+            )
+            for d, amount, description, category, account_name, id in zip(
+                self.dates.tolist(),
+                self.amounts.tolist(),
+                *[self.codes[c].tolist() for c in ENCODED_COLUMNS],
+            )
+        ]
+
+    def totals(self, by: str, mask: Optional[np.ndarray] = None) -> Dict[str, Amount]:
+        # Exact net amount per account name, category or description
+        codes, amounts = self.codes[by], self.amounts
+        if mask is not None:
+            codes, amounts = codes[mask], amounts[mask]
+        sums = np.zeros(len(self.values[by]), dtype=np.int64)
+        np.add.at(sums, codes, amounts)
+        counts = np.bincount(codes, minlength=len(sums))
+        return {
+            value: Amount(total)
+            for value, total, count in zip(self.values[by], sums, counts)
+            if count > 0
+        }
+
+    @property
+    def nbytes(self) -> int:
+        # Array memory, not counting the distinct string values
+        arrays = [self.dates, self.amounts] + list(self.codes.values())
+        return sum(a.nbytes for a in arrays)
+
+
+def concat_tables(tables: List[TransactionTable]) -> TransactionTable:
+    if len(tables) == 1:
+        return tables[0]
+    codes, values = {}, {}
+    for column in ENCODED_COLUMNS:
+        # Remap each table's codes into a combined value table
+        combined: Dict[str, int] = {}
+        remapped = []
+        for table in tables:
+            mapping = np.array(
+                [combined.setdefault(v, len(combined)) for v in table.values[column]],
+                dtype=np.int32,
+            )
+            remapped.append(mapping[table.codes[column]])
+        codes[column] = np.concatenate(remapped) if remapped else []
+        values[column] = list(combined)
+    return TransactionTable(
+        dates=np.concatenate([t.dates for t in tables]) if tables else [],
+        amounts=np.concatenate([t.amounts for t in tables]) if tables else [],
+        codes=codes,
+        values=values,
+    )
+
+
+def _encode(column: pd.Series):
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        # Reuse the existing dictionary encoding, e.g. from a ledger snapshot
+        return column.cat.codes.to_numpy(), column.cat.categories.astype(str)
+    codes, uniques = pd.factorize(column.astype(str))
+    return codes, uniques
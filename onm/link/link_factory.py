@@ -1,7 +1,7 @@
 from ..common import SourceType
 from .link import Link
 from .plaid_link import PlaidLink
-from onm.connection.plaid_connection import get_plaid_api
+from onm.connection.plaid_connection import get_plaid_api, get_plaid_scheduler
 from onm.config import Config
 
 
@@ -11,6 +11,6 @@ class LinkFactory:
         if type == SourceType.PLAID:
             plaid_config = config.get_plaid_config()
             plaid_api = get_plaid_api(plaid_config)
-            return PlaidLink(plaid_api)
+            return PlaidLink(plaid_api, get_plaid_scheduler(plaid_config))
         else:
             raise ValueError("Unknown type")
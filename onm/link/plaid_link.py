@@ -5,13 +5,15 @@ from plaid.model.link_token_create_request import LinkTokenCreateRequest
 from plaid.model.item_public_token_exchange_request import (
     ItemPublicTokenExchangeRequest,
 )
+from onm.connection.plaid_scheduler import PlaidScheduler
 from .link import Link
 from .. import webserver
 
 
 class PlaidLink(Link):
-    def __init__(self, plaid_api: PlaidApi):
+    def __init__(self, plaid_api: PlaidApi, scheduler: PlaidScheduler = None):
         self._plaid_api = plaid_api
+        self._scheduler = scheduler or PlaidScheduler()
 
     def get_access_token(self):
         link_token = self._get_link_token()
@@ -42,7 +44,11 @@ class PlaidLink(Link):
         else:
             data["products"] = [Products("transactions")]
         req = LinkTokenCreateRequest(**data)
-        res = self._plaid_api.link_token_create(req)
+        res = self._scheduler.call(
+            "link_token_create",
+            access_token,
+            lambda: self._plaid_api.link_token_create(req),
+        )
         return res.link_token
 
     def _get_public_token(self, link_token: str = None) -> str:
@@ -56,5 +62,11 @@ class PlaidLink(Link):
 
     def _exchange_public_token(self, public_token: str) -> str:
         req = ItemPublicTokenExchangeRequest(public_token)
-        res = self._plaid_api.item_public_token_exchange(req)
+        res = self._scheduler.call(
+            "item_public_token_exchange",
+            None,
+            lambda: self._plaid_api.item_public_token_exchange(req),
+            # Public tokens can only be exchanged once
+            idempotent=False,
+        )
         return res.access_token
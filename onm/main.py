@@ -1,17 +1,42 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from queue import Empty, Queue
+from threading import Event
+from typing import Dict, List, NamedTuple, Optional
 from onm.config import Config
 from onm import common
 from onm.common import SourceType
 from onm.connection.connection import AccountType
 from onm.source.source_factory import SourceFactory
 from onm.connection.connection_factory import ConnectionFactory
+from onm.database.database import Database, DatabaseSession, TransactionQuery
+from onm.database.export import ExportFormat, ExportTable
+from onm.database.migration import MigrationSummary, migrate as migrate_database
 from onm.database.database_factory import DatabaseFactory
+from onm.secret import configure_secret_cache, resolve_secrets
+from onm.source.source import Source, SyncTransactionsResponse
+from onm.sync import SyncCursor
+
+# Upper bound on sources fetched from at once by sync_all
+MAX_SYNC_WORKERS = 4
+
+
+class SyncSummary(NamedTuple):
+    added_transactions: int
+    skipped_transactions: int
+
+
+class SyncAllSummary(NamedTuple):
+    synced_sources: List[str]
+    failed_sources: Dict[str, Exception]
+    added_transactions: int
+    skipped_transactions: int
 
 
 def add_source(
     type: SourceType, name: str, config: Config, account_type: str = None
 ) -> None:
-    database_config = config.get_database_config()
-    database = DatabaseFactory.create_database(database_config)
+    database = _create_database(config)
     source = SourceFactory.create_source(
         type=type,
         name=name,
@@ -22,8 +47,7 @@ def add_source(
 
 
 def update_source(name: str, config: Config) -> None:
-    database_config = config.get_database_config()
-    database = DatabaseFactory.create_database(database_config)
+    database = _create_database(config)
     source = database.get_source(name)
     if source.type is not SourceType.PLAID:
         # TODO: Any warning? Perhaps in verbose mode?
@@ -36,23 +60,165 @@ def sync_source(
     config: Config,
     csv_path: str = None,
     account_type: str = None,
-) -> None:
-    database_config = config.get_database_config()
-    database = DatabaseFactory.create_database(database_config)
-    source = database.get_source(name)
-    connection = ConnectionFactory.create_connection(
-        source.type,
-        config,
-        csv_path=csv_path,
-        account_type=AccountType(account_type) if account_type else None,
+) -> SyncSummary:
+    database = _create_database(config)
+    # Other sources can be synced by other processes meanwhile; a second sync
+    # of this source waits, then continues from the cursor this one stores
+    with database.sync_lock(name):
+        source = database.get_source(name)
+        connection = ConnectionFactory.create_connection(
+            source.type,
+            config,
+            csv_path=csv_path,
+            account_type=AccountType(account_type) if account_type else None,
+        )
+        account_balances = source.get_account_balances(connection)
+        sync_cursor = database.get_sync_cursor(source)
+        added_transactions, skipped_transactions = 0, 0
+        # Every page is committed with its cursor, so an interrupted sync
+        # resumes after the last page stored
+        for page in source.iter_sync_transactions(connection, sync_cursor):
+            with database.session() as session:
+                _add_fetched(session, source, [], page)
+            added_transactions += session.added_transactions
+            skipped_transactions += session.skipped_transactions
+        with database.session() as session:
+            _add_fetched(session, source, account_balances)
+    return SyncSummary(
+        added_transactions=added_transactions,
+        skipped_transactions=skipped_transactions,
+    )
+
+
+def sync_all(config: Config, max_workers: int = MAX_SYNC_WORKERS) -> SyncAllSummary:
+    # Plaid sources are fetched from concurrently, sharing one connection.
+    # Fetched pages are queued for this thread, which commits whatever has
+    # arrived in a single session. Only this thread uses the database, since
+    # not every backend can be used from other threads. A source that fails
+    # is reported without affecting the others. CSV sources are skipped,
+    # since they are synced from a given file. Secrets are resolved by the
+    # fetches, so that the commands of different sources run concurrently.
+    database = _create_database(config)
+    names = [
+        name
+        for name in database.get_source_names()
+        if database.get_source(name, resolve=False).type == SourceType.PLAID
+    ]
+    if len(names) == 0:
+        return SyncAllSummary([], {}, 0, 0)
+    connection = ConnectionFactory.create_connection(SourceType.PLAID, config)
+    # Bounds the pages held in memory while the database catches up
+    fetched = Queue(maxsize=2 * max_workers)
+    stop = Event()
+
+    def fetch(source: Source, sync_cursor: Optional[SyncCursor]):
+        try:
+            source = _resolve_source(source)
+            account_balances = source.get_account_balances(connection)
+            for page in source.iter_sync_transactions(connection, sync_cursor):
+                if stop.is_set():
+                    return
+                fetched.put((source, [], page))
+            fetched.put((source, account_balances, None))
+        finally:
+            # Marks this source done
+            fetched.put(None)
+
+    added_transactions, skipped_transactions = 0, 0
+    failed_sources: Dict[str, Exception] = {}
+    futures = {}
+    with ExitStack() as locks:
+        # Taken in a fixed order, so that concurrent syncs cannot deadlock
+        for name in sorted(names):
+            locks.enter_context(database.sync_lock(name))
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            for name in names:
+                # Read once the locks are held, so that no other sync moves
+                # the cursor
+                try:
+                    source = database.get_source(name, resolve=False)
+                    sync_cursor = database.get_sync_cursor(source)
+                except Exception as e:
+                    failed_sources[name] = e
+                    continue
+                futures[name] = pool.submit(fetch, source, sync_cursor)
+            try:
+                remaining = len(futures)
+                while remaining > 0:
+                    items = [fetched.get()]
+                    while not fetched.empty():
+                        items.append(fetched.get())
+                    remaining -= items.count(None)
+                    items = [item for item in items if item is not None]
+                    if len(items) == 0:
+                        continue
+                    with database.session() as session:
+                        for item in items:
+                            _add_fetched(session, *item)
+                    added_transactions += session.added_transactions
+                    skipped_transactions += session.skipped_transactions
+            finally:
+                # Unblock any fetches still queueing pages
+                stop.set()
+                while not all(future.done() for future in futures.values()):
+                    try:
+                        fetched.get(timeout=0.1)
+                    except Empty:
+                        pass
+    failed_sources.update(
+        (name, future.exception())
+        for name, future in futures.items()
+        if future.exception() is not None
+    )
+    return SyncAllSummary(
+        synced_sources=[name for name in names if name not in failed_sources],
+        failed_sources=failed_sources,
+        added_transactions=added_transactions,
+        skipped_transactions=skipped_transactions,
     )
-    account_balances = source.get_account_balances(connection)
-    sync_cursor = database.get_sync_cursor(source)
-    sync_transactions_res = source.sync_transactions(connection, sync_cursor)
 
+
+def _resolve_source(source: Source) -> Source:
+    return SourceFactory.deserialize(resolve_secrets(source.serialize()))
+
+
+def _add_fetched(
+    session: DatabaseSession,
+    source: Source,
+    account_balances: List[common.Account],
+    page: Optional[SyncTransactionsResponse] = None,
+):
     for account in account_balances:
-        database.add_account(account)
-    transactions = sync_transactions_res.transactions
-    sync_cursor = sync_transactions_res.sync_cursor
-    database.add_transactions(transactions)
-    database.set_sync_cursor(source, sync_cursor)
+        session.add_account(account)
+    if page is not None:
+        session.add_transactions(page.transactions)
+        session.update_transactions(page.modified)
+        session.remove_transactions(page.removed)
+        session.set_sync_cursor(source, page.sync_cursor)
+
+
+def compact(config: Config) -> None:
+    database = _create_database(config)
+    database.compact()
+
+
+def export(
+    path: str,
+    format: ExportFormat,
+    table: ExportTable,
+    config: Config,
+    query: TransactionQuery = None,
+) -> int:
+    database = _create_database(config)
+    return database.export(path, format, table, query)
+
+
+def migrate(from_config: Config, to_config: Config) -> MigrationSummary:
+    from_database = _create_database(from_config)
+    to_database = DatabaseFactory.create_database(to_config.get_database_config())
+    return migrate_database(from_database, to_database)
+
+
+def _create_database(config: Config) -> Database:
+    configure_secret_cache(config.get_secret_cache_config())
+    return DatabaseFactory.create_database(config.get_database_config())
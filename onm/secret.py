@@ -0,0 +1,146 @@
+import os
+import json
+import stat
+import time
+import shlex
+import hashlib
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, NamedTuple, Optional
+
+SECRET_COMMAND_PREFIX = "$ "
+
+# Upper bound on secret commands (e.g. password manager calls) run at once
+MAX_WORKERS = 8
+
+
+class SecretCacheConfiguration(NamedTuple):
+    path: str
+    ttl: float
+
+
+class SecretFileCache:
+    """Resolved secrets kept in a file readable only by its owner, each for
+    `ttl` seconds after it was resolved. Entries are keyed by a hash of the
+    command. A file that other users can access is ignored.
+    """
+
+    def __init__(self, path: str, ttl: float):
+        self._path = os.path.expanduser(path)
+        self._ttl = ttl
+        self._lock = threading.Lock()
+
+    def get(self, command: str) -> Optional[str]:
+        entry = self._read().get(_command_key(command))
+        if entry is None or not self._is_fresh(entry, time.time()):
+            return None
+        return entry["value"]
+
+    def put(self, command: str, value: str):
+        with self._lock:
+            now = time.time()
+            entries = {k: e for k, e in self._read().items() if self._is_fresh(e, now)}
+            entries[_command_key(command)] = {"value": value, "resolved": now}
+            os.makedirs(os.path.dirname(self._path), mode=0o700, exist_ok=True)
+            tmp_path = f"{self._path}.{os.getpid()}.tmp"
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w") as f:
+                json.dump(entries, f)
+            os.replace(tmp_path, self._path)
+
+    def _is_fresh(self, entry: Dict, now: float) -> bool:
+        return entry["resolved"] + self._ttl > now
+
+    def _read(self) -> Dict[str, Dict]:
+        try:
+            with open(self._path) as f:
+                mode = os.fstat(f.fileno())
+                if mode.st_uid != os.getuid() or stat.S_IMODE(mode.st_mode) & 0o077:
+                    return {}
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+
+_secrets: Dict[str, str] = {}
+_secrets_lock = threading.Lock()
+_file_cache: Optional[SecretFileCache] = None
+
+
+def configure_secret_cache(config: Optional[SecretCacheConfiguration]):
+    global _file_cache
+    _file_cache = None if config is None else SecretFileCache(config.path, config.ttl)
+
+
+def clear_secret_cache():
+    with _secrets_lock:
+        _secrets.clear()
+
+
+def is_secret_command(value: str) -> bool:
+    return value[0 : len(SECRET_COMMAND_PREFIX)] == SECRET_COMMAND_PREFIX
+
+
+def resolve_secret(value: str) -> str:
+    # Values of the form "$ <command>" are resolved by running the command,
+    # e.g. "$ pass show plaid/access_token". Results are cached for the life
+    # of the process, and in the secret file cache if one is configured.
+    if not is_secret_command(value):
+        return value
+    with _secrets_lock:
+        if value in _secrets:
+            return _secrets[value]
+    secret = None if _file_cache is None else _file_cache.get(value)
+    if secret is None:
+        secret = _run_secret_command(value)
+        if _file_cache is not None:
+            _file_cache.put(value, secret)
+    with _secrets_lock:
+        _secrets[value] = secret
+    return secret
+
+
+def resolve_secrets(value: Any) -> Any:
+    # Distinct secret commands are run concurrently
+    commands = list(dict.fromkeys(_secret_commands(value)))
+    if len(commands) > 1:
+        with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(commands))) as pool:
+            list(pool.map(resolve_secret, commands))
+    return _resolve(value)
+
+
+def _resolve(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: _resolve(v) for k, v in value.items()}
+    elif isinstance(value, list):
+        return [_resolve(e) for e in value]
+    elif isinstance(value, str):
+        return resolve_secret(value)
+    return value
+
+
+def _secret_commands(value: Any) -> List[str]:
+    if isinstance(value, dict):
+        return [c for v in value.values() for c in _secret_commands(v)]
+    elif isinstance(value, list):
+        return [c for e in value for c in _secret_commands(e)]
+    elif isinstance(value, str) and is_secret_command(value):
+        return [value]
+    return []
+
+
+def _run_secret_command(value: str) -> str:
+    command = shlex.split(value[len(SECRET_COMMAND_PREFIX) :])
+    result = subprocess.run(
+        command,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        check=True,
+    )
+    return result.stdout.replace("\n", "")
+
+
+def _command_key(command: str) -> str:
+    return hashlib.sha256(command.encode("utf-8")).hexdigest()
@@ -6,7 +6,7 @@ from onm.config import Config
 from ..connection.plaid_connection import PlaidConnection
 from ..sync import PlaidSyncCursor
 from .source import Source, SyncTransactionsResponse
-from typing import List, Dict
+from typing import Dict, Iterator, List
 
 
 class PlaidSource(Source):
@@ -52,9 +52,26 @@ class PlaidSource(Source):
         sync_response = connection.sync_transactions(
             sync_cursor=sync_cursor, access_token=self._access_token
         )
-        transactions = [self._transaction_from(t) for t in sync_response.transactions]
+        return self._response_from(sync_response)
+
+    def iter_sync_transactions(
+        self, connection: PlaidConnection, sync_cursor: PlaidSyncCursor = None
+    ) -> Iterator[SyncTransactionsResponse]:
+        for sync_response in connection.iter_sync_transactions(
+            sync_cursor=sync_cursor, access_token=self._access_token
+        ):
+            yield self._response_from(sync_response)
+
+    def _response_from(
+        self, sync_response: connection.SyncTransactionsResponse
+    ) -> SyncTransactionsResponse:
         return SyncTransactionsResponse(
-            transactions=transactions, sync_cursor=sync_response.sync_cursor
+            transactions=[
+                self._transaction_from(t) for t in sync_response.transactions
+            ],
+            sync_cursor=sync_response.sync_cursor,
+            modified=[self._transaction_from(t) for t in sync_response.modified],
+            removed=sync_response.removed,
         )
 
     def _transaction_from(self, t: connection.Transaction) -> Transaction:
@@ -67,6 +84,7 @@ class PlaidSource(Source):
                 t.primary_category, t.detailed_category
             ),
             type=TransactionType(t.type.value),
+            id=t.transaction_id,
         )
 
     @staticmethod
@@ -1,6 +1,6 @@
 from __future__ import annotations
 from abc import ABC, abstractmethod
-from typing import Dict, List, NamedTuple, Optional
+from typing import Dict, Iterator, List, NamedTuple, Optional
 from ..common import Transaction, Account, SourceType
 from ..sync import SyncCursor
 from ..connection.connection import Connection
@@ -9,6 +9,9 @@ from ..connection.connection import Connection
 class SyncTransactionsResponse(NamedTuple):
     transactions: List[Transaction]
     sync_cursor: SyncCursor
+    # Changes to and removals of transactions synced before, by transaction id
+    modified: List[Transaction] = []
+    removed: List[str] = []
 
 
 class Source(ABC):
@@ -33,6 +36,12 @@ class Source(ABC):
     ) -> SyncTransactionsResponse:
         pass
 
+    def iter_sync_transactions(
+        self, connection: Connection, sync_cursor: Optional[SyncCursor]
+    ) -> Iterator[SyncTransactionsResponse]:
+        # Sources that can fetch page by page override this
+        yield self.sync_transactions(connection, sync_cursor)
+
     @abstractmethod
     def serialize(self) -> Dict:
         pass
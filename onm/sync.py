@@ -1,7 +1,7 @@
 from abc import ABC
 from enum import Enum
 from datetime import datetime
-from typing import Dict
+from typing import Dict, Optional
 
 
 class SyncCursorType(Enum):
@@ -14,15 +14,23 @@ class SyncCursor(ABC):
 
 
 class PlaidSyncCursor(SyncCursor):
-    def __init__(self, cursor: str):
+    def __init__(self, cursor: str, start_cursor: Optional[str] = None):
         self._cursor = cursor
+        # Part way through paginating, the cursor the pagination started from
+        self._start_cursor = start_cursor
 
     @property
     def cursor(self) -> str:
         return self._cursor
 
+    @property
+    def start_cursor(self) -> Optional[str]:
+        return self._start_cursor
+
     def as_dict(self) -> Dict:
-        return {"cursor": self._cursor}
+        if self._start_cursor is None:
+            return {"cursor": self._cursor}
+        return {"cursor": self._cursor, "start_cursor": self._start_cursor}
 
 
 class CsvSyncCursor(SyncCursor):
@@ -0,0 +1,35 @@
+import pytest
+from decimal import Decimal
+from onm.common import Amount
+
+pytestmark = pytest.mark.unit
+
+
+def test_amount_parse():
+    assert 10280 == Amount.parse("102.8")
+    assert -250 == Amount.parse("-2.50")
+    assert 120000 == Amount.parse("1,200")
+    assert 10 == Amount.parse(b"0.10")
+    with pytest.raises(ValueError):
+        Amount.parse("1.005")
+    with pytest.raises(ValueError):
+        Amount.parse("None")
+
+
+def test_amount_arithmetic():
+    amounts = [Amount.parse("0.1")] * 1000
+    assert Amount.parse("100") == sum(amounts)
+    assert type(sum(amounts)) is Amount
+    assert Amount.parse("-0.2") == Amount.parse("0.1") - Amount.parse("0.3")
+    assert type(-abs(Amount(5))) is Amount
+    assert "-102.80" == str(Amount(-10280))
+    assert "$0.05" == f"${Amount(5)}"
+    assert 10280 == Amount.from_float(102.8)
+
+
+def test_amount_rejects_fractional_cents():
+    assert 3580 == Amount(3580.0)
+    with pytest.raises(ValueError):
+        Amount(35.8)
+    with pytest.raises(ValueError):
+        Amount(Decimal("0.5"))
@@ -148,9 +148,11 @@ def test_apple_csv_end_to_end(config: Config):
     assert 1 == len(accounts)
 
     # Fetch again (assume nothing changed)
-    main.sync_source(
+    summary = main.sync_source(
         "apple", config, csv_path=APPLE_CSV_PATH, account_type=AccountType.ASSET
     )
+    assert 0 == summary.added_transactions
+    assert 4 == summary.skipped_transactions
     assert len(transactions) == len(database.get_transactions())
     assert len(accounts) == len(database.get_accounts())
 
@@ -0,0 +1,106 @@
+import csv
+import json
+import pytest
+from datetime import datetime
+from onm.common import Account, AccountType, Amount, Transaction, TransactionType
+from onm.database.database import TransactionQuery
+from onm.database.export import ExportFormat, ExportTable
+from onm.database.in_memory_database import InMemoryDatabase
+
+pytestmark = pytest.mark.unit
+
+TRANSACTIONS = [
+    Transaction(
+        date=datetime(2025, 1, 2).date(),
+        description="Paycheck ACME",
+        amount=Amount.parse("1200.0"),
+        category="INCOME",
+        account_name="onm_checking",
+        type=TransactionType.CREDIT,
+    ),
+    Transaction(
+        date=datetime(2024, 12, 3).date(),
+        description="UMPHREYS, DENVER",
+        amount=Amount.parse("102.8"),
+        category="MUSIC",
+        account_name="onm_savings",
+        type=TransactionType.DEBIT,
+        id="lPNjeW1nR6CDn5okmGQ6hEpMo4lLNoSrzqDje",
+    ),
+    Transaction(
+        date=datetime(2024, 3, 12).date(),
+        description="TOMI JAZZ",
+        amount=Amount.parse("0.1"),
+        category="MUSIC",
+        account_name="onm_savings",
+        type=TransactionType.DEBIT,
+    ),
+]
+
+
+@pytest.fixture
+def database() -> InMemoryDatabase:
+    database = InMemoryDatabase()
+    database.add_account(Account("onm_checking", Amount(2390), AccountType.ASSET))
+    database.add_account(Account("onm_savings", Amount(4560), AccountType.ASSET))
+    database.add_transactions(TRANSACTIONS)
+    return database
+
+
+def test_iter_chunks(database: InMemoryDatabase):
+    chunks = list(database.iter_chunks(ExportTable.TRANSACTIONS, chunk_size=2))
+    assert [2, 1] == [len(chunk) for chunk in chunks]
+    query = TransactionQuery(account_names=["onm_savings"])
+    assert [[Account("onm_savings", Amount(4560), AccountType.ASSET)]] == list(
+        database.iter_chunks(ExportTable.ACCOUNTS, query)
+    )
+
+
+def test_export_csv(database: InMemoryDatabase, tmp_path):
+    path = str(tmp_path / "transactions.csv")
+    query = TransactionQuery(categories=["MUSIC"])
+    assert 2 == database.export(path, ExportFormat.CSV, query=query, chunk_size=1)
+    with open(path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert [
+        {
+            "date": "2024-12-03",
+            "description": "UMPHREYS, DENVER",
+            "amount": "102.80",
+            "category": "MUSIC",
+            "account_name": "onm_savings",
+            "type": "debit",
+            "id": "lPNjeW1nR6CDn5okmGQ6hEpMo4lLNoSrzqDje",
+        },
+        {
+            "date": "2024-03-12",
+            "description": "TOMI JAZZ",
+            "amount": "0.10",
+            "category": "MUSIC",
+            "account_name": "onm_savings",
+            "type": "debit",
+            "id": "",
+        },
+    ] == rows
+
+
+def test_export_jsonl(database: InMemoryDatabase, tmp_path):
+    path = str(tmp_path / "balances.jsonl")
+    assert 2 == database.export(path, ExportFormat.JSONL, ExportTable.BALANCES)
+    with open(path) as f:
+        rows = [json.loads(line) for line in f]
+    assert ["onm_checking", "onm_savings"] == [r["account_name"] for r in rows]
+    assert ["23.90", "45.60"] == [r["balance"] for r in rows]
+    assert datetime.fromisoformat(rows[0]["timestamp"]).tzinfo is not None
+
+
+def test_export_parquet(database: InMemoryDatabase, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    path = str(tmp_path / "transactions.parquet")
+    assert 3 == database.export(path, ExportFormat.PARQUET, chunk_size=2)
+    table = pq.read_table(path)
+    assert 2 == pq.ParquetFile(path).num_row_groups
+    assert [t.description for t in TRANSACTIONS] == table["description"].to_pylist()
+    assert ["1200.00", "102.80", "0.10"] == [
+        str(a) for a in table["amount"].to_pylist()
+    ]
@@ -0,0 +1,264 @@
+import os
+import shutil
+import pytest
+from datetime import datetime
+from onm.common import Account, AccountType, Amount, Transaction, TransactionType
+from onm.database.database import DatabaseConfiguration, DatabaseType, TransactionQuery
+from onm.database.database_factory import DatabaseFactory
+from onm.database.in_memory_database import InMemoryDatabase
+from onm.database.plain_text_database import PlainTextDatabase
+from onm.database.rollup import Rollups
+from onm.sync import PlaidSyncCursor
+from onm.source.plaid_source import PlaidSource
+
+pytestmark = pytest.mark.unit
+
+DATABASE = os.path.join(os.path.dirname(__file__), "resources", "plain_text_database")
+
+TRANSACTIONS = [
+    Transaction(
+        date=datetime(2024, 12, 3).date(),
+        description="UMPHREYS",
+        amount=Amount.parse("102.8"),
+        category="MUSIC",
+        account_name="onm_savings",
+        type=TransactionType.DEBIT,
+    ),
+    Transaction(
+        date=datetime(2025, 1, 2).date(),
+        description="Paycheck ACME",
+        amount=Amount.parse("1200.0"),
+        category="INCOME",
+        account_name="onm_checking",
+        type=TransactionType.CREDIT,
+    ),
+    Transaction(
+        date=datetime(2024, 3, 12).date(),
+        description="TOMI JAZZ",
+        amount=Amount.parse("35.8"),
+        category="MUSIC",
+        account_name="onm_savings",
+        type=TransactionType.DEBIT,
+    ),
+]
+
+
+@pytest.fixture
+def database() -> InMemoryDatabase:
+    return InMemoryDatabase()
+
+
+@pytest.fixture
+def database_path(tmp_path) -> str:
+    database_path = str(tmp_path / "database")
+    shutil.copytree(DATABASE, database_path)
+    return database_path
+
+
+def test_create_database():
+    database = DatabaseFactory.create_database(
+        DatabaseConfiguration(type=DatabaseType.IN_MEMORY, parameters={})
+    )
+    assert InMemoryDatabase == type(database)
+
+
+def test_accounts(database: InMemoryDatabase):
+    database.add_account(Account("roth_ira", Amount.parse("100.95"), AccountType.ASSET))
+    database.add_account(Account("amex", Amount.parse("20.5"), AccountType.LIABILITY))
+    assert Amount.parse("100.95") == database.get_account("roth_ira").balance
+    assert ["roth_ira", "amex"] == [a.name for a in database.get_accounts()]
+
+    database.update_account(
+        Account("roth_ira", Amount.parse("93.2"), AccountType.ASSET)
+    )
+    assert Amount.parse("93.2") == database.get_account("roth_ira").balance
+    with pytest.raises(ValueError):
+        database.get_account("checking")
+    with pytest.raises(ValueError):
+        database.update_account(
+            Account("checking", Amount.parse("1.0"), AccountType.ASSET)
+        )
+
+
+def test_transactions(database: InMemoryDatabase):
+    database.add_transactions(TRANSACTIONS)
+    transactions = database.get_transactions()
+    assert ["Paycheck ACME", "UMPHREYS", "TOMI JAZZ"] == [
+        t.description for t in transactions
+    ]
+    assert ["Paycheck ACME"] == [
+        t.description for t in database.iter_transactions(limit=1)
+    ]
+
+
+def test_query_transactions(database: InMemoryDatabase):
+    database.add_transactions(TRANSACTIONS)
+
+    def query(**kwargs):
+        transactions = database.query_transactions(TransactionQuery(**kwargs))
+        return [t.description for t in transactions]
+
+    assert ["UMPHREYS", "TOMI JAZZ"] == query(categories=["MUSIC"])
+    assert ["UMPHREYS"] == query(
+        min_amount=Amount.parse("50"), max_amount=Amount.parse("500")
+    )
+    assert ["Paycheck ACME"] == query(text="acme")
+    assert ["Paycheck ACME", "UMPHREYS"] == query(
+        start_date=datetime(2024, 12, 3).date(), end_date=datetime(2025, 1, 2).date()
+    )
+    assert ["Paycheck ACME", "TOMI JAZZ"] == query(
+        account_names=["onm_checking", "onm_savings"],
+        end_date=datetime(2025, 1, 31).date(),
+        max_amount=Amount.parse("2000"),
+        text="a",
+    )
+
+
+def test_sync_cursor_and_sources(database: InMemoryDatabase):
+    source = PlaidSource(
+        name="onm_bank",
+        access_token="$ echo access-sandbox-a4a6c36b-0276-431d-a843-65c30b506e77",
+        account_map={
+            "a927faed81ca48916e56e6ccda63fe09": {
+                "name": "checking",
+                "account_type": AccountType.ASSET,
+            },
+        },
+    )
+    assert database.get_sync_cursor(source) is None
+    database.set_sync_cursor(source, PlaidSyncCursor("805c4d192e0d4bbe742bda1f21"))
+    assert "805c4d192e0d4bbe742bda1f21" == database.get_sync_cursor(source).cursor
+
+    database.add_source(source)
+    source = database.get_source("onm_bank")
+    assert "access-sandbox-a4a6c36b-0276-431d-a843-65c30b506e77" == source.access_token
+    with pytest.raises(ValueError):
+        database.get_source("bank")
+    with pytest.raises(ValueError):
+        database.flush()
+
+
+def test_load_and_flush(database_path: str):
+    database = InMemoryDatabase(database_path)
+    assert 2 == len(database.get_accounts())
+    assert ["UMPHREYS"] == [t.description for t in database.get_transactions()]
+    source = database.get_source("platypus_bank")
+    assert PlaidSource == type(source)
+    assert "75626d959a12ead47337eca9d9c6eaec" == (
+        database.get_sync_cursor(PlaidSource("onm_bank")).cursor
+    )
+
+    database.add_account(Account("amex", Amount.parse("20.5"), AccountType.LIABILITY))
+    database.add_transactions(TRANSACTIONS[1:])
+    database.set_sync_cursor(PlaidSource("onm_bank"), PlaidSyncCursor("a0b1c2"))
+    plain_text_database = PlainTextDatabase(database_path)
+    assert 1 == len(plain_text_database.get_transactions())
+
+    database.flush()
+    assert 3 == len(plain_text_database.get_accounts())
+    assert ["Paycheck ACME", "UMPHREYS", "TOMI JAZZ"] == [
+        t.description for t in plain_text_database.get_transactions()
+    ]
+    cursor = plain_text_database.get_sync_cursor(PlaidSource("onm_bank"))
+    assert "a0b1c2" == cursor.cursor
+    database.flush()
+    assert 3 == len(plain_text_database.get_transactions())
+
+
+def test_session_skips_duplicates(database: InMemoryDatabase):
+    with database.session() as session:
+        session.add_transactions(TRANSACTIONS + TRANSACTIONS[:1])
+    with database.session() as session:
+        session.add_transactions(TRANSACTIONS[:1] * 3)
+    assert 1 == session.added_transactions
+    assert 2 == session.skipped_transactions
+    assert 5 == len(database.get_transactions())
+
+
+def test_rollups(database_path: str):
+    database = InMemoryDatabase(database_path)
+    database.add_transactions(TRANSACTIONS)
+    assert Rollups.from_transactions(database.get_transactions()) == (
+        database.get_rollups()
+    )
+    database.flush()
+    assert PlainTextDatabase(database_path).get_rollups() == database.get_rollups()
+
+
+def test_update_and_remove_transactions(database_path: str):
+    database = InMemoryDatabase(database_path)
+    pending = TRANSACTIONS[1]._replace(description="PENDING", id="txn_1")
+    with database.session() as session:
+        session.add_transactions([pending, TRANSACTIONS[2]._replace(id="txn_2")])
+        # Applies to the transactions added in the same session
+        session.remove_transactions(["txn_2"])
+    posted = pending._replace(description="POSTED", amount=Amount.parse("1250.0"))
+    database.update_transactions([posted, TRANSACTIONS[0]._replace(id="txn_3")])
+    assert [posted, "UMPHREYS"] == [
+        t if t.id else t.description for t in database.get_transactions()
+    ]
+    assert [posted] == database.query_transactions(
+        TransactionQuery(account_names=["onm_checking"])
+    )
+    assert Rollups.from_transactions(database.get_transactions()) == (
+        database.get_rollups()
+    )
+
+    database.flush()
+    plain_text_database = PlainTextDatabase(database_path)
+    assert database.get_transactions() == plain_text_database.get_transactions()
+    database.remove_transactions(["txn_1"])
+    database.flush()
+    assert ["UMPHREYS"] == [
+        t.description for t in plain_text_database.get_transactions()
+    ]
+
+
+def test_balance_history(database_path: str):
+    plain_text_database = PlainTextDatabase(database_path)
+    account = plain_text_database.get_account("onm_bank_checking")
+    plain_text_database.update_account(account._replace(balance=Amount(100)))
+
+    database = InMemoryDatabase(database_path)
+    database.update_account(account._replace(balance=Amount(200)))
+    assert [100, 200] == [
+        s.balance for s in database.get_balance_history("onm_bank_checking")
+    ]
+
+
+def test_flush_balance_history(database_path: str):
+    database = InMemoryDatabase(database_path)
+    account = database.get_account("onm_bank_checking")
+    for balance in [100, 200, 300]:
+        database.update_account(account._replace(balance=Amount(balance)))
+    history = database.get_balance_history("onm_bank_checking")
+    assert [100, 200, 300] == [s.balance for s in history[-3:]]
+
+    # Every buffered balance is written, as of when it was seen
+    database.flush()
+    plain_text_database = PlainTextDatabase(database_path)
+    flushed = plain_text_database.get_balance_history("onm_bank_checking")
+    assert [s.balance for s in history] == [s.balance for s in flushed]
+    assert [s.timestamp.replace(microsecond=0) for s in history] == [
+        s.timestamp for s in flushed
+    ]
+    assert Amount(300) == plain_text_database.get_account("onm_bank_checking").balance
+
+
+def test_session_skips_duplicates_by_id(database: InMemoryDatabase):
+    pending = TRANSACTIONS[1]._replace(id="txn_1")
+    database.add_transactions([pending])
+    # Plaid removes a pending transaction as it adds the posted one, which
+    # can look just the same
+    posted = pending._replace(id="txn_2")
+    with database.session() as session:
+        session.add_transactions([posted])
+        session.remove_transactions(["txn_1"])
+    assert 1 == session.added_transactions
+    assert [posted] == database.get_transactions()
+
+    # A new id is added however much it looks like a stored transaction
+    with database.session() as session:
+        session.add_transactions([pending._replace(id="txn_3"), posted])
+    assert (1, 1) == (session.added_transactions, session.skipped_transactions)
+    assert ["txn_2", "txn_3"] == sorted(t.id for t in database.get_transactions())
@@ -0,0 +1,164 @@
+import pytest
+import threading
+from datetime import datetime
+from unittest.mock import Mock, patch
+from onm import main, secret
+from onm.common import AccountType, Amount, SourceType
+from onm.config import Config
+from onm.connection import connection
+from onm.connection.connection import AccountBalance, Transaction
+from onm.connection.plaid_connection import PlaidConnection
+from onm.secret import clear_secret_cache
+from onm.source.csv_source import AppleCsvSource
+from onm.source.plaid_source import PlaidSource
+from onm.source.source import SyncTransactionsResponse
+from onm.sync import PlaidSyncCursor
+
+pytestmark = pytest.mark.unit
+
+BANKS = ["bank_a", "bank_b", "bank_c"]
+
+
+@pytest.fixture(params=["plain_text", "sqlite"])
+def config(tmp_path, request) -> Config:
+    return _config(tmp_path, request.param)
+
+
+def _config(tmp_path, database_type: str, token_prefix: str = "") -> Config:
+    config_path = tmp_path / "config.toml"
+    config_path.write_text(
+        f'[onm]\ndatabase_type = "{database_type}"\n\n'
+        f'[database]\ndatabase_path = "{tmp_path / "database"}"\n'
+    )
+    config = Config(str(config_path))
+    database = main._create_database(config)
+    for bank in BANKS:
+        account_map = {
+            f"{bank}_id": {
+                "name": f"{bank}_checking",
+                "account_type": AccountType.ASSET,
+            }
+        }
+        access_token = f"{token_prefix}token_{bank}"
+        database.add_source(PlaidSource(bank, access_token, account_map))
+    database.add_source(AppleCsvSource("apple", AccountType.LIABILITY))
+    return config
+
+
+@pytest.fixture
+def plaid_connection_mock():
+    plaid_connection = Mock(PlaidConnection)
+
+    def get_account_balances(access_token):
+        bank = access_token[len("token_") :]
+        if bank == "bank_b":
+            raise ConnectionError("ITEM_LOGIN_REQUIRED")
+        return [
+            AccountBalance(
+                account_name=f"{bank} checking",
+                account_id=f"{bank}_id",
+                balance=Amount(1000),
+                type=connection.AccountType.ASSET,
+            )
+        ]
+
+    def iter_sync_transactions(sync_cursor=None, access_token=None):
+        bank = access_token[len("token_") :]
+        yield SyncTransactionsResponse(
+            transactions=[_transaction(bank, "PURCHASE")],
+            sync_cursor=PlaidSyncCursor(f"cursor_{bank}"),
+        )
+
+    plaid_connection.get_account_balances.side_effect = get_account_balances
+    plaid_connection.iter_sync_transactions.side_effect = iter_sync_transactions
+    return plaid_connection
+
+
+def test_sync_all(config: Config, plaid_connection_mock):
+    with patch.object(
+        main.ConnectionFactory, "create_connection", return_value=plaid_connection_mock
+    ) as create_connection:
+        summary = main.sync_all(config, max_workers=2)
+    create_connection.assert_called_once_with(SourceType.PLAID, config)
+    # One failed source does not stop the others
+    assert ["bank_a", "bank_c"] == sorted(summary.synced_sources)
+    assert ["bank_b"] == list(summary.failed_sources)
+    assert isinstance(summary.failed_sources["bank_b"], ConnectionError)
+    assert 2 == summary.added_transactions
+
+    database = main._create_database(config)
+    assert ["bank_a_checking", "bank_c_checking"] == sorted(
+        a.name for a in database.get_accounts()
+    )
+    assert "cursor_bank_a" == database.get_sync_cursor(PlaidSource("bank_a")).cursor
+    assert database.get_sync_cursor(PlaidSource("bank_b")) is None
+
+    # Synced again, bank_a and bank_c continue from their cursors
+    with patch.object(
+        main.ConnectionFactory, "create_connection", return_value=plaid_connection_mock
+    ):
+        summary = main.sync_all(config)
+    assert 0 == summary.added_transactions
+    assert 2 == summary.skipped_transactions
+    cursors = [
+        c.kwargs["sync_cursor"]
+        for c in plaid_connection_mock.iter_sync_transactions.call_args_list[-2:]
+    ]
+    assert {"cursor_bank_a", "cursor_bank_c"} == {c.cursor for c in cursors}
+
+
+def test_sync_all_resolves_secrets_concurrently(tmp_path, plaid_connection_mock):
+    config = _config(tmp_path, "plain_text", token_prefix="$ echo ")
+    clear_secret_cache()
+    # Each command waits for the others, so they only all finish if every
+    # source's secrets are resolved at once
+    barrier = threading.Barrier(len(BANKS), timeout=5)
+    commands = []
+
+    def run_secret_command(value):
+        commands.append(value)
+        barrier.wait()
+        return value[len("$ echo ") :]
+
+    with patch.object(
+        main.ConnectionFactory, "create_connection", return_value=plaid_connection_mock
+    ), patch.object(secret, "_run_secret_command", side_effect=run_secret_command):
+        summary = main.sync_all(config, max_workers=len(BANKS))
+    assert sorted(f"$ echo token_{bank}" for bank in BANKS) == sorted(commands)
+    assert ["bank_a", "bank_c"] == sorted(summary.synced_sources)
+    assert ["bank_b"] == list(summary.failed_sources)
+
+
+def test_sync_source_checkpoints_pages(config: Config, plaid_connection_mock):
+    def iter_sync_transactions(sync_cursor=None, access_token=None):
+        for page in range(3):
+            if page == 2:
+                raise ConnectionError("INTERNAL_SERVER_ERROR")
+            yield SyncTransactionsResponse(
+                transactions=[_transaction("bank_a", f"PAGE {page}")],
+                sync_cursor=PlaidSyncCursor(f"cursor_{page}"),
+            )
+
+    plaid_connection_mock.iter_sync_transactions.side_effect = iter_sync_transactions
+    with patch.object(
+        main.ConnectionFactory, "create_connection", return_value=plaid_connection_mock
+    ), pytest.raises(ConnectionError):
+        main.sync_source("bank_a", config)
+
+    # The pages before the failure are kept, with the cursor to resume from
+    database = main._create_database(config)
+    descriptions = sorted(t.description for t in database.get_transactions())
+    assert ["PAGE 0", "PAGE 1"] == descriptions
+    assert "cursor_1" == database.get_sync_cursor(PlaidSource("bank_a")).cursor
+
+
+def _transaction(bank: str, description: str) -> Transaction:
+    return Transaction(
+        date=datetime(2024, 1, 13).date(),
+        description=description,
+        amount=Amount(893),
+        primary_category="ENTERTAINMENT",
+        detailed_category="ENTERTAINMENT_MUSIC_AND_AUDIO",
+        account_id=f"{bank}_id",
+        type=connection.TransactionType.DEBIT,
+    )
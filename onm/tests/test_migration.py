@@ -0,0 +1,94 @@
+import os
+import shutil
+import pytest
+from datetime import date, timedelta
+from onm.common import Amount, Transaction, TransactionType
+from onm.database.in_memory_database import InMemoryDatabase
+from onm.database.migration import migrate, transactions_checksum
+from onm.database.plain_text_database import PlainTextDatabase
+from onm.database.sqlite_database import SqliteDatabase
+from onm.source.plaid_source import PlaidSource
+from onm.sync import PlaidSyncCursor
+
+pytestmark = pytest.mark.unit
+
+DATABASE = os.path.join(os.path.dirname(__file__), "resources", "plain_text_database")
+
+SECRET_TOKEN = "$ pass show plaid/access_token"
+
+TRANSACTIONS = [
+    Transaction(
+        date=date(2024, 1, 1) + timedelta(days=i // 3),
+        description=f"PURCHASE {i}",
+        amount=Amount(100 + i),
+        category="SHOPPING" if i % 2 else "FOOD",
+        account_name="onm_bank_checking",
+        type=TransactionType.DEBIT,
+    )
+    for i in range(50)
+]
+
+
+@pytest.fixture
+def database(tmp_path) -> PlainTextDatabase:
+    database_path = str(tmp_path / "plain_text")
+    shutil.copytree(DATABASE, database_path)
+    database = PlainTextDatabase(database_path)
+    database.add_transactions(TRANSACTIONS)
+    source = PlaidSource("secret_bank", access_token=SECRET_TOKEN, account_map={})
+    database.add_source(source)
+    database.set_sync_cursor(source, PlaidSyncCursor("a0b1c2"))
+    return database
+
+
+@pytest.mark.parametrize("partition", [None, "month"])
+def test_migrate(database: PlainTextDatabase, tmp_path, partition):
+    sqlite_database = SqliteDatabase(str(tmp_path / "sqlite"))
+    summary = migrate(database, sqlite_database, batch_size=7)
+    assert 2 == summary.sources
+    assert 1 == summary.sync_cursors
+    assert 51 == summary.transactions
+    assert transactions_checksum(database.iter_transactions()) == (
+        summary.transactions,
+        summary.checksum,
+    )
+    # Secrets are not resolved
+    source = sqlite_database.get_source("secret_bank", resolve=False)
+    assert SECRET_TOKEN == source.access_token
+
+    # And back, appending to the sorted ledgers batch by batch
+    plain_text_database = PlainTextDatabase(
+        str(tmp_path / "plain_text_copy"), partition=partition
+    )
+    assert summary == migrate(sqlite_database, plain_text_database, batch_size=7)
+    assert sorted(database.get_transactions()) == sorted(
+        plain_text_database.get_transactions()
+    )
+    dates = [t.date for t in plain_text_database.iter_transactions()]
+    assert sorted(dates, reverse=True) == dates
+    assert "a0b1c2" == plain_text_database.get_sync_cursor(source).cursor
+
+    with pytest.raises(ValueError):
+        migrate(database, plain_text_database)
+
+
+def test_migrate_to_in_memory(database: PlainTextDatabase, tmp_path):
+    database_path = str(tmp_path / "in_memory")
+    summary = migrate(database, InMemoryDatabase(database_path))
+    # Written through to the plain text database behind it
+    plain_text_database = PlainTextDatabase(database_path)
+    assert transactions_checksum(plain_text_database.iter_transactions()) == (
+        summary.transactions,
+        summary.checksum,
+    )
+    assert sorted(database.get_accounts()) == sorted(plain_text_database.get_accounts())
+    assert sorted(database.get_source_names()) == sorted(
+        plain_text_database.get_source_names()
+    )
+
+
+def test_transactions_checksum():
+    count, checksum = transactions_checksum(TRANSACTIONS)
+    assert (count, checksum) == transactions_checksum(reversed(TRANSACTIONS))
+    changed = TRANSACTIONS[:-1] + [TRANSACTIONS[-1]._replace(category="FOOD")]
+    assert (count, checksum) != transactions_checksum(changed)
@@ -1,13 +1,15 @@
+import json
 import pytest
 from mock import patch
 from unittest.mock import Mock
 from datetime import datetime
-from plaid import Environment
+from plaid import ApiException, Environment
 from plaid.api.plaid_api import PlaidApi
 from plaid.model import account_type
 from plaid.model.account_base import AccountBase
 from plaid.model.account_balance import AccountBalance
 from plaid.model.transaction import Transaction
+from plaid.model.removed_transaction import RemovedTransaction
 from plaid.model.personal_finance_category import PersonalFinanceCategory
 from plaid.model.link_token_create_response import LinkTokenCreateResponse
 from plaid.model.transactions_sync_response import TransactionsSyncResponse
@@ -15,14 +17,17 @@ from plaid.model.item_public_token_exchange_response import (
     ItemPublicTokenExchangeResponse,
 )
 from plaid.model.accounts_get_response import AccountsGetResponse
+from plaid.model.accounts_balance_get_request import AccountsBalanceGetRequest
 from onm.link.plaid_link import PlaidLink
 from onm.connection.plaid_connection import (
     AccountType,
     TransactionType,
     PlaidConnection,
     PlaidConfiguration,
+    close_plaid_apis,
     get_plaid_api,
 )
+from onm.common import Amount
 from onm.sync import PlaidSyncCursor
 
 pytestmark = pytest.mark.unit
@@ -34,6 +39,7 @@ TEST_ENVIRONMENT = "sandbox"
 LINK_TOKEN = "link-sandbox-cd3f30bf-cd14-43f8-9355-a5a48f3ed700"
 PUBLIC_TOKEN = "public-sandbox-a05be323-564f-48c7-bbcb-57dd426efe3c"
 ACCESS_TOKEN = "access-sandbox-a4a6c36b-0276-431d-a843-65c30b506e77"
+TRANSACTION_ID = "lPNjeW1nR6CDn5okmGQ6hEpMo4lLNoSrzqDje"
 
 
 @pytest.fixture
@@ -52,6 +58,28 @@ def test_get_plaid_api(plaid_configuration):
     assert TEST_SECRET == config.api_key["secret"]
 
 
+def test_get_plaid_api_shared(plaid_configuration):
+    close_plaid_apis()
+    plaid_api = get_plaid_api(plaid_configuration)
+    assert plaid_api is get_plaid_api(plaid_configuration._replace())
+    pooled_configuration = plaid_configuration._replace(
+        pool_size=3, connect_timeout=2.0, read_timeout=30.0
+    )
+    pooled_plaid_api = get_plaid_api(pooled_configuration)
+    assert plaid_api is not pooled_plaid_api
+    assert 3 == pooled_plaid_api.api_client.configuration.connection_pool_maxsize
+
+    # Calls get the configured timeouts unless they set their own
+    with patch("plaid.ApiClient.call_api") as call_api:
+        req = AccountsBalanceGetRequest(access_token=ACCESS_TOKEN)
+        pooled_plaid_api.accounts_balance_get(req)
+        assert (2.0, 30.0) == call_api.call_args.kwargs["_request_timeout"]
+        pooled_plaid_api.accounts_balance_get(req, _request_timeout=5)
+        assert 5 == call_api.call_args.kwargs["_request_timeout"]
+    close_plaid_apis()
+    assert pooled_plaid_api is not get_plaid_api(pooled_configuration)
+
+
 @patch("onm.webserver.serve")
 def test_plaid_link_get_access_token(webserver_serve_mock):
     plaid_api = Mock(PlaidApi)
@@ -153,12 +181,13 @@ def plaid_api_mock():
         amount=-78.9,
         personal_finance_category=personal_finance_category,
         account_id="bc3eb2e652219571d5897b8422869388",
+        transaction_id=TRANSACTION_ID,
     )
 
     transactions = [transaction]
     transactions_sync_res = Mock(TransactionsSyncResponse)
     transactions_sync_res.configure_mock(
-        has_more=False, next_cursor="", added=transactions
+        has_more=False, next_cursor="", added=transactions, modified=[], removed=[]
     )
 
     def transactions_sync_side_effect(*args):
@@ -179,7 +208,7 @@ def test_plaid_connection_get_account_balances(plaid_api_mock):
     account = account_balances[0]
     assert "ONM Bank" == account.account_name
     assert "bc3eb2e652219571d5897b8422869388" == account.account_id
-    assert 131.17 == account.balance
+    assert Amount.parse("131.17") == account.balance
     assert AccountType.ASSET == account.type
 
 
@@ -194,8 +223,94 @@ def test_plaid_connection_get_new_transactions(plaid_api_mock):
     transaction = transactions[0]
     assert datetime(2024, 1, 13).date() == transaction.date
     assert "TOMI JAZZ" == transaction.description
-    assert 78.9 == transaction.amount
+    assert Amount.parse("78.9") == transaction.amount
     assert TransactionType.DEBIT == transaction.type
     assert "ENTERTAINMENT" == transaction.primary_category
     assert "ENTERTAINMENT_MUSIC_AND_AUDIO" == transaction.detailed_category
     assert "bc3eb2e652219571d5897b8422869388" == transaction.account_id
+    assert TRANSACTION_ID == transaction.transaction_id
+
+
+def test_plaid_connection_iter_sync_transactions(plaid_api_mock):
+    req = Mock(access_token=ACCESS_TOKEN)
+    transactions = plaid_api_mock.transactions_sync(req).added
+    plaid_api_mock.transactions_sync.reset_mock()
+    first_page = Mock(TransactionsSyncResponse)
+    first_page.configure_mock(
+        has_more=True, next_cursor="8a1d3c", added=transactions, modified=[], removed=[]
+    )
+    removed = Mock(RemovedTransaction)
+    removed.configure_mock(transaction_id="7BMQ1a3ZxLhxr9eMLXaJhZq4PWBPxKfDEy6ne")
+    last_page = Mock(TransactionsSyncResponse)
+    last_page.configure_mock(
+        has_more=False,
+        next_cursor="f27e90",
+        added=[],
+        modified=transactions,
+        removed=[removed],
+    )
+    plaid_api_mock.transactions_sync.side_effect = [first_page, last_page]
+
+    plaid_connection = PlaidConnection(plaid_api_mock)
+    pages = plaid_connection.iter_sync_transactions(access_token=ACCESS_TOKEN)
+    page = next(pages)
+    # The next page is only requested once this one has been consumed
+    assert 1 == plaid_api_mock.transactions_sync.call_count
+    assert 1 == len(page.transactions)
+    assert "8a1d3c" == page.sync_cursor.cursor
+    page = next(pages)
+    assert [] == page.transactions
+    assert [TRANSACTION_ID] == [t.transaction_id for t in page.modified]
+    assert ["7BMQ1a3ZxLhxr9eMLXaJhZq4PWBPxKfDEy6ne"] == page.removed
+    assert "f27e90" == page.sync_cursor.cursor
+    req = plaid_api_mock.transactions_sync.call_args.args[0]
+    assert "8a1d3c" == req.cursor
+    assert next(pages, None) is None
+
+
+def test_plaid_connection_restarts_pagination(plaid_api_mock):
+    req = Mock(access_token=ACCESS_TOKEN)
+    transactions = plaid_api_mock.transactions_sync(req).added
+    plaid_api_mock.transactions_sync.reset_mock()
+
+    def page(has_more, next_cursor):
+        res = Mock(TransactionsSyncResponse)
+        res.configure_mock(
+            has_more=has_more,
+            next_cursor=next_cursor,
+            added=transactions,
+            modified=[],
+            removed=[],
+        )
+        return res
+
+    mutated = ApiException(status=400)
+    mutated.body = json.dumps(
+        {
+            "error_type": "TRANSACTIONS_ERROR",
+            "error_code": "TRANSACTIONS_SYNC_MUTATION_DURING_PAGINATION",
+        }
+    )
+    plaid_api_mock.transactions_sync.side_effect = [
+        mutated,
+        page(True, "8a1d3c"),
+        page(False, "f27e90"),
+    ]
+
+    # Resumed from a page stored part way through an earlier sync
+    plaid_connection = PlaidConnection(plaid_api_mock)
+    sync_cursor = PlaidSyncCursor("5b2e77", start_cursor="c44983")
+    pages = list(plaid_connection.iter_sync_transactions(sync_cursor, ACCESS_TOKEN))
+    assert ["5b2e77", "c44983", "8a1d3c"] == [
+        c.args[0].cursor for c in plaid_api_mock.transactions_sync.call_args_list
+    ]
+    assert [("8a1d3c", "c44983"), ("f27e90", None)] == [
+        (p.sync_cursor.cursor, p.sync_cursor.start_cursor) for p in pages
+    ]
+    assert {"cursor": "8a1d3c", "start_cursor": "c44983"} == (
+        pages[0].sync_cursor.as_dict()
+    )
+
+    plaid_api_mock.transactions_sync.side_effect = [mutated] * 4
+    with pytest.raises(ApiException):
+        list(plaid_connection.iter_sync_transactions(sync_cursor, ACCESS_TOKEN))
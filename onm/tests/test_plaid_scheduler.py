@@ -0,0 +1,216 @@
+import json
+import threading
+import time
+import pytest
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import Mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from plaid import ApiClient, ApiException, Configuration
+from plaid.api.plaid_api import PlaidApi
+from urllib3.exceptions import ReadTimeoutError
+from onm.connection.plaid_connection import PlaidConnection
+from onm.connection.plaid_scheduler import (
+    PlaidScheduler,
+    RateLimit,
+    RetryPolicy,
+    TokenBucket,
+)
+
+pytestmark = pytest.mark.unit
+
+SYNC_RESPONSE = {
+    "added": [],
+    "modified": [],
+    "removed": [],
+    "next_cursor": "cursor",
+    "has_more": False,
+    "request_id": "request",
+}
+
+FAST_RETRIES = RetryPolicy(max_attempts=4, base_delay=0.01, max_delay=0.05)
+
+
+class StubPlaid:
+    """A local stand in for Plaid's /transactions/sync.
+
+    Scripted errors are returned first, then successes. Requests beyond the
+    server's own token bucket are refused as Plaid would.
+    """
+
+    def __init__(self, rate_limit: RateLimit = None, latency: float = 0.0):
+        self.errors = []
+        self.requests = 0
+        self.rate_limited = 0
+        self.max_in_flight = defaultdict(int)
+        self._in_flight = defaultdict(int)
+        self._bucket = rate_limit and TokenBucket(rate_limit)
+        self._latency = latency
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                status, response = stub.handle(body["access_token"])
+                data = json.dumps(response).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, kwargs={"poll_interval": 0.01}
+        )
+
+    @property
+    def host(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def handle(self, access_token: str):
+        with self._lock:
+            self.requests += 1
+            if self.errors:
+                return self.errors.pop(0)
+            if self._bucket is not None and not self._bucket.try_acquire():
+                self.rate_limited += 1
+                return _error(429, "RATE_LIMIT_EXCEEDED", "TRANSACTIONS_SYNC_LIMIT")
+            self._in_flight[access_token] += 1
+            self.max_in_flight[access_token] = max(
+                self.max_in_flight[access_token], self._in_flight[access_token]
+            )
+        time.sleep(self._latency)
+        with self._lock:
+            self._in_flight[access_token] -= 1
+        return 200, SYNC_RESPONSE
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def _error(status: int, error_type: str, error_code: str):
+    return status, {
+        "error_type": error_type,
+        "error_code": error_code,
+        "error_message": error_code,
+        "display_message": None,
+        "request_id": "request",
+    }
+
+
+def _plaid_connection(host: str, scheduler: PlaidScheduler) -> PlaidConnection:
+    config = Configuration(host=host, api_key={"clientId": "id", "secret": "secret"})
+    return PlaidConnection(PlaidApi(ApiClient(config)), scheduler)
+
+
+def test_token_bucket():
+    now = [0.0]
+
+    def sleep(seconds):
+        now[0] += seconds
+
+    bucket = TokenBucket(
+        RateLimit(rate=2.0, burst=3), clock=lambda: now[0], sleep=sleep
+    )
+    for _ in range(3):
+        bucket.acquire()
+    assert 0.0 == now[0]
+    # Past the burst, tokens arrive at the rate
+    bucket.acquire()
+    bucket.acquire()
+    assert 1.0 == pytest.approx(now[0])
+    bucket.drain()
+    bucket.acquire()
+    assert 1.5 == pytest.approx(now[0])
+
+
+def test_retries_transient_errors():
+    with StubPlaid() as stub:
+        stub.errors = [
+            _error(429, "RATE_LIMIT_EXCEEDED", "TRANSACTIONS_SYNC_LIMIT"),
+            _error(500, "API_ERROR", "INTERNAL_SERVER_ERROR"),
+            _error(400, "INSTITUTION_ERROR", "INSTITUTION_NOT_RESPONDING"),
+        ]
+        connection = _plaid_connection(
+            stub.host, PlaidScheduler(retry_policy=FAST_RETRIES)
+        )
+        res = connection.sync_transactions(access_token="token")
+    assert "cursor" == res.sync_cursor.cursor
+    assert 4 == stub.requests
+
+
+def test_does_not_retry_item_errors():
+    with StubPlaid() as stub:
+        stub.errors = [_error(400, "ITEM_ERROR", "ITEM_LOGIN_REQUIRED")]
+        connection = _plaid_connection(
+            stub.host, PlaidScheduler(retry_policy=FAST_RETRIES)
+        )
+        with pytest.raises(ApiException):
+            connection.sync_transactions(access_token="token")
+    assert 1 == stub.requests
+
+
+def test_gives_up_after_max_attempts():
+    with StubPlaid() as stub:
+        stub.errors = [_error(503, "API_ERROR", "PLANNED_MAINTENANCE")] * 5
+        connection = _plaid_connection(
+            stub.host, PlaidScheduler(retry_policy=FAST_RETRIES)
+        )
+        with pytest.raises(ApiException) as e:
+            connection.sync_transactions(access_token="token")
+    assert 503 == e.value.status
+    assert FAST_RETRIES.max_attempts == stub.requests
+
+
+def test_does_not_retry_non_idempotent_after_timeouts():
+    scheduler = PlaidScheduler(retry_policy=FAST_RETRIES, sleep=lambda _: None)
+    timeout = ReadTimeoutError(None, "/item/public_token/exchange", "timed out")
+    rate_limited = ApiException(status=429)
+    request = Mock(side_effect=[timeout, "access_token"])
+    assert "access_token" == scheduler.call("transactions_sync", "token", request)
+
+    # The request may have been carried out before timing out
+    request = Mock(side_effect=[timeout, "access_token"])
+    with pytest.raises(ReadTimeoutError):
+        scheduler.call("item_public_token_exchange", None, request, idempotent=False)
+    assert 1 == request.call_count
+    # But a rate limited one was refused
+    request = Mock(side_effect=[rate_limited, "access_token"])
+    assert "access_token" == scheduler.call(
+        "item_public_token_exchange", None, request, idempotent=False
+    )
+
+
+def test_parallel_items_stay_within_quota():
+    # The stub allows a little more than the scheduler sends, so that many
+    # items synced at once use the quota without being refused
+    stub_limit = RateLimit(rate=50.0, burst=10)
+    scheduler = PlaidScheduler(
+        rate_limits={"transactions_sync": RateLimit(rate=40.0, burst=5)},
+        max_concurrent_per_item=2,
+        retry_policy=FAST_RETRIES,
+    )
+    tokens = [f"token_{i % 3}" for i in range(40)]
+    with StubPlaid(rate_limit=stub_limit, latency=0.02) as stub:
+        connection = _plaid_connection(stub.host, scheduler)
+        with ThreadPoolExecutor(max_workers=12) as pool:
+            list(
+                pool.map(
+                    lambda token: connection.sync_transactions(access_token=token),
+                    tokens,
+                )
+            )
+    assert 0 == stub.rate_limited
+    assert len(tokens) == stub.requests
+    assert {"token_0", "token_1", "token_2"} == set(stub.max_in_flight)
+    assert all(n <= 2 for n in stub.max_in_flight.values())
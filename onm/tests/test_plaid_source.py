@@ -4,7 +4,7 @@ from datetime import datetime
 from onm.connection.plaid_connection import PlaidConnection
 from onm.connection import connection
 from onm.connection.connection import AccountBalance, Transaction
-from onm.common import AccountType, TransactionType
+from onm.common import AccountType, Amount, TransactionType
 from onm.source.plaid_source import PlaidSourceBuilder
 from onm.source.source import SyncTransactionsResponse
 from onm.sync import PlaidSyncCursor
@@ -21,7 +21,7 @@ def plaid_connection_mock():
     account = AccountBalance(
         account_name="ONM CHECKING",
         account_id="e02fc823810d73a9127d00948ab000d4",
-        balance=0.0,
+        balance=Amount(0),
         type=connection.AccountType.ASSET,
     )
 
@@ -35,7 +35,7 @@ def plaid_connection_mock():
     transaction = Transaction(
         date=datetime(2024, 1, 13).date(),
         description="TOMI JAZZ",
-        amount=89.3,
+        amount=Amount.parse("89.3"),
         primary_category="ENTERTAINMENT",
         detailed_category="ENTERTAINMENT_MUSIC_AND_AUDIO",
         account_id="e02fc823810d73a9127d00948ab000d4",
@@ -63,7 +63,7 @@ def test_plaid_source(plaid_connection_mock):
     account_balances = plaid_source.get_account_balances(plaid_connection_mock)
     assert 1 == len(account_balances)
     account = account_balances[0]
-    assert 0.0 == account.balance
+    assert Amount.parse("0.0") == account.balance
     assert AccountType.ASSET == account.type
 
     sync_cursor = PlaidSyncCursor(cursor="c4498331dfe9edf14bf28e5ab6f51e58")
@@ -75,7 +75,7 @@ def test_plaid_source(plaid_connection_mock):
     transaction = res.transactions[0]
     assert datetime(2024, 1, 13).date() == transaction.date
     assert "TOMI JAZZ" == transaction.description
-    assert 89.3 == transaction.amount
+    assert Amount.parse("89.3") == transaction.amount
     assert "ENTERTAINMENT:MUSIC_AND_AUDIO" == transaction.category
     assert "ONM CHECKING" == transaction.account_name
     assert TransactionType.DEBIT == transaction.type
@@ -1,9 +1,18 @@
 import os
 import shutil
+import threading
+import multiprocessing
+from mock import patch
 import pytest
-from datetime import datetime
-from onm.common import Account, AccountType, Transaction, TransactionType
+from datetime import datetime, timezone
+from onm.common import Account, AccountType, Amount, Transaction, TransactionType
+from onm.database.database import TransactionQuery
+from onm.database.file_lock import sync_lock
 from onm.database.plain_text_database import PlainTextDatabase
+from onm.database.plain_text_index import LedgerIndex
+from onm.database.plain_text_snapshot import LedgerSnapshot
+from onm.database.plain_text_rollup import LedgerRollup
+from onm.database.rollup import Rollups
 from onm.sync import PlaidSyncCursor
 from onm.source.plaid_source import PlaidSource
 
@@ -34,22 +43,32 @@ def new_database() -> PlainTextDatabase:
         shutil.rmtree(NEW_DATABASE, ignore_errors=True)
 
 
+@pytest.fixture
+def append_only_database() -> PlainTextDatabase:
+    shutil.copytree(DATABASE, TEST_DATABASE)
+    yield PlainTextDatabase(TEST_DATABASE, append_only=True)
+    if os.path.exists(TEST_DATABASE):
+        shutil.rmtree(TEST_DATABASE, ignore_errors=True)
+
+
 def test_add_account(new_database: PlainTextDatabase):
-    new_database.add_account(Account("roth_ira", 100.95, AccountType.ASSET))
+    new_database.add_account(
+        Account("roth_ira", Amount.parse("100.95"), AccountType.ASSET)
+    )
     account = new_database.get_account("roth_ira")
     assert "roth_ira" == account.name
-    assert 100.95 == account.balance
+    assert Amount.parse("100.95") == account.balance
     assert AccountType.ASSET == account.type
 
 
 def test_get_account(existing_database: PlainTextDatabase):
     checking = existing_database.get_account(ONM_CHECKING)
     assert ONM_CHECKING == checking.name
-    assert 23.9 == checking.balance
+    assert Amount.parse("23.9") == checking.balance
     assert AccountType.ASSET == checking.type
     savings = existing_database.get_account(ONM_SAVINGS)
     assert ONM_SAVINGS == savings.name
-    assert 45.6 == savings.balance
+    assert Amount.parse("45.6") == savings.balance
     assert AccountType.ASSET == savings.type
 
 
@@ -60,17 +79,17 @@ def test_get_accounts(existing_database: PlainTextDatabase):
 
 def test_update_account(existing_database: PlainTextDatabase):
     existing_database.update_account(
-        Account(ONM_CHECKING, 93.2, type=AccountType.ASSET)
+        Account(ONM_CHECKING, Amount.parse("93.2"), type=AccountType.ASSET)
     )
     account = existing_database.get_account(ONM_CHECKING)
-    assert 93.2 == account.balance
+    assert Amount.parse("93.2") == account.balance
 
 
 def test_add_transactions(new_database: PlainTextDatabase):
     transaction = Transaction(
         date=datetime(2024, 3, 12).date(),
         description="TOMI JAZZ",
-        amount=35.8,
+        amount=Amount.parse("35.8"),
         category="MUSIC",
         account_name="onm_bank",
         type=TransactionType.DEBIT,
@@ -81,7 +100,7 @@ def test_add_transactions(new_database: PlainTextDatabase):
     transaction = transactions[0]
     assert datetime(2024, 3, 12).date() == transaction.date
     assert "TOMI JAZZ" == transaction.description
-    assert 35.8 == transaction.amount
+    assert Amount.parse("35.8") == transaction.amount
     assert "MUSIC" == transaction.category
     assert "onm_bank" == transaction.account_name
     assert TransactionType.DEBIT == transaction.type
@@ -93,7 +112,7 @@ def test_get_transactions(existing_database: PlainTextDatabase):
     transaction = transactions[0]
     assert datetime(2024, 12, 3).date() == transaction.date
     assert "UMPHREYS" == transaction.description
-    assert 102.8 == transaction.amount
+    assert Amount.parse("102.8") == transaction.amount
     assert "MUSIC" == transaction.category
     assert "onm_savings" == transaction.account_name
     assert TransactionType.DEBIT == transaction.type
@@ -149,3 +168,728 @@ def test_sources_add_plaid_source(new_database: PlainTextDatabase):
     account_map = source.account_map
     assert "checking" == account_map["a927faed81ca48916e56e6ccda63fe09"]["name"]
     assert "savings" == account_map["76b069b74b582f62f4890a88b14402a6"]["name"]
+
+
+def test_append_only_add_transactions(append_only_database: PlainTextDatabase):
+    transactions_path = os.path.join(TEST_DATABASE, "transactions")
+    with open(transactions_path) as f:
+        ledger = f.read()
+
+    append_only_database.add_transactions(
+        [
+            Transaction(
+                date=datetime(2024, 3, 12).date(),
+                description="TOMI JAZZ",
+                amount=Amount.parse("35.8"),
+                category="MUSIC",
+                account_name="onm_bank",
+                type=TransactionType.DEBIT,
+            ),
+            Transaction(
+                date=datetime(2025, 1, 2).date(),
+                description="PAYCHECK",
+                amount=Amount.parse("1200.0"),
+                category="INCOME",
+                account_name="onm_bank",
+                type=TransactionType.CREDIT,
+            ),
+        ]
+    )
+    with open(transactions_path) as f:
+        assert ledger == f.read()
+
+    transactions = append_only_database.get_transactions()
+    assert 3 == len(transactions)
+    assert ["PAYCHECK", "UMPHREYS", "TOMI JAZZ"] == [
+        t.description for t in transactions
+    ]
+
+
+def test_compact(append_only_database: PlainTextDatabase):
+    append_only_database.add_transactions(
+        [
+            Transaction(
+                date=datetime(2025, 1, 2).date(),
+                description="PAYCHECK",
+                amount=Amount.parse("1200.0"),
+                category="INCOME",
+                account_name="onm_bank",
+                type=TransactionType.CREDIT,
+            ),
+        ]
+    )
+    append_only_database.compact()
+    assert not os.path.exists(os.path.join(TEST_DATABASE, "transactions.log"))
+    transactions = append_only_database.get_transactions()
+    assert ["PAYCHECK", "UMPHREYS"] == [t.description for t in transactions]
+
+
+def test_iter_transactions(append_only_database: PlainTextDatabase):
+    append_only_database.add_transactions(
+        [
+            Transaction(
+                date=datetime(2025, 1, 2).date(),
+                description="PAYCHECK",
+                amount=Amount.parse("1200.0"),
+                category="INCOME",
+                account_name="onm_bank",
+                type=TransactionType.CREDIT,
+            ),
+        ]
+    )
+    transactions = append_only_database.iter_transactions()
+    assert "PAYCHECK" == next(transactions).description
+    assert "UMPHREYS" == next(transactions).description
+    with pytest.raises(StopIteration):
+        next(transactions)
+
+
+def test_iter_transactions_limit(existing_database: PlainTextDatabase):
+    # Reading the most recent records must not parse the rest of the ledger
+    with open(os.path.join(TEST_DATABASE, "transactions"), "a") as f:
+        f.write("not a transaction\n")
+    transactions = list(existing_database.iter_transactions(limit=1))
+    assert 1 == len(transactions)
+    assert "UMPHREYS" == transactions[0].description
+
+
+def test_get_transactions_between(append_only_database: PlainTextDatabase):
+    append_only_database.add_transactions(
+        [
+            Transaction(
+                date=datetime(2024, 12, 20).date(),
+                description="PAYCHECK",
+                amount=Amount.parse("1200.0"),
+                category="INCOME",
+                account_name="onm_checking",
+                type=TransactionType.CREDIT,
+            ),
+            Transaction(
+                date=datetime(2025, 1, 2).date(),
+                description="TOMI JAZZ",
+                amount=Amount.parse("35.8"),
+                category="MUSIC",
+                account_name="onm_savings",
+                type=TransactionType.DEBIT,
+            ),
+        ]
+    )
+    index = LedgerIndex(os.path.join(TEST_DATABASE, "transactions.log"))
+    assert index.is_valid()
+    assert 2 == len(index.records())
+
+    transactions = append_only_database.get_transactions_between(
+        start_date=datetime(2024, 12, 1).date(), end_date=datetime(2024, 12, 31).date()
+    )
+    assert ["PAYCHECK", "UMPHREYS"] == [t.description for t in transactions]
+
+    transactions = append_only_database.get_transactions_between(
+        account_name="onm_savings"
+    )
+    assert ["TOMI JAZZ", "UMPHREYS"] == [t.description for t in transactions]
+    ledger_index = LedgerIndex(os.path.join(TEST_DATABASE, "transactions"))
+    assert Amount.parse("-102.8") == ledger_index.records()["amount"][0]
+
+
+def test_get_transactions_between_after_edit(existing_database: PlainTextDatabase):
+    existing_database.get_transactions_between()
+    with open(os.path.join(TEST_DATABASE, "transactions"), "a") as f:
+        f.write("\n2023-04-01 onm_checking $-4.5\n    COFFEE\n    FOOD\n")
+    transactions = existing_database.get_transactions_between(
+        end_date=datetime(2024, 1, 1).date()
+    )
+    assert ["COFFEE"] == [t.description for t in transactions]
+
+
+def test_malformed_records_raise(existing_database: PlainTextDatabase):
+    transactions_path = os.path.join(TEST_DATABASE, "transactions")
+    with open(transactions_path, "a") as f:
+        f.write("\n2024-03-02 onm_checking 5.00\n    COFFEE\n    FOOD\n")
+    with open(transactions_path) as f:
+        ledger = f.read()
+    # Rather than being dropped when the ledger is next written
+    with pytest.raises(ValueError, match="transactions:"):
+        existing_database.add_transactions([PAYCHECK])
+    with open(transactions_path) as f:
+        assert ledger == f.read()
+
+    with open(os.path.join(TEST_DATABASE, "accounts"), "a") as f:
+        f.write("ASSET onm_brokerage 12.00\n")
+    with pytest.raises(ValueError, match="accounts:"):
+        existing_database.get_accounts()
+
+
+def test_hand_edited_amounts(existing_database: PlainTextDatabase):
+    with open(os.path.join(TEST_DATABASE, "transactions"), "a") as f:
+        f.write(
+            "2024-03-02 onm_checking $-1,200.50\n    RENT\n    HOUSING\n\n"
+            "2024-03-03 onm_checking $12,345,678.1\n    BONUS\n    INCOME\n\n"
+        )
+    amounts = {t.description: t for t in existing_database.get_transactions()}
+    assert Amount(120050) == amounts["RENT"].amount
+    assert TransactionType.DEBIT == amounts["RENT"].type
+    assert Amount(1234567810) == amounts["BONUS"].amount
+    # Written back without the separators
+    existing_database.add_transactions([PAYCHECK])
+    with open(os.path.join(TEST_DATABASE, "transactions")) as f:
+        assert "$-1200.50" in f.read()
+
+
+def test_partitioned_add_transactions(existing_database: PlainTextDatabase):
+    database = PlainTextDatabase(TEST_DATABASE, partition="month")
+    transactions_path = os.path.join(TEST_DATABASE, "transactions")
+    assert os.path.isfile(os.path.join(transactions_path, "2024-12"))
+    with open(os.path.join(transactions_path, "2024-12")) as f:
+        partition = f.read()
+
+    database.add_transactions(
+        [
+            Transaction(
+                date=datetime(2025, 1, 2).date(),
+                description="PAYCHECK",
+                amount=Amount.parse("1200.0"),
+                category="INCOME",
+                account_name="onm_checking",
+                type=TransactionType.CREDIT,
+            ),
+            Transaction(
+                date=datetime(2024, 3, 12).date(),
+                description="TOMI JAZZ",
+                amount=Amount.parse("35.8"),
+                category="MUSIC",
+                account_name="onm_savings",
+                type=TransactionType.DEBIT,
+            ),
+        ]
+    )
+    partitions = [p for p in os.listdir(transactions_path) if "." not in p]
+    assert ["2024-03", "2024-12", "2025-01"] == sorted(partitions)
+    with open(os.path.join(transactions_path, "2024-12")) as f:
+        assert partition == f.read()
+
+    transactions = database.get_transactions()
+    assert ["PAYCHECK", "UMPHREYS", "TOMI JAZZ"] == [
+        t.description for t in transactions
+    ]
+    transactions = database.get_transactions_between(
+        start_date=datetime(2024, 12, 1).date()
+    )
+    assert ["PAYCHECK", "UMPHREYS"] == [t.description for t in transactions]
+
+
+def test_partition_ledger_interrupted(existing_database: PlainTextDatabase):
+    expected = existing_database.get_transactions()
+    transactions_path = os.path.join(TEST_DATABASE, "transactions")
+    module = "onm.database.plain_text_database"
+    # While the partitions are written, the old ledger is left in place
+    with patch(f"{module}._write_ledger", side_effect=OSError):
+        with pytest.raises(OSError):
+            PlainTextDatabase(TEST_DATABASE, partition="month")
+    assert os.path.isfile(transactions_path)
+    assert expected == PlainTextDatabase(TEST_DATABASE).get_transactions()
+
+    # Once it is moved aside, the next open puts the partitions in place
+    with patch(f"{module}._remove_ledger", side_effect=OSError):
+        with pytest.raises(OSError):
+            PlainTextDatabase(TEST_DATABASE, partition="month")
+    assert not os.path.exists(transactions_path)
+    with pytest.raises(ValueError):
+        PlainTextDatabase(TEST_DATABASE)
+    database = PlainTextDatabase(TEST_DATABASE, partition="month")
+    assert expected == database.get_transactions()
+    assert ["2024-12"] == [p for p in os.listdir(transactions_path) if "." not in p]
+    assert not any("partitioned" in p for p in os.listdir(TEST_DATABASE))
+
+
+def test_partitioned_append_only_new_partition(existing_database: PlainTextDatabase):
+    database = PlainTextDatabase(TEST_DATABASE, append_only=True, partition="year")
+    database.add_transactions(
+        [
+            Transaction(
+                date=datetime(2025, 1, 2).date(),
+                description="PAYCHECK",
+                amount=Amount.parse("1200.0"),
+                category="INCOME",
+                account_name="onm_checking",
+                type=TransactionType.CREDIT,
+            )
+        ]
+    )
+    # The new partition only has a log segment, and is still read
+    transactions_path = os.path.join(TEST_DATABASE, "transactions")
+    assert not os.path.exists(os.path.join(transactions_path, "2025"))
+    assert ["PAYCHECK", "UMPHREYS"] == [
+        t.description for t in database.get_transactions()
+    ]
+
+
+@pytest.fixture(params=[None, "year"])
+def partitioned_database(request) -> PlainTextDatabase:
+    shutil.copytree(DATABASE, TEST_DATABASE)
+    yield PlainTextDatabase(TEST_DATABASE, append_only=True, partition=request.param)
+    if os.path.exists(TEST_DATABASE):
+        shutil.rmtree(TEST_DATABASE, ignore_errors=True)
+
+
+@pytest.fixture(
+    params=[(False, None), (False, "year"), (True, None), (True, "year")],
+    ids=["rewrite", "rewrite-year", "append", "append-year"],
+)
+def mode_database(request) -> PlainTextDatabase:
+    # Every combination of append-only and partitioned ledgers
+    append_only, partition = request.param
+    shutil.copytree(DATABASE, TEST_DATABASE)
+    yield PlainTextDatabase(TEST_DATABASE, append_only=append_only, partition=partition)
+    if os.path.exists(TEST_DATABASE):
+        shutil.rmtree(TEST_DATABASE, ignore_errors=True)
+
+
+def test_query_transactions(partitioned_database: PlainTextDatabase):
+    database = partitioned_database
+    database.add_transactions(
+        [
+            Transaction(
+                date=datetime(2025, 1, 2).date(),
+                description="Paycheck ACME",
+                amount=Amount.parse("1200.0"),
+                category="INCOME",
+                account_name="onm_savings",
+                type=TransactionType.CREDIT,
+            ),
+            Transaction(
+                date=datetime(2024, 3, 12).date(),
+                description="TOMI JAZZ",
+                amount=Amount.parse("35.8"),
+                category="MUSIC",
+                account_name="onm_savings",
+                type=TransactionType.DEBIT,
+            ),
+        ]
+    )
+
+    def query(**kwargs):
+        transactions = database.query_transactions(TransactionQuery(**kwargs))
+        return [t.description for t in transactions]
+
+    assert ["Paycheck ACME", "UMPHREYS", "TOMI JAZZ"] == query()
+    assert ["UMPHREYS", "TOMI JAZZ"] == query(categories=["MUSIC"])
+    assert ["UMPHREYS"] == query(
+        min_amount=Amount.parse("50"), max_amount=Amount.parse("500")
+    )
+    assert ["Paycheck ACME"] == query(text="acme")
+    assert ["TOMI JAZZ"] == query(
+        end_date=datetime(2024, 6, 1).date(), account_names=["onm_savings"]
+    )
+    assert [] == query(account_names=["onm_checking"])
+
+
+def test_snapshot(existing_database: PlainTextDatabase):
+    transactions_path = os.path.join(TEST_DATABASE, "transactions")
+    snapshot = LedgerSnapshot(transactions_path)
+    assert not os.path.exists(snapshot.path)
+    assert 1 == len(existing_database.get_transactions())
+    assert os.path.exists(snapshot.path)
+
+    df = snapshot.read(parse=None)
+    assert "category" == df["category"].dtype.name
+    assert "int64" == df["amount"].dtype.name
+    assert "UMPHREYS" == df["description"][0]
+
+    # A touched ledger reuses the snapshot
+    os.utime(transactions_path, ns=(0, 0))
+    assert 1 == len(snapshot.read(parse=None))
+
+    # A hand-edited ledger is parsed again
+    with open(transactions_path, "a") as f:
+        f.write("2023-04-01 onm_checking $-4.5\n    COFFEE\n    FOOD\n\n")
+    transactions = existing_database.get_transactions()
+    assert ["UMPHREYS", "COFFEE"] == [t.description for t in transactions]
+    assert Amount.parse("4.5") == transactions[1].amount
+
+
+PAYCHECK = Transaction(
+    date=datetime(2025, 1, 2).date(),
+    description="PAYCHECK",
+    amount=Amount.parse("1200.0"),
+    category="INCOME",
+    account_name=ONM_CHECKING,
+    type=TransactionType.CREDIT,
+)
+
+
+@pytest.mark.parametrize("append_only", [False, True])
+def test_session(existing_database: PlainTextDatabase, append_only: bool):
+    database = PlainTextDatabase(TEST_DATABASE, append_only=append_only)
+    source = PlaidSource("onm_bank")
+    with database.session() as session:
+        session.add_account(
+            Account(ONM_CHECKING, Amount.parse("1223.9"), AccountType.ASSET)
+        )
+        session.add_account(
+            Account("amex", Amount.parse("20.5"), AccountType.LIABILITY)
+        )
+        session.add_transactions([PAYCHECK])
+        session.set_sync_cursor(source, PlaidSyncCursor("a0b1c2"))
+        assert Amount.parse("23.9") == database.get_account(ONM_CHECKING).balance
+
+    assert Amount.parse("1223.9") == database.get_account(ONM_CHECKING).balance
+    assert 3 == len(database.get_accounts())
+    assert ["PAYCHECK", "UMPHREYS"] == [
+        t.description for t in database.get_transactions()
+    ]
+    assert ["PAYCHECK"] == [
+        t.description for t in database.query_transactions(TransactionQuery(text="pay"))
+    ]
+    assert "a0b1c2" == database.get_sync_cursor(source).cursor
+    assert [] == [p for p in os.listdir(TEST_DATABASE) if p.endswith(".pending")]
+
+
+def test_session_discarded_on_error(existing_database: PlainTextDatabase):
+    with pytest.raises(RuntimeError):
+        with existing_database.session() as session:
+            session.add_transactions([PAYCHECK])
+            raise RuntimeError()
+    assert 1 == len(existing_database.get_transactions())
+
+
+def test_session_journal_replayed(existing_database: PlainTextDatabase):
+    # Simulate a crash after the journal was written but before the renames
+    source = PlaidSource("onm_bank")
+    replay = patch(
+        "onm.database.plain_text_database._replay_journal", side_effect=SystemExit
+    )
+    with pytest.raises(SystemExit), replay:
+        with existing_database.session() as session:
+            session.add_transactions([PAYCHECK])
+            session.set_sync_cursor(source, PlaidSyncCursor("a0b1c2"))
+    assert 1 == len(existing_database.get_transactions())
+
+    database = PlainTextDatabase(TEST_DATABASE)
+    assert not os.path.exists(os.path.join(TEST_DATABASE, "journal"))
+    assert 2 == len(database.get_transactions())
+    assert "a0b1c2" == database.get_sync_cursor(source).cursor
+
+
+def test_session_append_journal_replayed(append_only_database: PlainTextDatabase):
+    append_only_database.add_transactions([PAYCHECK._replace(description="FIRST")])
+    log_path = os.path.join(TEST_DATABASE, "transactions.log")
+    with open(log_path, "rb") as f:
+        log = f.read()
+    replay = patch(
+        "onm.database.plain_text_database._replay_journal", side_effect=SystemExit
+    )
+    with pytest.raises(SystemExit), replay:
+        with append_only_database.session() as session:
+            session.add_transactions([PAYCHECK])
+    # Only the appended records are written aside, not a copy of the log
+    with open(log_path + ".pending", "rb") as f:
+        entries = f.read()
+    assert b"FIRST" not in entries
+
+    # A replay interrupted part way through the append starts it over
+    with open(log_path, "ab") as f:
+        f.write(entries[:10])
+    database = PlainTextDatabase(TEST_DATABASE, append_only=True)
+    with open(log_path, "rb") as f:
+        assert log + entries == f.read()
+    assert ["FIRST", "PAYCHECK", "UMPHREYS"] == sorted(
+        t.description for t in database.get_transactions()
+    )
+
+
+@pytest.mark.parametrize("append_only", [False, True])
+def test_session_skips_duplicates(existing_database: PlainTextDatabase, append_only):
+    database = PlainTextDatabase(TEST_DATABASE, append_only=append_only)
+    transactions = database.get_transactions()
+    with database.session() as session:
+        session.add_transactions([PAYCHECK, PAYCHECK])
+    assert 0 == session.skipped_transactions
+
+    # Only the third copy is new; whitespace and case in descriptions are ignored
+    with database.session() as session:
+        session.add_transactions(
+            [PAYCHECK._replace(description=" Paycheck"), PAYCHECK, PAYCHECK]
+        )
+        session.add_transactions(transactions)
+    assert 1 == session.added_transactions
+    assert 3 == session.skipped_transactions
+    assert 4 == len(database.get_transactions())
+
+    # The fingerprints survive the index being rebuilt after a hand edit
+    transactions_path = os.path.join(TEST_DATABASE, "transactions")
+    with open(transactions_path, "a") as f:
+        f.write("\n")
+    with database.session() as session:
+        session.add_transactions([PAYCHECK])
+    assert 1 == session.skipped_transactions
+
+
+def test_sync_cursor_store(existing_database: PlainTextDatabase):
+    # The legacy cursors.csv is migrated on open
+    assert not os.path.exists(os.path.join(TEST_DATABASE, "cursors.csv"))
+    cursors_path = os.path.join(TEST_DATABASE, "cursors.jsonl")
+    assert os.path.exists(cursors_path)
+
+    source = PlaidSource("onm_bank")
+    for i in range(10):
+        existing_database.set_sync_cursor(source, PlaidSyncCursor(f"cursor-{i}"))
+    other_source = PlaidSource("bank")
+    existing_database.set_sync_cursor(other_source, PlaidSyncCursor("a0b1c2"))
+    with open(cursors_path) as f:
+        assert len(f.readlines()) < 11
+
+    # A line torn by a crash is ignored and not appended to
+    with open(cursors_path, "a") as f:
+        f.write('{"source": "onm_bank", "type": "pla')
+    database = PlainTextDatabase(TEST_DATABASE)
+    assert "cursor-9" == database.get_sync_cursor(source).cursor
+    database.set_sync_cursor(other_source, PlaidSyncCursor("d3e4f5"))
+    database = PlainTextDatabase(TEST_DATABASE)
+    assert "cursor-9" == database.get_sync_cursor(source).cursor
+    assert "d3e4f5" == database.get_sync_cursor(other_source).cursor
+
+
+def test_get_transaction_table(partitioned_database: PlainTextDatabase):
+    paycheck = PAYCHECK._replace(id="txn_1")
+    partitioned_database.add_transactions([paycheck])
+    table = partitioned_database.get_transaction_table()
+    assert partitioned_database.get_transactions() == table.to_transactions()
+
+    # Read from the ledgers' snapshots once compacted
+    partitioned_database.compact()
+    query = TransactionQuery(start_date=datetime(2025, 1, 1).date())
+    table = partitioned_database.get_transaction_table(query)
+    assert [paycheck] == table.to_transactions()
+    query = TransactionQuery(categories=["MUSIC"])
+    assert ["UMPHREYS"] == [
+        t.description
+        for t in partitioned_database.get_transaction_table(query).to_transactions()
+    ]
+
+
+def _commit_in_process(account_name: str, count: int):
+    database = PlainTextDatabase(TEST_DATABASE, append_only=True)
+    for i in range(count):
+        with database.session() as session:
+            session.add_transactions(
+                [PAYCHECK._replace(account_name=account_name, description=f"P{i}")]
+            )
+
+
+def test_concurrent_sessions(existing_database: PlainTextDatabase):
+    # Each process appends to the same log segment through journaled commits.
+    # The write lock serializes them, so no append is lost or torn.
+    context = multiprocessing.get_context("fork")
+    processes = [
+        context.Process(target=_commit_in_process, args=(f"account_{i}", 20))
+        for i in range(4)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert [0] * 4 == [process.exitcode for process in processes]
+    assert 81 == len(existing_database.get_transactions())
+
+
+def test_locks(existing_database: PlainTextDatabase):
+    with existing_database.write_lock():
+        # Reentrant, including a shared hold within an exclusive one
+        existing_database.add_transactions([PAYCHECK])
+        assert 2 == len(existing_database.get_transactions())
+    with pytest.raises(RuntimeError):
+        with existing_database._shared("transactions"):
+            existing_database.add_transactions([PAYCHECK])
+
+    # Another process (here, another open file) waits for the sync lock
+    acquired = threading.Event()
+
+    def sync():
+        with sync_lock(TEST_DATABASE, "onm bank").exclusive():
+            acquired.set()
+
+    with existing_database.sync_lock("onm bank"):
+        thread = threading.Thread(target=sync)
+        thread.start()
+        assert not acquired.wait(0.2)
+    assert acquired.wait(5)
+    thread.join()
+    assert os.path.exists(os.path.join(TEST_DATABASE, "locks", "onm%20bank.lock"))
+
+
+def test_rollups(mode_database: PlainTextDatabase):
+    database = mode_database
+    database.add_transactions([PAYCHECK])
+    with database.session() as session:
+        session.add_transactions([PAYCHECK._replace(description="BONUS")])
+    rollups = database.get_rollups()
+    assert Rollups.from_transactions(database.get_transactions()) == rollups
+    assert [("2025-01", ONM_CHECKING, "INCOME", 240000, 0, 2)] == list(
+        database.get_rollups(start_date=datetime(2025, 1, 31).date())
+    )
+
+    # Rollups are kept up to date as records are written
+    database.add_transactions([PAYCHECK._replace(category="BONUS")])
+    for path in database._ledger_paths():
+        for ledger_path in [path, path + ".log"]:
+            if os.path.exists(ledger_path):
+                assert LedgerRollup(ledger_path).load() is not None
+
+    # Rollups are rebuilt after a hand edit, and when compacting
+    for path in database._ledger_paths():
+        with open(path, "a") as f:
+            f.write("2024-12-31 onm_bank_savings $-1.00\n    FEE\n    FEES\n\n")
+    rollups = database.get_rollups()
+    assert Rollups.from_transactions(database.get_transactions()) == rollups
+    assert "FEES" in rollups.totals("category")
+    database.compact()
+    assert Rollups.from_transactions(database.get_transactions()) == (
+        database.get_rollups()
+    )
+
+
+def test_update_and_remove_transactions(mode_database: PlainTextDatabase):
+    database = mode_database
+    pending = PAYCHECK._replace(description="PENDING PAYCHECK", id="txn_1")
+    fee = PAYCHECK._replace(
+        description="FEE", amount=Amount(500), type=TransactionType.DEBIT, id="txn_2"
+    )
+    database.add_transactions([pending, fee])
+    assert ["FEE", "PENDING PAYCHECK", "UMPHREYS"] == sorted(
+        t.description for t in database.get_transactions()
+    )
+
+    # Posted a day earlier, which moves it to the previous year's partition
+    posted = pending._replace(
+        description="PAYCHECK", date=datetime(2024, 12, 31).date()
+    )
+    with database.session() as session:
+        session.update_transactions([posted, PAYCHECK._replace(id="txn_3")])
+        session.remove_transactions(["txn_2", "txn_4"])
+    assert [posted, "UMPHREYS"] == [
+        t if t.id else t.description for t in database.get_transactions()
+    ]
+    assert Rollups.from_transactions(database.get_transactions()) == (
+        database.get_rollups()
+    )
+
+    # Ids are kept in the ledger, and are read back after a hand edit
+    path = database._ledger_paths(end_date=datetime(2024, 12, 31).date())[0]
+    with open(path, "a") as f:
+        f.write("2024-12-30 onm_bank_checking $5.00 ; id:txn_5\n    A\n    B\n\n")
+    assert ["txn_1", "txn_5"] == sorted(
+        t.id for t in database.iter_transactions() if t.id is not None
+    )
+    database.remove_transactions(["txn_1", "txn_5"])
+    assert ["UMPHREYS"] == [t.description for t in database.get_transactions()]
+
+
+def test_append_only_tombstones(partitioned_database: PlainTextDatabase):
+    database = partitioned_database
+    pending = PAYCHECK._replace(description="PENDING PAYCHECK", id="txn_1")
+    database.add_transactions([pending])
+    database.compact()
+    ledgers = {}
+    for path in database._ledger_paths():
+        with open(path, "rb") as f:
+            ledgers[path] = f.read()
+
+    def check(expected):
+        assert expected == database.get_transactions()
+        assert expected == list(database.iter_transactions())
+        assert expected == database.query_transactions(
+            TransactionQuery(start_date=datetime(2024, 1, 1).date())
+        )
+        assert Rollups.from_transactions(expected) == database.get_rollups()
+        # The sorted ledgers are left as they are
+        for path, content in ledgers.items():
+            with open(path, "rb") as f:
+                assert content == f.read()
+
+    # Changed and removed transactions are struck out by tombstones appended
+    # to the log segment
+    posted = pending._replace(
+        description="PAYCHECK", date=datetime(2024, 12, 31).date()
+    )
+    database.update_transactions([posted])
+    umphreys = database.get_transactions()[-1]
+    check([posted, umphreys])
+    with open(database._ledger_paths()[0] + ".log") as f:
+        assert "; id:txn_1 removed\n" in f.read()
+    # Only live records count as duplicates
+    copies = [posted._replace(id=None), pending._replace(id=None)]
+    assert copies[1:] == database.deduplicate_transactions([posted] + copies)
+
+    database.remove_transactions(["txn_1"])
+    check([umphreys])
+    assert [pending] == database.deduplicate_transactions([pending])
+
+    # Compacting folds them in, and drops partitions left empty
+    database.compact()
+    ledgers = {}
+    check([umphreys])
+    paths = database._ledger_paths()
+    assert 1 == len(paths)
+    assert not any(os.path.exists(path + ".log") for path in paths)
+
+
+def test_balance_history(new_database: PlainTextDatabase):
+    timestamps = [datetime(2025, 1, day, tzinfo=timezone.utc) for day in range(1, 5)]
+    with patch("onm.database.plain_text_balances.datetime") as mock_datetime:
+        mock_datetime.strptime = datetime.strptime
+        for timestamp, balance in zip(timestamps, ["10", "10", "12.5", "9"]):
+            mock_datetime.now.return_value = timestamp
+            with new_database.session() as session:
+                session.add_account(
+                    Account("roth_ira", Amount.parse(balance), AccountType.ASSET)
+                )
+
+    # Unchanged balances are not recorded again
+    history = new_database.get_balance_history("roth_ira")
+    assert [timestamps[0], timestamps[2], timestamps[3]] == [
+        s.timestamp for s in history
+    ]
+    assert [1000, 1250, 900] == [s.balance for s in history]
+
+    # The range starts with the balance in effect at its start
+    history = new_database.get_balance_history(
+        "roth_ira", start=datetime(2025, 1, 2), end=datetime(2025, 1, 3)
+    )
+    assert [1000, 1250] == [s.balance for s in history]
+    assert [] == new_database.get_balance_history("amex")
+
+    # Another process's appends are picked up, and a torn line is skipped
+    balances_path = os.path.join(NEW_DATABASE, "balances")
+    with open(balances_path, "a") as f:
+        f.write("2025-01-05T00:00:00Z roth_ira $8.00\n2025-01-06T00:00:00Z roth_")
+    assert 800 == new_database.get_balance_history("roth_ira")[-1].balance
+    database = PlainTextDatabase(NEW_DATABASE)
+    database.update_account(Account("roth_ira", Amount(700), AccountType.ASSET))
+    assert [1000, 1250, 900, 800, 700] == [
+        s.balance
+        for s in PlainTextDatabase(NEW_DATABASE).get_balance_history("roth_ira")
+    ]
+
+
+def test_session_skips_duplicates_by_id(partitioned_database: PlainTextDatabase):
+    database = partitioned_database
+    pending = PAYCHECK._replace(id="txn_1")
+    database.add_transactions([pending])
+    # Plaid removes a pending transaction as it adds the posted one, which
+    # can look just the same
+    posted = pending._replace(id="txn_2")
+    with database.session() as session:
+        session.add_transactions([posted])
+        session.remove_transactions(["txn_1"])
+    assert 1 == session.added_transactions
+    assert [posted, "UMPHREYS"] == [
+        t if t.id else t.description for t in database.get_transactions()
+    ]
+
+    # A new id is added however much it looks like a stored transaction
+    with database.session() as session:
+        session.add_transactions([pending._replace(id="txn_3"), posted])
+    assert (1, 1) == (session.added_transactions, session.skipped_transactions)
+    assert ["txn_2", "txn_3"] == sorted(
+        t.id for t in database.get_transactions() if t.id
+    )
@@ -0,0 +1,81 @@
+import os
+import stat
+import time
+import pytest
+from onm import secret
+from onm.secret import (
+    SecretCacheConfiguration,
+    clear_secret_cache,
+    configure_secret_cache,
+    resolve_secret,
+    resolve_secrets,
+)
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture(autouse=True)
+def reset_secret_cache():
+    clear_secret_cache()
+    yield
+    clear_secret_cache()
+    configure_secret_cache(None)
+
+
+def counting_command(tmp_path, value: str) -> str:
+    # Appends to a file on each run, so runs can be counted
+    runs_path = tmp_path / "runs"
+    return f"$ sh -c 'echo x >> {runs_path}; echo {value}'"
+
+
+def run_count(tmp_path) -> int:
+    runs_path = tmp_path / "runs"
+    if not runs_path.exists():
+        return 0
+    return len(runs_path.read_text().splitlines())
+
+
+def test_resolve_secret_cached(tmp_path):
+    command = counting_command(tmp_path, "access-sandbox")
+    assert "plain" == resolve_secret("plain")
+    assert "access-sandbox" == resolve_secret(command)
+    assert "access-sandbox" == resolve_secret(command)
+    assert 1 == run_count(tmp_path)
+
+
+def test_resolve_secrets_concurrently():
+    commands = {f"secret_{i}": f"$ sh -c 'sleep 0.5; echo {i}'" for i in range(4)}
+    start = time.monotonic()
+    secrets = resolve_secrets({"sources": [commands], "name": "onm_bank"})
+    assert time.monotonic() - start < 1.5
+    assert {
+        "sources": [{f"secret_{i}": str(i) for i in range(4)}],
+        "name": "onm_bank",
+    } == (secrets)
+
+
+def test_secret_file_cache(tmp_path):
+    cache_path = tmp_path / "cache" / "secrets.json"
+    configure_secret_cache(SecretCacheConfiguration(path=str(cache_path), ttl=60))
+    command = counting_command(tmp_path, "access-sandbox")
+    assert "access-sandbox" == resolve_secret(command)
+    assert 0o600 == stat.S_IMODE(os.stat(cache_path).st_mode)
+    assert b"access-sandbox" in cache_path.read_bytes()
+    assert b"echo" not in cache_path.read_bytes()
+
+    # A new process would find the secret in the file cache
+    clear_secret_cache()
+    assert "access-sandbox" == resolve_secret(command)
+    assert 1 == run_count(tmp_path)
+
+    # Expired or exposed cache files are not used
+    configure_secret_cache(SecretCacheConfiguration(path=str(cache_path), ttl=0))
+    clear_secret_cache()
+    assert "access-sandbox" == resolve_secret(command)
+    assert 2 == run_count(tmp_path)
+
+    configure_secret_cache(SecretCacheConfiguration(path=str(cache_path), ttl=60))
+    clear_secret_cache()
+    resolve_secret(command)
+    os.chmod(cache_path, 0o644)
+    assert secret._file_cache.get(command) is None
@@ -0,0 +1,243 @@
+import pytest
+from datetime import datetime, timezone
+from unittest.mock import patch
+from onm.common import (
+    Account,
+    AccountType,
+    Amount,
+    BalanceSnapshot,
+    Transaction,
+    TransactionType,
+)
+from onm.database.database import DatabaseConfiguration, DatabaseType, TransactionQuery
+from onm.database.database_factory import DatabaseFactory
+from onm.database.rollup import Rollups
+from onm.database.sqlite_database import SqliteDatabase
+from onm.sync import PlaidSyncCursor
+from onm.source.plaid_source import PlaidSource
+
+pytestmark = pytest.mark.unit
+
+TRANSACTIONS = [
+    Transaction(
+        date=datetime(2024, 12, 3).date(),
+        description="UMPHREYS",
+        amount=Amount.parse("102.8"),
+        category="MUSIC",
+        account_name="onm_savings",
+        type=TransactionType.DEBIT,
+    ),
+    Transaction(
+        date=datetime(2025, 1, 2).date(),
+        description="Paycheck ACME",
+        amount=Amount.parse("1200.0"),
+        category="INCOME",
+        account_name="onm_checking",
+        type=TransactionType.CREDIT,
+    ),
+    Transaction(
+        date=datetime(2024, 3, 12).date(),
+        description="TOMI JAZZ",
+        amount=Amount.parse("35.8"),
+        category="MUSIC",
+        account_name="onm_savings",
+        type=TransactionType.DEBIT,
+    ),
+]
+
+
+@pytest.fixture
+def database(tmp_path) -> SqliteDatabase:
+    return SqliteDatabase(str(tmp_path))
+
+
+def test_create_database(tmp_path):
+    database = DatabaseFactory.create_database(
+        DatabaseConfiguration(
+            type=DatabaseType.SQLITE, parameters={"database_path": str(tmp_path)}
+        )
+    )
+    assert SqliteDatabase == type(database)
+
+
+def test_accounts(database: SqliteDatabase):
+    database.add_account(Account("roth_ira", Amount.parse("100.95"), AccountType.ASSET))
+    database.add_account(Account("amex", Amount.parse("20.5"), AccountType.LIABILITY))
+    account = database.get_account("roth_ira")
+    assert "roth_ira" == account.name
+    assert Amount.parse("100.95") == account.balance
+    assert AccountType.ASSET == account.type
+    assert ["roth_ira", "amex"] == [a.name for a in database.get_accounts()]
+
+    database.update_account(
+        Account("roth_ira", Amount.parse("93.2"), AccountType.ASSET)
+    )
+    assert Amount.parse("93.2") == database.get_account("roth_ira").balance
+    with pytest.raises(ValueError):
+        database.get_account("checking")
+    with pytest.raises(ValueError):
+        database.update_account(
+            Account("checking", Amount.parse("1.0"), AccountType.ASSET)
+        )
+
+
+def test_transactions(database: SqliteDatabase):
+    database.add_transactions(TRANSACTIONS)
+    transactions = database.get_transactions()
+    assert ["Paycheck ACME", "UMPHREYS", "TOMI JAZZ"] == [
+        t.description for t in transactions
+    ]
+    assert TRANSACTIONS[0] == transactions[1]
+    assert ["Paycheck ACME"] == [
+        t.description for t in database.iter_transactions(limit=1)
+    ]
+
+
+def test_query_transactions(database: SqliteDatabase):
+    database.add_transactions(TRANSACTIONS)
+
+    def query(**kwargs):
+        transactions = database.query_transactions(TransactionQuery(**kwargs))
+        return [t.description for t in transactions]
+
+    assert ["UMPHREYS", "TOMI JAZZ"] == query(categories=["MUSIC"])
+    assert ["UMPHREYS"] == query(
+        min_amount=Amount.parse("50"), max_amount=Amount.parse("500")
+    )
+    assert ["Paycheck ACME"] == query(text="acme")
+    assert ["TOMI JAZZ"] == query(
+        end_date=datetime(2024, 6, 1).date(), account_names=["onm_savings"]
+    )
+
+
+def test_sync_cursor(database: SqliteDatabase):
+    source = PlaidSource("test_source")
+    assert database.get_sync_cursor(source) is None
+    database.set_sync_cursor(source, PlaidSyncCursor("805c4d192e0d4bbe742bda1f21"))
+    database.set_sync_cursor(source, PlaidSyncCursor("75626d959a12ead47337eca9d9"))
+    assert "75626d959a12ead47337eca9d9" == database.get_sync_cursor(source).cursor
+
+
+def test_sources(database: SqliteDatabase):
+    source = PlaidSource(
+        name="onm_bank",
+        access_token="$ echo access-sandbox-a4a6c36b-0276-431d-a843-65c30b506e77",
+        account_map={
+            "a927faed81ca48916e56e6ccda63fe09": {
+                "name": "checking",
+                "account_type": AccountType.ASSET,
+            },
+        },
+    )
+    database.add_source(source)
+
+    source = database.get_source("onm_bank")
+    assert PlaidSource == type(source)
+    assert "access-sandbox-a4a6c36b-0276-431d-a843-65c30b506e77" == source.access_token
+    assert "checking" == source.account_map["a927faed81ca48916e56e6ccda63fe09"]["name"]
+
+
+def test_session(database: SqliteDatabase):
+    source = PlaidSource("test_source")
+    with database.session() as session:
+        session.add_account(
+            Account("roth_ira", Amount.parse("100.95"), AccountType.ASSET)
+        )
+        session.add_transactions(TRANSACTIONS)
+        session.set_sync_cursor(source, PlaidSyncCursor("805c4d192e0d4bbe742bda1f21"))
+    assert Amount.parse("100.95") == database.get_account("roth_ira").balance
+    assert 3 == len(database.get_transactions())
+    assert "805c4d192e0d4bbe742bda1f21" == database.get_sync_cursor(source).cursor
+
+
+def test_session_skips_duplicates(database: SqliteDatabase):
+    with database.session() as session:
+        session.add_transactions(TRANSACTIONS + TRANSACTIONS[:1])
+    # Looked up through the fingerprint index, without reading transactions
+    read = patch.object(database, "iter_transactions", side_effect=AssertionError)
+    with read, database.session() as session:
+        session.add_transactions(TRANSACTIONS[:1] * 3)
+    assert 1 == session.added_transactions
+    assert 2 == session.skipped_transactions
+    assert 5 == len(database.get_transactions())
+
+
+def test_rollups(database: SqliteDatabase):
+    database.add_transactions(TRANSACTIONS + TRANSACTIONS[:1])
+    rollups = database.get_rollups()
+    assert Rollups.from_transactions(database.get_transactions()) == rollups
+    assert {"INCOME": Amount(120000), "MUSIC": Amount(-24140)} == rollups.totals(
+        "category"
+    )
+    december = database.get_rollups(
+        start_date=datetime(2024, 12, 31).date(), end_date=datetime(2024, 12, 31).date()
+    )
+    assert [("2024-12", "onm_savings", "MUSIC", 0, 20560, 2)] == list(december)
+
+    database._connection.execute("DELETE FROM transactions WHERE category = 'MUSIC'")
+    assert ["2025-01"] == [r.month for r in database.get_rollups()]
+
+
+def test_update_and_remove_transactions(database: SqliteDatabase):
+    pending = TRANSACTIONS[1]._replace(description="PENDING", id="txn_1")
+    database.add_transactions([TRANSACTIONS[0], pending, pending._replace(id="txn_2")])
+    posted = pending._replace(description="POSTED", amount=Amount.parse("1250.0"))
+    with database.session() as session:
+        session.update_transactions([posted, TRANSACTIONS[2]._replace(id="txn_3")])
+        session.remove_transactions(["txn_2"])
+    assert [posted, TRANSACTIONS[0]] == database.get_transactions()
+    assert Rollups.from_transactions(database.get_transactions()) == (
+        database.get_rollups()
+    )
+    database.remove_transactions(["txn_1"])
+    assert [TRANSACTIONS[0]] == database.get_transactions()
+    assert Rollups.from_transactions(TRANSACTIONS[:1]) == database.get_rollups()
+
+
+def test_balance_history(database: SqliteDatabase):
+    for balance in ["10", "10", "12.5"]:
+        database.add_account(
+            Account("roth_ira", Amount.parse(balance), AccountType.ASSET)
+        )
+    database.update_account(Account("roth_ira", Amount(900), AccountType.ASSET))
+    history = database.get_balance_history("roth_ira")
+    assert [1000, 1250, 900] == [s.balance for s in history]
+    assert all(s.timestamp.tzinfo is not None for s in history)
+
+    # The range starts with the balance in effect at its start
+    history = database.get_balance_history(
+        "roth_ira", start=datetime(2100, 1, 1), end=datetime(2100, 1, 2)
+    )
+    assert [900] == [s.balance for s in history]
+    assert [] == database.get_balance_history("roth_ira", end=datetime(2000, 1, 1))
+
+
+def test_session_balance_snapshots(database: SqliteDatabase):
+    snapshots = [
+        BalanceSnapshot("roth_ira", datetime(2024, 1, day, tzinfo=timezone.utc), b)
+        for day, b in [(1, Amount(100)), (2, Amount(100)), (3, Amount(200))]
+    ]
+    with database.session() as session:
+        session.add_balance_snapshots(snapshots)
+        session.add_account(Account("roth_ira", Amount(200), AccountType.ASSET))
+    # Unchanged balances are not recorded, including the account's own
+    assert [snapshots[0], snapshots[2]] == database.get_balance_history("roth_ira")
+
+
+def test_session_skips_duplicates_by_id(database: SqliteDatabase):
+    pending = TRANSACTIONS[1]._replace(id="txn_1")
+    database.add_transactions([pending])
+    # Plaid removes a pending transaction as it adds the posted one, which
+    # can look just the same
+    posted = pending._replace(id="txn_2")
+    with database.session() as session:
+        session.add_transactions([posted])
+        session.remove_transactions(["txn_1"])
+    assert 1 == session.added_transactions
+    assert [posted] == database.get_transactions()
+
+    # A new id is added however much it looks like a stored transaction
+    with database.session() as session:
+        session.add_transactions([pending._replace(id="txn_3"), posted])
+    assert (1, 1) == (session.added_transactions, session.skipped_transactions)
+    assert ["txn_2", "txn_3"] == sorted(t.id for t in database.get_transactions())
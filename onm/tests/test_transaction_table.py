@@ -0,0 +1,68 @@
+import pytest
+import numpy as np
+from datetime import datetime
+from onm.common import Amount, Transaction, TransactionType
+from onm.database.transaction_table import TransactionTable, concat_tables
+
+pytestmark = pytest.mark.unit
+
+TRANSACTIONS = [
+    Transaction(
+        date=datetime(2025, 1, 2).date(),
+        description="Paycheck ACME",
+        amount=Amount.parse("1200.0"),
+        category="INCOME",
+        account_name="onm_checking",
+        type=TransactionType.CREDIT,
+    ),
+    Transaction(
+        date=datetime(2024, 12, 3).date(),
+        description="UMPHREYS",
+        amount=Amount.parse("102.8"),
+        category="MUSIC",
+        account_name="onm_savings",
+        type=TransactionType.DEBIT,
+        id="lPNjeW1nR6CDn5okmGQ6hEpMo4lLNoSrzqDje",
+    ),
+    Transaction(
+        date=datetime(2024, 3, 12).date(),
+        description="TOMI JAZZ",
+        amount=Amount.parse("0.1"),
+        category="MUSIC",
+        account_name="onm_savings",
+        type=TransactionType.DEBIT,
+    ),
+]
+
+
+def test_round_trip():
+    table = TransactionTable.from_transactions(TRANSACTIONS)
+    assert 3 == len(table)
+    assert [120000, -10280, -10] == table.amounts.tolist()
+    assert np.int32 == table.dates.dtype
+    assert ["INCOME", "MUSIC"] == table.values["category"]
+    assert TRANSACTIONS == table.to_transactions()
+
+    df = table.to_df()
+    assert ["MUSIC", "MUSIC"] == df["category"].tolist()[1:]
+    assert TRANSACTIONS == TransactionTable.from_df(df).to_transactions()
+    assert TRANSACTIONS[1:] == table[table.amounts < 0].to_transactions()
+
+
+def test_totals():
+    table = TransactionTable.from_transactions(TRANSACTIONS * 1000)
+    assert {"INCOME": 120000000, "MUSIC": -10290000} == table.totals("category")
+    assert {"onm_savings": -10290} == table.totals(
+        "account_name", mask=(table.amounts < 0) & (np.arange(len(table)) < 3)
+    )
+
+
+def test_concat_tables():
+    tables = [
+        TransactionTable.from_transactions(TRANSACTIONS[2:]),
+        TransactionTable.from_transactions([]),
+        TransactionTable.from_transactions(TRANSACTIONS[:2]),
+    ]
+    table = concat_tables(tables)
+    assert TRANSACTIONS[2:] + TRANSACTIONS[:2] == table.to_transactions()
+    assert ["MUSIC", "INCOME"] == table.values["category"]
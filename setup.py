@@ -24,7 +24,8 @@ setuptools.setup(
     },
     install_requires=["pandas", "plaid-python", "tomlkit"],
     extras_require={
-        "dev": ["pytest>=5", "mock", "pytest-cov", "coverage>=4.5", "flake8", "black"]
+        "dev": ["pytest>=5", "mock", "pytest-cov", "coverage>=4.5", "flake8", "black"],
+        "parquet": ["pyarrow"],
     },
     python_requires=">=3.5",
 )